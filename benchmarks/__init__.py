@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Keep benchmark runs away from the application's persistent embedding cache and vector index.
+os.environ.setdefault("EMBEDDING_CACHE_DIR", tempfile.mkdtemp(prefix="bench-embeddings-"))
+os.environ.setdefault("LOCAL_INDEX_DIR", tempfile.mkdtemp(prefix="bench-vector-index-"))
@@ -0,0 +1,153 @@
+"""/ask/batch against the same questions sent one /ask at a time, against stubbed backends.
+
+A mock Typesense holds --chunks chunks; Gemini is stubbed with --embed-latency per embedding
+call and --model-latency per generation. The same --questions questions are answered
+through /ask at --concurrency and then through /ask/batch, with the answer and embedding
+caches cleared in between. For each the script reports wall time, throughput, embedding
+calls, Typesense search requests and failed Typesense requests (a failed batch search
+falls back to a per-question search). It then checks that batch results arrive in input
+order and that a question whose synthesis fails comes back as an error without failing
+the others.
+
+    python -m benchmarks.bench_ask_batch --questions 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, StubGenerativeModel, fake_vector, point_config_at, wait_until_ready
+from services.answer_cache import answer_cache
+from services.embedding_cache import embedding_cache
+from services.metrics import TYPESENSE_ERRORS
+from utils.config import config
+
+FAILING_QUESTION = "Which question always fails?"
+
+
+class FailingModel(StubGenerativeModel):
+    """Fails synthesis for FAILING_QUESTION, to check that one error does not fail the batch"""
+    def respond(self, prompt: str) -> str:
+        if FAILING_QUESTION in prompt and not prompt.startswith("Analyze this user query"):
+            raise RuntimeError("synthesis failed")
+        return super().respond(prompt)
+
+
+def seed(server: MockTypesenseServer, chunks: int):
+    documents = server.collections.setdefault(config.COLLECTION_NAME, {})
+    for i in range(chunks):
+        content = f"Section {i} describes part {i % 37} of the benchmark corpus."
+        documents[f"doc_{i}"] = {'id': f"doc_{i}", 'doc_id': f"doc-{i // 20}", 'filename': f"file-{i // 20}.txt",
+                                 'chunk_index': i % 20, 'content': content, 'embedding': fake_vector(content)}
+
+
+def questions(count: int) -> List[Dict[str, Any]]:
+    return [{"question": f"What does section {i} say about part {i % 37}?", "session_id": f"bench-{i % 16}"}
+            for i in range(count)]
+
+
+def reset_caches():
+    embedding_cache.clear()
+    answer_cache.bump_generation()
+
+
+def counters(server: MockTypesenseServer, embedder: StubEmbedder) -> Dict[str, int]:
+    return {
+        'embed calls': embedder.calls,
+        'multi_search': server.path_counts['/multi_search'],
+        'search': server.path_counts[f'/collections/{config.COLLECTION_NAME}/documents/search'],
+        'typesense errors': int(sum(sample.value for metric in TYPESENSE_ERRORS.collect()
+                                    for sample in metric.samples if sample.name.endswith('_total')))
+    }
+
+
+def report(label: str, seconds: float, count: int, before: Dict[str, int], after: Dict[str, int]):
+    deltas = "   ".join(f"{name} {after[name] - before[name]:>4}" for name in after)
+    print(f"  {label:<20} {seconds:7.2f} s   {count / seconds:7.1f} q/s   {deltas}")
+
+
+async def one_by_one(client: httpx.AsyncClient, items: List[Dict[str, Any]], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(item: Dict[str, Any]):
+        async with semaphore:
+            (await client.post("/ask", json=item)).raise_for_status()
+
+    await asyncio.gather(*(ask(item) for item in items))
+
+
+async def batch(client: httpx.AsyncClient, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    events = []
+    async with client.stream("POST", "/ask/batch", json={"questions": items}, timeout=None) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append({"event": event, "data": json.loads(line[len("data: "):])})
+    return events
+
+
+async def drive(app, args, server: MockTypesenseServer, embedder: StubEmbedder):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await wait_until_ready(client)
+        items = questions(args.questions)
+
+        print(f"{args.questions} questions, window {config.ASK_BATCH_WINDOW}, "
+              f"batch concurrency {config.ASK_BATCH_MAX_CONCURRENCY}")
+        reset_caches()
+        before = counters(server, embedder)
+        start = time.perf_counter()
+        await one_by_one(client, items, args.concurrency)
+        report(f"/ask x{args.concurrency}", time.perf_counter() - start, len(items), before, counters(server, embedder))
+
+        reset_caches()
+        before = counters(server, embedder)
+        start = time.perf_counter()
+        events = await batch(client, items)
+        report("/ask/batch", time.perf_counter() - start, len(items), before, counters(server, embedder))
+
+        results = [event["data"] for event in events if event["event"] == "result"]
+        assert [result["index"] for result in results] == list(range(len(items))), "results out of order"
+        assert all("response" in result for result in results), "unexpected errors"
+        print(f"  results in input order; done event: {events[-1]['data']}")
+
+        reset_caches()
+        mixed = items[:10] + [{"question": FAILING_QUESTION, "session_id": "bench-fail"}] + items[10:20]
+        results = [event["data"] for event in await batch(client, mixed) if event["event"] == "result"]
+        failed = [result["index"] for result in results if "error" in result]
+        assert failed == [10], f"expected only question 10 to fail, got {failed}"
+        print(f"  failing question: index {failed[0]} -> {results[10]['error']!r}, other {len(results) - 1} answered")
+
+
+def run(args):
+    config.ASK_BATCH_WINDOW = args.window
+    config.ASK_BATCH_MAX_CONCURRENCY = args.batch_concurrency
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        seed(server, args.chunks)
+        embedder = StubEmbedder(args.embed_latency, args.embed_item_latency).install()
+
+        import main
+        main.agent_service.gemini.model = FailingModel(latency=args.model_latency)
+        asyncio.run(drive(main.app, args, server, embedder))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--window", type=int, default=50)
+    parser.add_argument("--batch-concurrency", type=int, default=8)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--embed-item-latency", type=float, default=0.001)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--typesense-latency", type=float, default=0.01)
+    run(parser.parse_args())
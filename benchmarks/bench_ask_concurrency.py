@@ -0,0 +1,62 @@
+"""Measures /ask throughput at increasing concurrency against a local mock Typesense server.
+
+Gemini is stubbed out with zero latency so the numbers reflect how well the
+worker overlaps Typesense round trips. The answer cache is disabled and every request
+asks its own question, so each one runs the full workflow. Run from the repository root:
+
+    python -m benchmarks.bench_ask_concurrency --typesense-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, StubGenerativeModel, point_config_at, wait_until_ready
+from utils.config import config
+
+
+async def drive(app, concurrency: int, requests: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await wait_until_ready(client)
+        
+        async def ask(i: int):
+            async with semaphore:
+                response = await client.post("/ask", json={
+                    "question": f"What does section {concurrency}.{i} say?",
+                    "session_id": f"bench-{i % concurrency}"
+                })
+                response.raise_for_status()
+        
+        start = time.perf_counter()
+        await asyncio.gather(*[ask(i) for i in range(requests)])
+        return time.perf_counter() - start
+
+
+def run(args):
+    config.ANSWER_CACHE_ENABLED = False
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        StubEmbedder(request_latency=0.0, item_latency=0.0).install()
+        
+        import main
+        main.agent_service.gemini.model = StubGenerativeModel()
+        
+        print(f"typesense latency: {args.typesense_latency * 1000:.0f} ms per call")
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency)
+            elapsed = asyncio.run(drive(main.app, concurrency, requests))
+            print(f"concurrency {concurrency:4d}: {requests / elapsed:8.1f} req/s "
+                  f"({elapsed / requests * 1000:.1f} ms/request amortized)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--typesense-latency", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    run(parser.parse_args())
@@ -0,0 +1,70 @@
+"""Compares time-to-first-byte of /ask and /ask/stream with simulated model latency.
+
+The app is served by uvicorn on a local port, since in-process ASGI transports
+buffer the whole response body. The answer cache is disabled and each pass asks its
+own questions, so every request runs the full workflow.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ask_streaming --model-latency 1.0
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import AppServer, StubEmbedder, StubGenerativeModel, point_config_at
+from utils.config import config
+
+
+async def measure(base_url: str, path: str, requests: int):
+    first_byte, first_token, total = [], [], []
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            token_at = None
+            body = {"question": f"{path} question {i}", "session_id": f"bench-{path}-{i}"}
+            async with client.stream("POST", path, json=body) as response:
+                response.raise_for_status()
+                byte_at = None
+                async for line in response.aiter_lines():
+                    assert "answer_cache_hit" not in line, f"{path} was served from the answer cache"
+                    if byte_at is None:
+                        byte_at = time.perf_counter()
+                    if token_at is None and line == "event: token":
+                        token_at = time.perf_counter()
+            end = time.perf_counter()
+            first_byte.append(byte_at - start)
+            first_token.append((token_at or end) - start)
+            total.append(end - start)
+    
+    return statistics.median(first_byte), statistics.median(first_token), statistics.median(total)
+
+
+def run(args):
+    config.ANSWER_CACHE_ENABLED = False
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        StubEmbedder(request_latency=args.embed_latency, item_latency=0.0).install()
+        
+        import main
+        main.agent_service.gemini.model = StubGenerativeModel(latency=args.model_latency)
+        
+        with AppServer(main.app) as app_server:
+            print(f"{'endpoint':<12} {'first byte':>12} {'first token':>12} {'complete':>12}  (medians)")
+            for path in ("/ask", "/ask/stream"):
+                ttfb, ttft, total = asyncio.run(measure(app_server.url, path, args.requests))
+                print(f"{path:<12} {ttfb * 1000:10.1f}ms {ttft * 1000:10.1f}ms {total * 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--model-latency", type=float, default=1.0)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--typesense-latency", type=float, default=0.01)
+    run(parser.parse_args())
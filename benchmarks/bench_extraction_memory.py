@@ -0,0 +1,123 @@
+"""Peak memory of whole-file vs streaming text extraction and chunking on synthetic documents.
+
+Generates PDFs and DOCX files of increasing size, then measures each path in a fresh
+process: the tracemalloc peak (Python allocations) and the process's max RSS.
+
+    python -m benchmarks.bench_extraction_memory --pages 50 200 800
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+import docx
+
+from services.document_service import DocumentService
+
+LINES_PER_PAGE = 45
+WORDS = "retrieval agent embedding chunk index query vector memory latency batch stream context".split()
+
+
+def synthetic_line(page: int, line: int) -> str:
+    return " ".join(WORDS[(page + line + i) % len(WORDS)] for i in range(12)) + f" p{page}l{line}"
+
+
+def write_pdf(path: str, pages: int):
+    """Writes a minimal text-only PDF one object at a time, so generation itself stays small"""
+    offsets = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+
+    with open(path, "wb") as f:
+        def write_object(number: int, body: bytes):
+            offsets.append((number, f.tell()))
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for page, page_id in enumerate(page_ids):
+            lines = " ".join(f"({synthetic_line(page, line)}) '" for line in range(LINES_PER_PAGE))
+            stream = f"BT /F1 9 Tf 40 760 Td 14 TL {lines} ET".encode()
+            write_object(page_id, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+            ).encode())
+            write_object(page_id + 1, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        xref_offset = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for _, offset in sorted(offsets):
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def write_docx(path: str, pages: int):
+    document = docx.Document()
+    for page in range(pages):
+        for line in range(LINES_PER_PAGE):
+            document.add_paragraph(synthetic_line(page, line))
+    document.save(path)
+
+
+def legacy_extract(path: str, filename: str) -> int:
+    """The original path: read the upload into memory, build the full text, then split it"""
+    with open(path, "rb") as f:
+        content = f.read()
+    text = ""
+    if filename.endswith(".pdf"):
+        for page in PyPDF2.PdfReader(io.BytesIO(content)).pages:
+            text += page.extract_text()
+    else:
+        for paragraph in docx.Document(io.BytesIO(content)).paragraphs:
+            text += paragraph.text + "\n"
+    return len(DocumentService.split_text(text))
+
+
+def streaming_extract(path: str, filename: str) -> int:
+    return sum(1 for _ in DocumentService.iter_chunks(DocumentService.iter_pages(path, filename)))
+
+
+def measure(mode: str, path: str, filename: str):
+    extract = legacy_extract if mode == "legacy" else streaming_extract
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = extract(path, filename)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return chunks, peak, max_rss_kb, elapsed
+
+
+def run(args):
+    context = multiprocessing.get_context("spawn")
+    print(f"{'file':<10} {'pages':>6} {'size MB':>8} {'mode':<10} {'chunks':>7} {'py peak MB':>11} {'max RSS MB':>11} {'sec':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind, writer in (("pdf", write_pdf), ("docx", write_docx)):
+            for pages in args.pages:
+                filename = f"synthetic_{pages}.{kind}"
+                path = os.path.join(directory, filename)
+                writer(path, pages)
+                size_mb = os.path.getsize(path) / 1e6
+
+                for mode in ("legacy", "streaming"):
+                    # A fresh process per measurement, so max RSS is not carried over between runs
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        chunks, peak, max_rss_kb, elapsed = pool.submit(measure, mode, path, filename).result()
+                    print(f"{kind:<10} {pages:>6} {size_mb:>8.2f} {mode:<10} {chunks:>7} "
+                          f"{peak / 1e6:>11.2f} {max_rss_kb / 1e3:>11.1f} {elapsed:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 800])
+    run(parser.parse_args())
@@ -0,0 +1,235 @@
+"""Interactive latency and ingestion throughput through the Gemini scheduler, under a simulated quota.
+
+First the scheduler on its own, against fake backends, asserting that: waiting
+interactive calls are admitted before waiting bulk ones; the limit grows by 1/limit per
+call answered in time, halves on a 429 (once for 429s from the same round trip) and then
+grows back additively; and calls failing with 429/503 succeed on retry, while other
+errors and an exhausted retry budget propagate.
+
+Then a stubbed Gemini backend allows --quota requests per second (429 once exceeded) and slows
+down in proportion once more than --capacity calls are in flight. A bulk ingestion of
+--bulk-calls embedding batches runs --bulk-workers at a time while --questions questions
+arrive every --interval seconds, each an embedding and two generations (analysis and
+synthesis). Two setups are compared:
+
+  fixed     the previous behaviour: a fixed limit of --max-concurrency, first come first
+            served, no retries
+  adaptive  priority queues (questions first), an AIMD limit of at most --max-concurrency
+            and jittered retries
+
+For each, the script reports question latency and failures, ingestion calls completed,
+failed and per second, the 429s the provider returned and how the limit moved.
+
+    python -m benchmarks.bench_gemini_scheduler --quota 40 --bulk-calls 300 --questions 40
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted, ServiceUnavailable
+
+from benchmarks.stubs import Quota, StubEmbedder, StubGenerativeModel, StubResponse
+from services.gemini_client import GeminiClient
+from services.gemini_scheduler import GeminiScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from utils.constants import EMBEDDING_TASK_DOCUMENT, EMBEDDING_TASK_QUERY, GEMINI_INITIAL_CONCURRENCY, GEMINI_RATE_LIMIT_DECREASE
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+class FlakyModel:
+    """Fails with each of the given errors in turn, then answers"""
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.001)
+        if self.errors:
+            raise self.errors.pop(0)
+        return StubResponse("answer")
+
+
+async def check_priority(waiting: int):
+    scheduler = GeminiScheduler(2, min_concurrency=2, bulk_share=1.0)
+    admitted = []
+    release = asyncio.Event()
+
+    async def call(priority: str, hold: bool = False):
+        async with scheduler.slot(priority, "generate"):
+            admitted.append(priority)
+            await (release.wait() if hold else asyncio.sleep(0.001))
+
+    holders = [asyncio.create_task(call(PRIORITY_BULK, hold=True)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    queued = [asyncio.create_task(call(PRIORITY_BULK)) for _ in range(waiting)]
+    queued += [asyncio.create_task(call(PRIORITY_INTERACTIVE)) for _ in range(waiting)]
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(*holders, *queued)
+    order = admitted[2:]
+    assert order == [PRIORITY_INTERACTIVE] * waiting + [PRIORITY_BULK] * waiting, order
+    print(f"  {waiting} bulk calls queued before {waiting} interactive ones, limit 2 held -> "
+          f"all {waiting} interactive admitted first")
+
+
+async def check_aimd(successes: int):
+    # A generous latency tolerance leaves 429s as the only congestion signal
+    scheduler = GeminiScheduler(64, min_concurrency=1, latency_tolerance=100.0)
+
+    async def call(fail: bool = False):
+        async with scheduler.slot(PRIORITY_INTERACTIVE, "generate"):
+            await asyncio.sleep(0.005)
+            if fail:
+                raise ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+
+    def grown(limit: float, calls: int) -> float:
+        for _ in range(calls):
+            limit += 1.0 / limit
+        return limit
+
+    assert scheduler.limit == GEMINI_INITIAL_CONCURRENCY
+    for _ in range(successes):
+        await call()
+    expected = grown(float(GEMINI_INITIAL_CONCURRENCY), successes)
+    assert abs(scheduler.limit - expected) < 1e-9, (scheduler.limit, expected)
+    print(f"  {successes} calls in time -> limit {GEMINI_INITIAL_CONCURRENCY} to {scheduler.limit:.2f} (+1/limit each)")
+
+    before = scheduler.limit
+    await asyncio.gather(*(call(fail=True) for _ in range(2)), return_exceptions=True)
+    assert abs(scheduler.limit - before * GEMINI_RATE_LIMIT_DECREASE) < 1e-9, (before, scheduler.limit)
+    print(f"  two 429s from one round trip -> limit {before:.2f} to {scheduler.limit:.2f} (halved once)")
+
+    halved = scheduler.limit
+    for _ in range(successes):
+        await call()
+    expected = grown(halved, successes)
+    assert abs(scheduler.limit - expected) < 1e-9 and scheduler.limit - halved < successes / halved, (scheduler.limit, expected)
+    print(f"  {successes} more calls in time -> limit {halved:.2f} to {scheduler.limit:.2f} (additive)")
+
+
+async def check_retries():
+    client = GeminiClient(4, scheduler=GeminiScheduler(4))
+    client.retries = 2
+    client.model = FlakyModel(ResourceExhausted("quota"), ServiceUnavailable("overloaded"))
+    assert await client.generate("question") == "answer" and client.model.calls == 3, client.model.calls
+    print(f"  429 then 503 -> answered on attempt {client.model.calls}")
+
+    for model, error, calls in ((FlakyModel(InvalidArgument("bad request")), InvalidArgument, 1),
+                                (FlakyModel(*(ResourceExhausted("quota") for _ in range(3))), ResourceExhausted, 3)):
+        client.model = model
+        try:
+            await client.generate("question")
+            raise AssertionError(f"{error.__name__} was swallowed")
+        except error:
+            pass
+        assert model.calls == calls, (error.__name__, model.calls)
+    print("  400 -> raised without retrying; 429 three times -> raised after 1 + 2 retries")
+
+
+async def check_scheduler(args):
+    print("scheduler")
+    await check_priority(args.check_waiting)
+    await check_aimd(args.check_successes)
+    await check_retries()
+
+
+async def bulk(client: GeminiClient, args, priority: str, result: Dict[str, Any]):
+    remaining = iter(range(args.bulk_calls))
+
+    async def worker():
+        for i in remaining:
+            try:
+                await client.embed([f"chunk {i}-{j}" for j in range(args.batch_size)], EMBEDDING_TASK_DOCUMENT, priority=priority)
+                result['done'] += 1
+            except Exception:
+                result['failed'] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.bulk_workers)))
+    result['seconds'] = time.perf_counter() - start
+
+
+async def question(client: GeminiClient, i: int, priority: str, result: Dict[str, Any]):
+    start = time.perf_counter()
+    try:
+        await client.embed(f"question {i}", EMBEDDING_TASK_QUERY, priority=priority)
+        await client.generate(f"Analyze this user query: question {i}", priority=priority)
+        await client.generate(f"Answer question {i}", priority=priority)
+        result['latencies'].append(time.perf_counter() - start)
+    except Exception:
+        result['failed'] += 1
+
+
+async def run_setup(args, client: GeminiClient, bulk_priority: str) -> Dict[str, Any]:
+    questions = {'latencies': [], 'failed': 0}
+    ingestion = {'done': 0, 'failed': 0, 'seconds': 0.0}
+    limits = []
+
+    async def sample_limit():
+        while True:
+            limits.append(client.scheduler.limit)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_limit())
+    bulk_task = asyncio.create_task(bulk(client, args, bulk_priority, ingestion))
+    asked = []
+    for i in range(args.questions):
+        asked.append(asyncio.create_task(question(client, i, PRIORITY_INTERACTIVE, questions)))
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(bulk_task, *asked)
+    sampler.cancel()
+    return {'questions': questions, 'ingestion': ingestion, 'limits': limits}
+
+
+def report(label: str, outcome: Dict[str, Any], quota: Quota, args):
+    latencies, ingestion = outcome['questions']['latencies'], outcome['ingestion']
+    print(f"{label}")
+    print(f"  questions   p50 {percentile(latencies, 50):7.0f} ms   p95 {percentile(latencies, 95):7.0f} ms   "
+          f"max {percentile(latencies, 100):7.0f} ms   failed {outcome['questions']['failed']}/{args.questions}")
+    print(f"  ingestion   {ingestion['done']}/{args.bulk_calls} calls in {ingestion['seconds']:.1f} s "
+          f"({ingestion['done'] / ingestion['seconds']:.1f}/s)   failed {ingestion['failed']}")
+    print(f"  provider    {quota.accepted} accepted, {quota.rejected} rate-limited (429)   "
+          f"limit min {min(outcome['limits']):.1f}, mean {np.mean(outcome['limits']):.1f}, final {outcome['limits'][-1]:.1f}")
+
+
+def run_one(args, adaptive: bool):
+    quota = Quota(args.quota, capacity=args.capacity)
+    StubEmbedder(args.embed_latency, 0.0, quota=quota).install()
+    if adaptive:
+        client = GeminiClient(args.max_concurrency, scheduler=GeminiScheduler(args.max_concurrency))
+    else:
+        scheduler = GeminiScheduler(args.max_concurrency, min_concurrency=args.max_concurrency, bulk_share=1.0)
+        client = GeminiClient(args.max_concurrency, scheduler=scheduler)
+        client.retries = 0
+    client.model = StubGenerativeModel(latency=args.model_latency, quota=quota)
+    # Without priorities, ingestion competes with questions as an equal
+    outcome = asyncio.run(run_setup(args, client, PRIORITY_BULK if adaptive else PRIORITY_INTERACTIVE))
+    report("adaptive (priority, AIMD, retries)" if adaptive else "fixed (FIFO, no retries)", outcome, quota, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=float, default=40.0, help="requests per second the provider accepts")
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--capacity", type=int, default=6, help="calls in flight before the provider slows down")
+    parser.add_argument("--bulk-calls", type=int, default=300)
+    parser.add_argument("--bulk-workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--check-waiting", type=int, default=5, help="queued calls per priority in the priority check")
+    parser.add_argument("--check-successes", type=int, default=20, help="calls per growth step in the AIMD check")
+    args = parser.parse_args()
+    asyncio.run(check_scheduler(args))
+    print()
+    run_one(args, adaptive=False)
+    print()
+    run_one(args, adaptive=True)
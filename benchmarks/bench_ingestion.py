@@ -0,0 +1,89 @@
+"""Compares per-chunk and batched ingestion throughput against stubbed backends.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ingestion --chunks 600
+"""
+import argparse
+import asyncio
+import time
+
+import google.generativeai as genai
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, point_config_at
+from services.document_service import DocumentService
+from services.embedding_cache import embedding_cache
+from utils.config import config
+from utils.constants import EMBEDDING_TASK_DOCUMENT
+
+
+async def legacy_index_chunks(service: DocumentService, doc_id: str, filename: str, chunks):
+    """The original one-embedding, one-insert-per-chunk ingestion loop"""
+    for i, chunk in enumerate(chunks):
+        embedding = genai.embed_content(
+            model=config.GEMINI_EMBEDDING_MODEL,
+            content=chunk,
+            task_type=EMBEDDING_TASK_DOCUMENT
+        )['embedding']
+        await service.typesense.index_document({
+            'id': f"{doc_id}_{i}",
+            'doc_id': doc_id,
+            'filename': filename,
+            'chunk_index': i,
+            'content': chunk,
+            'embedding': embedding
+        })
+
+
+def build_service() -> DocumentService:
+    service = DocumentService()
+    service.typesense.ensure_collection()
+    return service
+
+
+def run(args):
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        run_paths(args)
+
+
+def run_paths(args):
+    StubEmbedder(args.embed_latency).install()
+    chunks = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 30 for i in range(args.chunks)]
+    
+    service = build_service()
+    start = time.perf_counter()
+    asyncio.run(legacy_index_chunks(service, "legacy", "bench.txt", chunks))
+    legacy_elapsed = time.perf_counter() - start
+    
+    embedding_cache.clear()
+    service = build_service()
+    start = time.perf_counter()
+    asyncio.run(service.index_chunks(
+        "batched", "bench.txt", chunks,
+        batch_size=args.batch_size,
+        max_concurrent_batches=args.concurrency
+    ))
+    batched_elapsed = time.perf_counter() - start
+    
+    service = build_service()
+    start = time.perf_counter()
+    asyncio.run(service.index_chunks("reupload", "bench.txt", chunks))
+    cached_elapsed = time.perf_counter() - start
+    
+    print(f"chunks: {args.chunks}")
+    print(f"per-chunk path: {args.chunks / legacy_elapsed:10.1f} chunks/sec ({legacy_elapsed:.2f}s)")
+    print(f"batched path:   {args.chunks / batched_elapsed:10.1f} chunks/sec ({batched_elapsed:.2f}s)")
+    print(f"speedup:        {legacy_elapsed / batched_elapsed:10.1f}x")
+    print(f"re-upload:      {args.chunks / cached_elapsed:10.1f} chunks/sec ({cached_elapsed:.2f}s, embedding cache warm)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--typesense-latency", type=float, default=0.005)
+    run(parser.parse_args())
@@ -0,0 +1,327 @@
+"""Offline load test of the HTTP API plus microbenchmarks, with results written to JSON.
+
+Serves main.app under uvicorn with deterministic stub Gemini models (configurable latency)
+and a local mock Typesense server, then:
+
+  * uploads --uploads synthetic text files at each --concurrency level, timing the
+    /upload request and the time until the ingestion job completes;
+  * sends --asks questions to /ask at each --concurrency level.
+
+Each phase reports p50/p95/p99 latency, throughput, errors and the peak RSS of the
+process seen while it ran. Microbenchmarks time split_text, extract_pdf_text and
+TypesenseClient.shape_hits. Everything is written to --output along with the commit
+and arguments; pass --baseline with an earlier file to print the relative change.
+
+    python -m benchmarks.bench_load --concurrency 1 8 32 --output load.json
+    python -m benchmarks.bench_load --concurrency 1 8 32 --baseline load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_extraction_memory import write_pdf
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import AppServer, StubEmbedder, StubGenerativeModel, fake_vector, point_config_at
+from utils.config import config
+from utils.constants import EMBEDDING_DIMENSION
+
+WORDS = ("retrieval", "agent", "document", "latency", "vector", "index", "answer", "context",
+         "budget", "token", "embedding", "search", "memory", "cache", "stream", "batch")
+
+
+def synthetic_text(seed: int, kilobytes: int) -> str:
+    rng = np.random.default_rng(seed)
+    sentences, size = [], 0
+    while size < kilobytes * 1024:
+        words = rng.choice(WORDS, size=int(rng.integers(6, 20)))
+        sentence = f"Section {seed}.{len(sentences)} covers " + " ".join(words) + "."
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def current_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class RssSampler:
+    """Tracks the peak resident set size of this process while a phase runs"""
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+        self.thread = None
+
+    def sample(self):
+        rss = current_rss_bytes()
+        if rss is None:
+            # ru_maxrss is the lifetime peak in KB, the best available without /proc
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.peak = max(self.peak, rss)
+
+    def run(self):
+        while self.running:
+            self.sample()
+            time.sleep(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.running = True
+        self.sample()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.sample()
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "max": float(values.max())
+    }
+
+
+async def run_phase(name: str, concurrency: int, count: int, request) -> Dict[str, Any]:
+    """Runs count requests with at most concurrency in flight; request(i) returns a dict of named latencies"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: Dict[str, List[float]] = {}
+    errors = []
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                for key, value in (await request(i)).items():
+                    latencies.setdefault(key, []).append(value)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(count)])
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "name": name,
+        "concurrency": concurrency,
+        "requests": count,
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_rps": (count - len(errors)) / elapsed,
+        "latency_ms": {key: summarize(values) for key, values in latencies.items()},
+        "peak_rss_mb": rss.peak / 1e6
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+async def load_phases(base_url: str, args) -> List[Dict[str, Any]]:
+    phases = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for concurrency in args.concurrency:
+            async def upload(i: int, seed: int = concurrency * 100000):
+                body = synthetic_text(seed + i, args.upload_kb).encode()
+                start = time.perf_counter()
+                response = await client.post("/upload", files={"file": (f"load_{seed + i}.txt", body)})
+                response.raise_for_status()
+                accepted = time.perf_counter()
+                job_id = response.json()["job_id"]
+                # A stuck or lost job counts as an error instead of hanging the run
+                deadline = start + args.timeout
+                while True:
+                    job = (await client.get(f"/jobs/{job_id}")).json()
+                    if job["status"] in ("completed", "failed"):
+                        break
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError(f"job {job_id} still {job['status']} after {args.timeout:g}s")
+                    await asyncio.sleep(args.poll_interval)
+                if job["status"] == "failed":
+                    raise RuntimeError(job.get("error"))
+                return {"upload": accepted - start, "ingest": time.perf_counter() - start}
+
+            phases.append(await run_phase("upload", concurrency, args.uploads, upload))
+
+        for concurrency in args.concurrency:
+            async def ask(i: int, prefix: int = concurrency):
+                start = time.perf_counter()
+                response = await client.post("/ask", json={
+                    "question": f"What does section {prefix}.{i % args.distinct_questions} say about retrieval latency?",
+                    "session_id": f"load-{prefix}-{i % concurrency}"
+                })
+                response.raise_for_status()
+                return {"ask": time.perf_counter() - start}
+
+            phases.append(await run_phase("ask", concurrency, args.asks, ask))
+    return phases
+
+
+def time_call(fn, repeat: int) -> Dict[str, float]:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": float(np.median(samples)), "min_ms": float(np.min(samples))}
+
+
+def microbenchmarks(args) -> Dict[str, Any]:
+    from services.document_service import DocumentService
+    from services.typesense_client import TypesenseClient
+
+    text = synthetic_text(1, args.split_kb)
+    split = time_call(lambda: DocumentService.split_text(text), args.repeat)
+    split["mb_per_s"] = len(text) / 1e6 / (split["median_ms"] / 1000)
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        write_pdf(f.name, args.pdf_pages)
+        pdf = open(f.name, "rb").read()
+    extract = time_call(lambda: DocumentService.extract_pdf_text(pdf), max(3, args.repeat // 5))
+    extract["pages_per_s"] = args.pdf_pages / (extract["median_ms"] / 1000)
+
+    hits = [
+        {
+            "document": {
+                "content": synthetic_text(i, 1),
+                "filename": f"doc_{i % 5}.pdf",
+                "doc_id": f"doc_{i % 5}",
+                "chunk_index": i,
+                "embedding": fake_vector(str(i))
+            },
+            "text_match_info": {"score": 1000 - i}
+        }
+        for i in range(args.hits)
+    ]
+    shape = time_call(lambda: TypesenseClient.shape_hits(hits), args.repeat * 10)
+    shape_embeddings = time_call(lambda: TypesenseClient.shape_hits(hits, include_embeddings=True), args.repeat * 10)
+
+    return {
+        "split_text": {"kilobytes": args.split_kb, **split},
+        "extract_pdf_text": {"pages": args.pdf_pages, **extract},
+        "shape_hits": {"hits": args.hits, **shape},
+        "shape_hits_with_embeddings": {"hits": args.hits, "embedding_dimension": EMBEDDING_DIMENSION, **shape_embeddings}
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, Any]):
+    for phase in results["phases"]:
+        for key, latency in phase["latency_ms"].items():
+            print(f"  {phase['name']:<7} c={phase['concurrency']:<4} {key:<7} p50 {latency['p50']:8.1f}  p95 {latency['p95']:8.1f}  "
+                  f"p99 {latency['p99']:8.1f} ms  {phase['throughput_rps']:7.1f} req/s  "
+                  f"rss {phase['peak_rss_mb']:6.0f} MB  errors {phase['errors']}")
+    for name, micro in results["micro"].items():
+        print(f"  {name:<27} {json.dumps({k: round(v, 4) if isinstance(v, float) else v for k, v in micro.items()})}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nchange vs {baseline.get('commit') or 'baseline'} (negative latency / positive throughput is better)")
+    previous = {(p["name"], p["concurrency"]): p for p in baseline.get("phases", [])}
+    for phase in results["phases"]:
+        old = previous.get((phase["name"], phase["concurrency"]))
+        if old is None:
+            continue
+        for key, latency in phase["latency_ms"].items():
+            old_latency = old["latency_ms"].get(key)
+            if not old_latency:
+                continue
+            deltas = "  ".join(f"{q} {(latency[q] / old_latency[q] - 1) * 100:+6.1f}%" for q in ("p50", "p95", "p99"))
+            print(f"  {phase['name']:<7} c={phase['concurrency']:<4} {key:<7} {deltas}  "
+                  f"throughput {(phase['throughput_rps'] / old['throughput_rps'] - 1) * 100:+6.1f}%")
+    for name, micro in results["micro"].items():
+        old = baseline.get("micro", {}).get(name, {})
+        if "median_ms" in micro and old.get("median_ms"):
+            print(f"  {name:<27} median {(micro['median_ms'] / old['median_ms'] - 1) * 100:+6.1f}%")
+
+
+def run(args):
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "phases": [],
+        "micro": {}
+    }
+
+    if not args.micro_only:
+        # Keep jobs and spooled uploads out of the working directory
+        config.UPLOAD_DIR = tempfile.mkdtemp(prefix="bench-uploads-")
+        config.JOB_STORE_URL = f"sqlite:///{config.UPLOAD_DIR}/jobs.sqlite3"
+        with MockTypesenseServer(latency=args.typesense_latency) as typesense:
+            point_config_at(typesense)
+            StubEmbedder(request_latency=args.embed_latency, item_latency=0.0).install()
+
+            import main
+            main.agent_service.gemini.model = StubGenerativeModel(latency=args.model_latency)
+
+            with AppServer(main.app) as app_server:
+                results["phases"] = asyncio.run(load_phases(app_server.url, args))
+
+    results["micro"] = microbenchmarks(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--asks", type=int, default=128)
+    parser.add_argument("--distinct-questions", type=int, default=1000000,
+                        help="fewer distinct questions than asks lets the answer cache serve repeats")
+    parser.add_argument("--model-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--typesense-latency", type=float, default=0.005)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per request, and per upload until its job finishes")
+    parser.add_argument("--split-kb", type=int, default=512)
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--hits", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--output", default="bench_load.json")
+    parser.add_argument("--baseline")
+    run(parser.parse_args())
@@ -0,0 +1,73 @@
+"""Per-call overhead of the latency instrumentation and the cost of a /metrics scrape.
+
+Times an empty block with and without metrics.track on label-bound children, a bare
+histogram observe, a label lookup, and TypesenseClient-style per-call instrumentation,
+then renders the registry after populating it with a realistic set of series.
+
+    python -m benchmarks.bench_metrics_overhead --iterations 200000
+"""
+import argparse
+import time
+
+from services.metrics import (
+    track,
+    render_metrics,
+    AGENT_NODE_SECONDS,
+    AGENT_NODE_IN_FLIGHT,
+    AGENT_NODE_ERRORS,
+    TYPESENSE_SECONDS,
+    TYPESENSE_IN_FLIGHT
+)
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(args):
+    latency = AGENT_NODE_SECONDS.labels("bench")
+    in_flight = AGENT_NODE_IN_FLIGHT.labels("bench")
+    errors = AGENT_NODE_ERRORS.labels("bench")
+
+    def baseline():
+        pass
+
+    def tracked():
+        with track(latency, in_flight, errors):
+            pass
+
+    def observe():
+        latency.observe(0.01)
+
+    def label_lookup():
+        AGENT_NODE_SECONDS.labels("bench")
+
+    def typesense_style():
+        TYPESENSE_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        TYPESENSE_SECONDS.labels("POST", "/multi_search").observe(time.perf_counter() - start)
+        TYPESENSE_IN_FLIGHT.dec()
+
+    base = per_call_us(baseline, args.iterations)
+    print(f"{args.iterations} iterations, per call (empty function call subtracted, {base:.3f} us)")
+    for name, fn in (("histogram observe", observe), ("labels() lookup", label_lookup),
+                     ("track() with bound children", tracked), ("typesense request hooks", typesense_style)):
+        print(f"  {name:<30} {per_call_us(fn, args.iterations) - base:>8.3f} us")
+
+    for i in range(args.endpoints):
+        TYPESENSE_SECONDS.labels("GET", f"/bench/{i}").observe(0.01)
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        body, _ = render_metrics()
+    print(f"\n/metrics render: {(time.perf_counter() - start) / args.scrapes * 1000:.2f} ms, {len(body) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--endpoints", type=int, default=20)
+    parser.add_argument("--scrapes", type=int, default=50)
+    run(parser.parse_args())
@@ -0,0 +1,106 @@
+"""Re-uploading identical and revised documents through the ingestion queue, against stubbed backends.
+
+A synthetic text document of --pages pages is uploaded, then uploaded again unchanged,
+then as revisions with --edited pages changed, with pages appended and with pages cut.
+For each upload the script reports wall time and how many chunks were reused,
+re-embedded and deleted, next to the same revision uploaded under a new filename with
+one extra line (a full index). The embedding cache is cleared before every upload, so
+reuse comes from the previous version only.
+
+    python -m benchmarks.bench_reindex --pages 200 --edited 3
+"""
+import argparse
+import asyncio
+import io
+import random
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, point_config_at
+from services.document_service import DocumentService
+from services.embedding_cache import embedding_cache
+from services.ingestion_queue import IngestionQueue
+from services.job_store import JobStore, JOB_COMPLETED, JOB_FAILED
+from utils.config import config
+
+WORDS = "the of and a to in is you that it he was for on are as with his they at be this have from".split()
+
+
+def make_pages(count: int, rng: random.Random) -> List[str]:
+    pages = []
+    for _ in range(count):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 25))).capitalize() + "."
+                     for _ in range(rng.randint(15, 30))]
+        pages.append(" ".join(sentences) + "\n\n")
+    return pages
+
+
+def edit_pages(pages: List[str], count: int, rng: random.Random) -> List[str]:
+    edited = list(pages)
+    for i in rng.sample(range(len(pages)), count):
+        edited[i] = edited[i].replace(".", " with a revised clause.", 1)
+    return edited
+
+
+async def upload(queue: IngestionQueue, filename: str, pages: List[str]) -> Dict[str, Any]:
+    embedding_cache.clear()
+    start = time.perf_counter()
+    job = await queue.submit(filename, io.BytesIO("".join(pages).encode("utf-8")))
+    while job["status"] not in (JOB_COMPLETED, JOB_FAILED):
+        await asyncio.sleep(0.02)
+        job = await queue.get(job["job_id"]) | {"deduplicated": job["deduplicated"]}
+    return job | {"seconds": time.perf_counter() - start}
+
+
+def report(label: str, job: Dict[str, Any]):
+    print(f"  {label:<26} {job['seconds'] * 1000:8.0f} ms   chunks {job['chunks_total']:>5}   "
+          f"reused {job['chunks_reused']:>5}   re-embedded {job['chunks_embedded']:>5}   "
+          f"deleted {job['chunks_deleted']:>4}   {'deduplicated' if job['deduplicated'] else job['status']}")
+
+
+async def run_uploads(args):
+    rng = random.Random(7)
+    pages = make_pages(args.pages, rng)
+    revisions = [
+        (f"{args.edited} pages edited", edit_pages(pages, args.edited, rng)),
+        (f"{args.appended} pages appended", pages + make_pages(args.appended, rng)),
+        (f"last {args.cut} pages cut", pages[:-args.cut])
+    ]
+
+    queue = IngestionQueue(DocumentService(), JobStore(f"sqlite:///{tempfile.mkdtemp(prefix='bench-reindex-')}/jobs.sqlite3"))
+    await queue.start()
+    try:
+        print(f"{args.pages} pages, embedding batch {config.EMBEDDING_BATCH_SIZE}")
+        report("first upload", await upload(queue, "report.txt", pages))
+        report("identical re-upload", await upload(queue, "report.txt", pages))
+        for n, (label, revision) in enumerate(revisions):
+            report(label, await upload(queue, "report.txt", revision))
+            # A trailing line keeps the copy from being recognised as the same file
+            report("  same, as a new document", await upload(queue, f"copy-{n}.txt", revision + [f"Copy {n}."]))
+            # Back to the original so every revision is measured against it
+            await upload(queue, "report.txt", pages)
+    finally:
+        await queue.stop()
+
+
+def run(args):
+    config.UPLOAD_DIR = tempfile.mkdtemp(prefix="bench-reindex-uploads-")
+    StubEmbedder(args.embed_latency, args.embed_item_latency).install()
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        DocumentService().typesense.ensure_collection()
+        asyncio.run(run_uploads(args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--edited", type=int, default=3)
+    parser.add_argument("--appended", type=int, default=10)
+    parser.add_argument("--cut", type=int, default=10)
+    parser.add_argument("--embed-latency", type=float, default=0.2)
+    parser.add_argument("--embed-item-latency", type=float, default=0.002)
+    parser.add_argument("--typesense-latency", type=float, default=0.005)
+    run(parser.parse_args())
@@ -0,0 +1,64 @@
+"""MMR re-ranking and near-duplicate suppression on synthetic candidates with duplicated chunks.
+
+Candidates are drawn from a set of topics; each topic's chunk appears several times with
+small perturbations, as overlapping uploads and boilerplate do. Reports how many distinct
+topics reach the top-k with plain rank order vs re-ranking, and the re-ranking latency.
+
+    python -m benchmarks.bench_rerank --limit 10 --overfetch 3
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from services.reranker import Reranker
+from utils.constants import EMBEDDING_DIMENSION
+
+
+def synthetic_candidates(rng: np.random.Generator, count: int, copies: int, noise: float):
+    topics = rng.normal(size=(count // copies + 1, EMBEDDING_DIMENSION)).astype(np.float32)
+    query = topics[:4].mean(axis=0) + rng.normal(scale=0.5, size=EMBEDDING_DIMENSION)
+    labels = np.repeat(np.arange(len(topics)), copies)[:count]
+    vectors = topics[labels] + rng.normal(scale=noise, size=(count, EMBEDDING_DIMENSION))
+
+    # Search rank order: most query-similar first, so copies of a good chunk cluster at the top
+    order = np.argsort(-(vectors @ query / np.linalg.norm(vectors, axis=1)))
+    docs = [{"content": f"topic {labels[i]}", "topic": int(labels[i]), "embedding": vectors[i].tolist()} for i in order]
+    return query.tolist(), docs
+
+
+def run(args):
+    rng = np.random.default_rng(11)
+    reranker = Reranker(mmr_lambda=args.mmr_lambda, duplicate_threshold=args.threshold)
+    count = args.limit * args.overfetch
+
+    plain_topics, reranked_topics, removed, latencies = [], [], [], []
+    for _ in range(args.queries):
+        query, docs = synthetic_candidates(rng, count, args.copies, args.noise)
+        plain_topics.append(len({doc["topic"] for doc in docs[:args.limit]}))
+
+        start = time.perf_counter()
+        selected, stats = reranker.rerank(query, docs, args.limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        reranked_topics.append(len({doc["topic"] for doc in selected}))
+        removed.append(stats["duplicates_removed"])
+
+    print(f"candidates: {count} ({args.copies} near-copies per chunk), top-k: {args.limit}")
+    print(f"distinct chunks in top-k, rank order:  {statistics.mean(plain_topics):.1f}")
+    print(f"distinct chunks in top-k, re-ranked:   {statistics.mean(reranked_topics):.1f}")
+    print(f"duplicates removed per query:          {statistics.mean(removed):.1f}")
+    print(f"re-rank latency:                       {statistics.mean(latencies):.3f} ms mean, "
+          f"{np.percentile(latencies, 99):.3f} ms p99")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=3)
+    parser.add_argument("--copies", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--mmr-lambda", type=float, default=0.7)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--queries", type=int, default=500)
+    run(parser.parse_args())
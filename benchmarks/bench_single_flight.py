@@ -0,0 +1,134 @@
+"""Single-flight coalescing of identical concurrent questions, embeddings and searches.
+
+First SingleFlight on its own, against a counting backend: --requests concurrent calls
+with one key make one backend call, a cancelled caller does not cancel the call for the
+others, the call is cancelled once every caller is gone, and an error reaches every caller.
+
+Then /ask end to end with stubbed Gemini and a mock Typesense: --requests users in
+different sessions ask the same question at once, then the same question with different
+case and spacing, then --requests different questions, reporting model calls, embedding calls, search requests and latency for each.
+
+    python -m benchmarks.bench_single_flight --requests 100
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, StubGenerativeModel, point_config_at, wait_until_ready
+from services.answer_cache import answer_cache
+from services.embedding_cache import embedding_cache
+from services.single_flight import SingleFlight
+
+
+class CountingBackend:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.cancelled = 0
+
+    async def call(self, fail: bool = False):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if fail:
+            raise RuntimeError("backend failed")
+        return "result"
+
+
+async def check_single_flight(requests: int, latency: float):
+    print("SingleFlight")
+    backend, flights = CountingBackend(latency), SingleFlight("bench")
+    results = await asyncio.gather(*(flights.run("key", backend.call) for _ in range(requests)))
+    assert backend.calls == 1 and results == ["result"] * requests, (backend.calls, results[:3])
+    print(f"  {requests} identical concurrent calls -> {backend.calls} backend call; stats {flights.stats()}")
+
+    backend = CountingBackend(latency)
+    waiters = [asyncio.create_task(flights.run("key", backend.call)) for _ in range(requests)]
+    await asyncio.sleep(latency / 4)
+    for waiter in waiters[:requests // 2]:
+        waiter.cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    answered = sum(result == "result" for result in results)
+    assert backend.calls == 1 and backend.cancelled == 0 and answered == requests - requests // 2
+    print(f"  {requests // 2} of {requests} callers cancelled (the first, which started the call, among them) "
+          f"-> call not cancelled, {answered} answered")
+
+    backend = CountingBackend(latency)
+    waiters = [asyncio.create_task(flights.run("key", backend.call)) for _ in range(requests)]
+    await asyncio.sleep(latency / 4)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert backend.cancelled == 1 and flights.stats()["in_flight"] == 0
+    print("  every caller cancelled -> call cancelled")
+
+    backend = CountingBackend(latency)
+    results = await asyncio.gather(*(flights.run("key", lambda: backend.call(fail=True)) for _ in range(requests)),
+                                   return_exceptions=True)
+    assert backend.calls == 1 and all(isinstance(result, RuntimeError) for result in results)
+    print(f"  failing call -> {len(results)} callers get the error from {backend.calls} backend call")
+
+
+def reset_caches():
+    embedding_cache.clear()
+    answer_cache.bump_generation()
+
+
+async def ask_all(client: httpx.AsyncClient, questions):
+    async def ask(i: int, question: str):
+        start = time.perf_counter()
+        response = await client.post("/ask", json={"question": question, "session_id": f"user-{i}"})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(ask(i, question) for i, question in enumerate(questions)))
+
+
+async def check_ask(app, args, server: MockTypesenseServer, embedder: StubEmbedder, model: StubGenerativeModel):
+    print("\n/ask")
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await wait_until_ready(client)
+        cases = [
+            ("same question", ["What changed in the announcement?"] * args.requests),
+            ("same, other case/spacing", ["what changed in the  announcement?" if i % 2 else "What changed in the announcement?"
+                                          for i in range(args.requests)]),
+            ("different questions", [f"What changed in section {i}?" for i in range(args.requests)])
+        ]
+        for label, questions in cases:
+            reset_caches()
+            before = (model.calls, embedder.calls, server.request_count)
+            latencies = sorted(await ask_all(client, questions))
+            print(f"  {label:<26} {len(questions)} requests: model calls {model.calls - before[0]:>4}   "
+                  f"embed calls {embedder.calls - before[1]:>4}   typesense requests {server.request_count - before[2]:>4}   "
+                  f"p50 {latencies[len(latencies) // 2] * 1000:6.0f} ms   max {latencies[-1] * 1000:6.0f} ms")
+        print(f"  single-flight stats: {(await client.get('/cache/stats')).json()['single_flight']}")
+
+
+def run(args):
+    asyncio.run(check_single_flight(args.requests, args.backend_latency))
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        embedder = StubEmbedder(args.embed_latency, 0.0).install()
+
+        import main
+        model = StubGenerativeModel(latency=args.model_latency)
+        main.agent_service.gemini.model = model
+        asyncio.run(check_ask(main.app, args, server, embedder, model))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--backend-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--model-latency", type=float, default=0.2)
+    parser.add_argument("--typesense-latency", type=float, default=0.01)
+    run(parser.parse_args())
@@ -0,0 +1,63 @@
+"""Compares per-node latency of the agent graph with and without speculative retrieval.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_speculative --model-latency 0.4 --embed-latency 0.1
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import StubEmbedder, StubGenerativeModel, point_config_at
+from services.agent_service import AgentService
+from services.embedding_cache import embedding_cache
+from utils.config import config
+
+NODES = ["query_analyzer", "query_analyzer_llm", "speculative_embedding", "speculative_search",
+         "search_strategy", "document_retrieval", "answer_synthesis"]
+
+
+async def run_mode(agent: AgentService, label: str, queries: int):
+    totals, timings, hits = [], {node: [] for node in NODES}, 0
+    for i in range(queries):
+        state = agent.build_initial_state(f"{label} question {i}", "bench", "")
+        start = time.perf_counter()
+        final_state = await agent.graph.ainvoke(state)
+        totals.append((time.perf_counter() - start) * 1000)
+        hits += bool(final_state["speculative_hit"])
+        for node in NODES:
+            if node in final_state["timings"]:
+                timings[node].append(final_state["timings"][node])
+    
+    print(f"\n{label} (speculative reuse {hits}/{queries})")
+    print(f"  {'total':<24} {statistics.median(totals):8.1f} ms")
+    for node, values in timings.items():
+        if values:
+            print(f"  {node:<24} {statistics.median(values):8.1f} ms")
+
+
+def run(args):
+    with MockTypesenseServer(latency=args.typesense_latency) as server:
+        point_config_at(server)
+        StubEmbedder(request_latency=args.embed_latency, item_latency=0.0).install()
+        agent = AgentService(memory_service=None)
+        agent.typesense.ensure_collection()
+        agent.gemini.model = StubGenerativeModel(latency=args.model_latency)
+        
+        for speculative in (False, True):
+            config.SPECULATIVE_RETRIEVAL = speculative
+            agent.graph = agent.create_agent_graph()
+            embedding_cache.clear()
+            label = "speculative" if speculative else "sequential"
+            asyncio.run(run_mode(agent, label, args.queries))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--model-latency", type=float, default=0.4)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--typesense-latency", type=float, default=0.05)
+    run(parser.parse_args())
@@ -0,0 +1,135 @@
+"""Import time and time-to-ready of the app, each measured in a fresh interpreter.
+
+For every run a child process imports main, enters the app's lifespan and polls /ready
+(on trees without /ready, startup counts as ready once the lifespan has started). Two
+scenarios run against a local mock Typesense server: Typesense already up, and
+Typesense only coming up --typesense-delay seconds after the app starts. The slowest
+modules imported by main are listed from -X importtime.
+
+    python -m benchmarks.bench_startup --runs 5 --typesense-delay 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_typesense import MockTypesenseServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time
+start = time.perf_counter()
+import asyncio, json
+import benchmarks
+import main
+imported = time.perf_counter()
+
+async def measure():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://startup") as client:
+            while True:
+                status = (await client.get("/ready")).status_code
+                if status != 503:
+                    break
+                await asyncio.sleep(0.1)
+        return started, time.perf_counter()
+
+started, ready = asyncio.run(measure())
+print(json.dumps({"import": imported - start, "lifespan": started - imported, "ready": ready - start}))
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def child_env(port: int) -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "TYPESENSE_HOST": "127.0.0.1",
+        "TYPESENSE_PORT": str(port),
+        "TYPESENSE_PROTOCOL": "http"
+    }
+
+
+def start_child(port: int) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", CHILD], env=child_env(port), cwd=tempfile.mkdtemp(prefix="bench-startup-"),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def finish_child(child: subprocess.Popen, timeout: float) -> dict:
+    try:
+        out, err = child.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        child.kill()
+        return {"error": "timed out"}
+    if child.returncode != 0:
+        return {"error": err.strip().splitlines()[-1] if err.strip() else f"exit {child.returncode}"}
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run_scenario(label: str, runs: int, delay: float, timeout: float):
+    results = []
+    for _ in range(runs):
+        port = free_port()
+        if delay:
+            child = start_child(port)
+            time.sleep(delay)
+            with MockTypesenseServer(port=port):
+                results.append(finish_child(child, timeout))
+        else:
+            with MockTypesenseServer(port=port):
+                results.append(finish_child(start_child(port), timeout))
+
+    failures = [r["error"] for r in results if "error" in r]
+    ok = [r for r in results if "error" not in r]
+    print(f"{label}: {len(ok)}/{runs} runs became ready")
+    for key in ("import", "lifespan", "ready"):
+        if ok:
+            values = [r[key] * 1000 for r in ok]
+            print(f"  {key:<9} median {statistics.median(values):8.0f} ms   min {min(values):8.0f} ms")
+    if failures:
+        print(f"  first failure: {failures[0]}")
+
+
+def import_breakdown(top: int):
+    port = free_port()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import benchmarks, main"], env=child_env(port),
+                            cwd=tempfile.mkdtemp(prefix="bench-startup-"), capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Direct imports of main are indented one level
+        if name.startswith("   ") and not name.startswith("    ") and cumulative.strip().isdigit():
+            modules.append((int(cumulative) / 1000, name.strip()))
+    print(f"\nslowest imports under main (cumulative ms, first import wins the cost):")
+    for ms, name in sorted(modules, reverse=True)[:top]:
+        print(f"  {ms:8.1f}  {name}")
+
+
+def run(args):
+    run_scenario("typesense up", args.runs, 0.0, args.timeout)
+    run_scenario(f"typesense up after {args.typesense_delay:.1f}s", args.runs, args.typesense_delay, args.timeout)
+    import_breakdown(args.top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--typesense-delay", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--top", type=int, default=10)
+    run(parser.parse_args())
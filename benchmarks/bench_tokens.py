@@ -0,0 +1,127 @@
+"""Token-aware chunking, batched token counting and prompt packing on a large synthetic corpus.
+
+    python -m benchmarks.bench_tokens --megabytes 20
+
+Uses the TOKENIZER_ENCODING tiktoken encoding; where it cannot be loaded (tiktoken
+downloads encodings on first use) the approximate counter is used and reported.
+"""
+import argparse
+import random
+import statistics
+import time
+import warnings
+
+from services.context_packer import ContextPacker
+from services.document_service import DocumentService
+from services.tokenizer import TokenCounter
+
+VOCABULARY = (
+    "the a of retrieval agent embedding chunk index query vector memory latency batch stream context "
+    "document answer synthesis strategy hybrid keyword semantic search result score token budget prompt "
+    "session history model gemini typesense cluster node replica throughput concurrency pipeline cache"
+).split()
+
+
+def synthetic_corpus(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < megabytes * 1e6:
+        sentences = [
+            " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(6, 30))).capitalize() + rng.choice(".?!")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def legacy_split_text(text: str, chunk_size: int = 1000):
+    """The previous character-count chunker"""
+    chunks, current, current_size = [], [], 0
+    for word in text.split():
+        if current_size + len(word) > chunk_size and current:
+            chunks.append(" ".join(current))
+            current, current_size = [word], len(word)
+        else:
+            current.append(word)
+            current_size += len(word) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(args):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        counter = TokenCounter(args.encoding)
+        counter.count("warm up")
+    print(f"token counter: {'tiktoken ' + counter.encoding_name if counter.exact else 'approximate (encoding unavailable)'}")
+
+    corpus = synthetic_corpus(args.megabytes)
+    megabytes = len(corpus) / 1e6
+    segments = [corpus[i:i + 64 * 1024] for i in range(0, len(corpus), 64 * 1024)]
+
+    legacy_chunks, legacy_seconds = timed(legacy_split_text, corpus)
+    token_chunks, token_seconds = timed(
+        lambda: list(DocumentService.iter_chunks(segments, args.chunk_tokens, args.overlap_tokens, counter))
+    )
+    legacy_tokens = counter.count_batch(legacy_chunks)
+    chunk_tokens = counter.count_batch(token_chunks)
+
+    print(f"\ncorpus: {megabytes:.1f} MB")
+    print(f"{'chunker':<22} {'chunks':>8} {'MB/s':>8} {'mean tok':>9} {'max tok':>8} {'stdev':>7}")
+    for name, chunks, tokens, seconds in (
+        ("chars (1000)", legacy_chunks, legacy_tokens, legacy_seconds),
+        (f"tokens ({args.chunk_tokens}/{args.overlap_tokens})", token_chunks, chunk_tokens, token_seconds),
+    ):
+        print(f"{name:<22} {len(chunks):>8} {megabytes / seconds:>8.1f} {statistics.mean(tokens):>9.1f} "
+              f"{max(tokens):>8} {statistics.pstdev(tokens):>7.1f}")
+
+    sample = token_chunks[:args.count_sample]
+    _, single_seconds = timed(lambda: [counter.count_batch([text])[0] for text in sample])
+    _, batch_seconds = timed(counter.count_batch, sample)
+    _, cached_seconds = timed(counter.count_batch, sample, True)
+    _, warm_seconds = timed(counter.count_batch, sample, True)
+    print(f"\ntoken counting, {len(sample)} chunks:")
+    print(f"  one call per chunk:  {len(sample) / single_seconds:>12.0f} chunks/s")
+    print(f"  one batched call:    {len(sample) / batch_seconds:>12.0f} chunks/s")
+    print(f"  cached, cold:        {len(sample) / cached_seconds:>12.0f} chunks/s")
+    print(f"  cached, warm:        {len(sample) / warm_seconds:>12.0f} chunks/s")
+
+    packer = ContextPacker(counter, budget=args.budget)
+    fields = {"query": "how does hybrid retrieval work?", "intent": "explanation",
+              "key_concepts": "hybrid retrieval", "context": ""}
+    rng = random.Random(3)
+    print(f"\nprompt for a limit-{args.limit} query, budget {args.budget} tokens:")
+    for name, chunks in (("chars (1000)", legacy_chunks), (f"tokens ({args.chunk_tokens})", token_chunks)):
+        unbounded, packed, latencies, dropped = [], [], [], []
+        for _ in range(args.queries):
+            docs = [{"filename": "corpus.txt", "content": chunk} for chunk in rng.sample(chunks, args.limit)]
+            full = "\n\n".join(ContextPacker.format_doc(doc) for doc in docs)
+            unbounded.append(counter.count(packer.pack([], budget=10 ** 9, **fields)["prompt"] + full))
+            result, seconds = timed(packer.pack, docs, **fields)
+            packed.append(result["tokens"])
+            latencies.append(seconds * 1e3)
+            dropped.append(result["dropped"])
+        print(f"  {name:<14} unbounded {statistics.mean(unbounded):>7.0f} tok, packed {statistics.mean(packed):>6.0f} tok "
+              f"(max {max(packed)}), {statistics.mean(dropped):.1f} chunks dropped, pack {statistics.mean(latencies):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--encoding", default=None)
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--count-sample", type=int, default=5000)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    run(parser.parse_args())
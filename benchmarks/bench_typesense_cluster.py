@@ -0,0 +1,219 @@
+"""Load balancing, failover and circuit breaking across a cluster of mock Typesense nodes.
+
+Three MockTypesenseServers share one data set, like replicas. Node 0 and 1 answer in
+--fast-latency, node 2 in --slow-latency. The script reports, and asserts, per phase:
+
+  balance   how reads spread over the nodes and their p50/p99, against a single fast node;
+            no read fails and the slow node gets the smallest share
+  outage    node 1 fails every request mid-run, with health checks paused so only its
+            circuit breaker can shed it: no read or write fails, the circuit opens, and
+            reads stay off the node afterwards
+  flaky     node 1 fails --failure-rate of requests: every write and read succeeds with retries
+  recovery  node 1 is healthy again: it takes reads again within the cooldown plus a few
+            health checks
+
+An assertion failure exits non-zero, so a broken node pool or circuit breaker fails the run.
+
+    python -m benchmarks.bench_typesense_cluster --reads 600 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import point_config_at
+from services.typesense_client import TypesenseClient
+from utils.config import config
+from utils.constants import TYPESENSE_SCHEMA_FIELDS
+
+
+def documents(count: int) -> List[Dict[str, Any]]:
+    return [{'id': f"doc_{i}", 'doc_id': "doc", 'filename': "bench.txt", 'chunk_index': i,
+             'content': f"chunk {i} lorem ipsum", 'embedding': [0.1] * 768} for i in range(count)]
+
+
+async def timed_reads(client: TypesenseClient, count: int, concurrency: int) -> Dict[str, Any]:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.search({'q': f"chunk {i % 50}", 'query_by': 'content', 'per_page': 5})
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(read(i) for i in range(count)))
+    return {'latencies': latencies, 'errors': errors}
+
+
+async def timed_writes(client: TypesenseClient, count: int, concurrency: int, offset: int) -> Dict[str, Any]:
+    ok, errors = 0, 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def write(i: int):
+        nonlocal ok, errors
+        async with semaphore:
+            try:
+                await client.import_documents(documents(offset + i + 1)[-1:])
+                ok += 1
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(write(i) for i in range(count)))
+    return {'ok': ok, 'errors': errors}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def shed(node) -> bool:
+    return node.state != "closed" or not node.healthy
+
+
+def request_counts(servers: List[MockTypesenseServer]) -> List[int]:
+    return [server.request_count for server in servers]
+
+
+def shares(before: List[int], after: List[int]) -> List[float]:
+    total = sum(after) - sum(before) or 1
+    return [(a - b) / total for a, b in zip(after, before)]
+
+
+def describe(label: str, result: Dict[str, Any], share: List[float] = None):
+    latencies = result['latencies']
+    line = f"  {label:<22} p50 {percentile(latencies, 50):7.1f} ms   p99 {percentile(latencies, 99):7.1f} ms   errors {result['errors']}"
+    if share is not None:
+        line += "   share per node " + "  ".join(f"{s:4.0%}" for s in share)
+    print(line)
+
+
+async def balance(args, client: TypesenseClient, servers: List[MockTypesenseServer]):
+    print("balance (reads; health checks count towards the shares)")
+    before = request_counts(servers)
+    reads = await timed_reads(client, args.reads, args.concurrency)
+    share = shares(before, request_counts(servers))
+    describe("cluster", reads, share)
+    assert reads['errors'] == 0, f"{reads['errors']} reads failed with every node up"
+    assert share[2] < min(share[:2]), f"slow node 2 was not avoided: shares {share}"
+
+    single = TypesenseClient()
+    single.base_url = f"http://{servers[0].host}:{servers[0].port}"
+    describe("single fast node", await timed_reads(single, args.reads, args.concurrency))
+
+
+async def outage(args, client: TypesenseClient, servers: List[MockTypesenseServer]):
+    print("\noutage (node 1 answers 503, health checks paused)")
+    node = client.nodes.nodes[1]
+    await client.stop_health_checks()
+    opened = node.counters['circuit_opened']
+    before = servers[1].request_count
+    servers[1].available = False
+    failed_at = time.perf_counter()
+    reads = asyncio.create_task(timed_reads(client, args.reads, args.concurrency))
+    writes = asyncio.create_task(timed_writes(client, args.writes, args.concurrency, 0))
+    while not shed(node) and not reads.done():
+        await asyncio.sleep(0.001)
+    shed_at = time.perf_counter()
+    shed_ms = (shed_at - failed_at) * 1000
+    shed_requests = servers[1].request_count - before
+    reads, writes = await reads, await writes
+    trials = int((time.perf_counter() - shed_at) / config.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS) + 1
+    after_shed = servers[1].request_count - before - shed_requests
+    describe("reads during outage", reads)
+    print(f"  writes during outage   {writes['ok']}/{args.writes} succeeded")
+    print(f"  circuit opened after {shed_requests} requests to the node, {shed_ms:.0f} ms; "
+          f"{after_shed} requests reached it afterwards")
+    assert reads['errors'] == 0, f"{reads['errors']} reads failed during the outage"
+    assert writes['errors'] == 0, f"{writes['errors']} writes failed during the outage"
+    assert node.counters['circuit_opened'] > opened, f"node 1's circuit never opened: {node.stats()}"
+    # Reads and writes already on their way when it opened, plus one trial request per cooldown
+    assert after_shed <= 2 * args.concurrency + trials, f"{after_shed} requests still reached node 1 after its circuit opened"
+    client.start_health_checks()
+
+
+async def flaky(args, client: TypesenseClient, servers: List[MockTypesenseServer]):
+    print(f"\nflaky (node 1 fails {args.failure_rate:.0%} of requests)")
+    servers[1].available = True
+    servers[1].failure_rate = args.failure_rate
+    client.nodes.nodes[1].health_checked(True, 0.0)
+    writes = await timed_writes(client, args.writes, args.concurrency, args.writes)
+    print(f"  writes                 {writes['ok']}/{args.writes} succeeded")
+    reads = await timed_reads(client, args.reads, args.concurrency)
+    describe("reads", reads)
+    servers[1].failure_rate = 0.0
+    assert writes['errors'] == 0, f"{writes['errors']} writes failed despite retries"
+    assert reads['errors'] == 0, f"{reads['errors']} reads failed despite failover"
+
+
+async def recovery(args, client: TypesenseClient, servers: List[MockTypesenseServer]):
+    print("\nrecovery (node 1 fails, then comes back)")
+    node = client.nodes.nodes[1]
+    # Recovery comes from a passing health check or the cooldown's trial request, whichever is first
+    timeout = config.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS + 3 * config.TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS + 1
+    servers[1].available = False
+    deadline = time.perf_counter() + timeout
+    while not shed(node):
+        assert time.perf_counter() < deadline, "node 1 was never shed while failing"
+        await timed_reads(client, args.concurrency, args.concurrency)
+    servers[1].available = True
+    recovered_at = time.perf_counter()
+    before = servers[1].request_count
+    while shed(node) or servers[1].request_count - before < 10:
+        assert time.perf_counter() - recovered_at < timeout, f"node 1 not back in rotation after {timeout:.1f}s: {node.stats()}"
+        reads = await timed_reads(client, args.concurrency, args.concurrency)
+        assert reads['errors'] == 0, f"{reads['errors']} reads failed while node 1 recovered"
+    print(f"  node 1 back in rotation after {(time.perf_counter() - recovered_at) * 1000:.0f} ms "
+          f"(health check every {config.TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS:.1f}s, "
+          f"cooldown {config.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS:.1f}s)")
+    print("\nnodes:")
+    for stats in client.nodes.stats():
+        print(f"  {stats}")
+
+
+async def run_phases(args, servers: List[MockTypesenseServer]):
+    point_config_at(*servers)
+    client = TypesenseClient()
+    await client.ensure_collections({config.COLLECTION_NAME: TYPESENSE_SCHEMA_FIELDS})
+    await client.import_documents(documents(50))
+    client.start_health_checks()
+    try:
+        await balance(args, client, servers)
+        await outage(args, client, servers)
+        await flaky(args, client, servers)
+        await recovery(args, client, servers)
+    finally:
+        await client.stop_health_checks()
+
+
+def run(args):
+    config.TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS = args.health_interval
+    config.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS = args.cooldown
+    shared: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    latencies = (args.fast_latency, args.fast_latency, args.slow_latency)
+    servers = [MockTypesenseServer(latency=latency, collections=shared).start() for latency in latencies]
+    try:
+        asyncio.run(run_phases(args, servers))
+    finally:
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=600)
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--fast-latency", type=float, default=0.005)
+    parser.add_argument("--slow-latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--health-interval", type=float, default=0.5)
+    parser.add_argument("--cooldown", type=float, default=2.0)
+    run(parser.parse_args())
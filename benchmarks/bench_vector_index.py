@@ -0,0 +1,149 @@
+"""Recall and latency of the local vector index against Typesense vector search on the same data.
+
+Loads the same synthetic chunks into Typesense and a fresh LocalVectorIndex, then compares
+top-k from both to exact brute-force search and reports per-query latency. Also times the
+local index alone at larger sizes, with and without sharding, and the hybrid_search
+fallback while Typesense is unavailable.
+
+    python -m benchmarks.bench_vector_index --docs 5000 --sizes 50000 200000
+
+By default a local mock Typesense server is started; pass --live to use the Typesense
+configured in the environment instead (a collection named bench_vector_index is created).
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.mock_typesense import MockTypesenseServer
+from benchmarks.stubs import point_config_at
+from services.typesense_client import TypesenseClient
+from services.vector_index import LocalVectorIndex
+from utils.config import config
+from utils.constants import EMBEDDING_DIMENSION, TYPESENSE_SCHEMA_FIELDS
+
+COLLECTION = "bench_vector_index"
+
+
+def synthetic_vectors(rng: np.random.Generator, count: int, clusters: int = 200) -> np.ndarray:
+    centers = rng.normal(size=(clusters, EMBEDDING_DIMENSION)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + rng.normal(scale=0.6, size=(count, EMBEDDING_DIMENSION)).astype(np.float32)
+
+
+def chunk_documents(vectors: np.ndarray, start: int = 0):
+    return [
+        {
+            'id': f"bench_{start + i}",
+            'doc_id': f"doc_{(start + i) // 50}",
+            'filename': f"doc_{(start + i) // 50}.txt",
+            'chunk_index': (start + i) % 50,
+            'content': f"chunk {start + i}",
+            'embedding': vector.tolist()
+        }
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def exact_top_k(matrix: np.ndarray, query: np.ndarray, k: int):
+    normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    return set(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k].tolist())
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+
+def build_local_index(vectors: np.ndarray, shards: int) -> LocalVectorIndex:
+    index = LocalVectorIndex(directory=tempfile.mkdtemp(prefix="bench-vector-index-"), shards=shards)
+    for start in range(0, len(vectors), 5000):
+        index.add(chunk_documents(vectors[start:start + 5000], start))
+    index.mark_synced()
+    return index
+
+
+async def compare_with_typesense(args, rng: np.random.Generator):
+    client = TypesenseClient()
+    client.ensure_collection(COLLECTION, TYPESENSE_SCHEMA_FIELDS)
+    vectors = synthetic_vectors(rng, args.docs)
+    for start in range(0, args.docs, 500):
+        await client.import_documents(chunk_documents(vectors[start:start + 500], start), collection=COLLECTION)
+    index = build_local_index(vectors, shards=1)
+
+    queries = vectors[rng.integers(0, args.docs, size=args.queries)] + rng.normal(scale=0.3, size=(args.queries, EMBEDDING_DIMENSION))
+    typesense_ms, local_ms, typesense_recall, local_recall = [], [], [], []
+    for query in queries:
+        truth = exact_top_k(vectors, query, args.k)
+
+        start = time.perf_counter()
+        result = await client.multi_search([{
+            'collection': COLLECTION,
+            'q': '*',
+            'vector_query': f'embedding:([{",".join(map(str, query.tolist()))}], k:{args.k})',
+            'per_page': args.k,
+            'include_fields': 'id'
+        }])
+        typesense_ms.append((time.perf_counter() - start) * 1000)
+        typesense_ids = {int(hit['document']['id'].split('_')[1]) for hit in result[0]['hits']}
+
+        start = time.perf_counter()
+        hits = index.search(query.tolist(), args.k)
+        local_ms.append((time.perf_counter() - start) * 1000)
+        local_ids = {int(hit['content'].split()[1]) for hit in hits}
+
+        typesense_recall.append(len(typesense_ids & truth) / args.k)
+        local_recall.append(len(local_ids & truth) / args.k)
+
+    print(f"{args.docs} chunks, {args.queries} queries, top-{args.k}")
+    print(f"  {'':<12} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, recall, latencies in (("typesense", typesense_recall, typesense_ms), ("local", local_recall, local_ms)):
+        print(f"  {name:<12} {statistics.mean(recall):>9.3f} {percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f}")
+
+    client.local_index = index
+    client.base_url = "http://127.0.0.1:9"
+    start = time.perf_counter()
+    fallback = await client.hybrid_search("chunk", queries[0].tolist(), args.k)
+    print(f"  hybrid_search with Typesense unreachable: {len(fallback)} hits from the local index "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def local_scaling(args, rng: np.random.Generator):
+    print(f"\nlocal index only, top-{args.k}")
+    print(f"  {'chunks':>8} {'shards':>7} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8}")
+    for size in args.sizes:
+        vectors = synthetic_vectors(rng, size)
+        queries = vectors[rng.integers(0, size, size=args.queries)]
+        for shards in args.shards:
+            index = build_local_index(vectors, shards)
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query.tolist(), args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"  {size:>8} {shards:>7} {percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f} "
+                  f"{index.stats()['embedding_bytes'] / 1e6:>8.1f}")
+
+
+def run(args):
+    rng = np.random.default_rng(5)
+    if args.live:
+        asyncio.run(compare_with_typesense(args, rng))
+    else:
+        with MockTypesenseServer() as server:
+            point_config_at(server)
+            asyncio.run(compare_with_typesense(args, rng))
+    local_scaling(args, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50000, 200000])
+    parser.add_argument("--shards", type=int, nargs="+", default=sorted({1, config.LOCAL_INDEX_SHARDS, 4}))
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--live", action="store_true")
+    run(parser.parse_args())
@@ -0,0 +1,119 @@
+"""Offline evaluation of the local query analyzer against recorded LLM analyses.
+
+Each line of the query file is a JSON object with the query, the LLM analyzer's
+output and, when recorded against the live API, its latency and the query embedding:
+
+    {"query": "...", "llm": {"intent": "...", "key_concepts": [...], "query_type": "..."},
+     "llm_latency_ms": 812.4, "embedding": [...]}
+
+benchmarks/data/sample_queries.jsonl is a small hand-labelled set in this format
+(no latencies or embeddings). To record a real set, put one question per line in a
+text file and run with --record (requires GOOGLE_API_KEY):
+
+    python -m benchmarks.eval_query_analyzer --record questions.txt --output recorded.jsonl
+    python -m benchmarks.eval_query_analyzer --queries recorded.jsonl
+
+When embeddings are present the embedding classifiers are evaluated with k-fold
+cross-validation; otherwise only the keyword/regex rules are evaluated.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from services.query_analyzer import LocalQueryAnalyzer, parse_llm_analysis
+from utils.config import config
+from utils.constants import QUERY_ANALYZER_PROMPT, EMBEDDING_TASK_QUERY
+
+DEFAULT_QUERIES = "benchmarks/data/sample_queries.jsonl"
+
+
+async def record(questions_path: str, output_path: str):
+    from services.gemini_client import gemini_client
+
+    with open(questions_path) as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    with open(output_path, "w") as out:
+        for question in questions:
+            start = time.perf_counter()
+            text = await gemini_client.generate(QUERY_ANALYZER_PROMPT.format(query=question, context=""))
+            latency = (time.perf_counter() - start) * 1000
+            embedding = await gemini_client.embed(question, EMBEDDING_TASK_QUERY)
+            out.write(json.dumps({
+                "query": question,
+                "llm": parse_llm_analysis(text),
+                "llm_latency_ms": latency,
+                "embedding": embedding
+            }) + "\n")
+    print(f"recorded {len(questions)} queries to {output_path}")
+
+
+def concept_overlap(local, llm) -> float:
+    local_words = {w for c in local for w in c.lower().split()}
+    llm_words = {w for c in llm for w in c.lower().split()}
+    if not local_words and not llm_words:
+        return 1.0
+    return len(local_words & llm_words) / len(local_words | llm_words)
+
+
+def evaluate(rows, threshold: float, folds: int, default_llm_latency_ms: float):
+    has_embeddings = all("embedding" in row for row in rows)
+    folds = folds if has_embeddings else 1
+
+    results = []
+    for fold in range(folds):
+        analyzer = LocalQueryAnalyzer(model_path="")
+        test_rows = [row for i, row in enumerate(rows) if i % folds == fold]
+        if has_embeddings:
+            for i, row in enumerate(rows):
+                if i % folds != fold:
+                    analyzer.learn(row["embedding"], row["llm"])
+
+        for row in test_rows:
+            start = time.perf_counter()
+            analysis = analyzer.analyze(row["query"], row.get("embedding"))
+            local_us = (time.perf_counter() - start) * 1e6
+            results.append((row, analysis, local_us))
+
+    covered = [(row, analysis) for row, analysis, _ in results if analysis["confidence"] >= threshold]
+
+    def agreement(pairs, field):
+        return sum(analysis[field] == row["llm"][field] for row, analysis in pairs) / len(pairs) if pairs else 0.0
+
+    all_pairs = [(row, analysis) for row, analysis, _ in results]
+    llm_latencies = [row.get("llm_latency_ms", default_llm_latency_ms) for row in rows]
+    local_latency_us = statistics.mean(us for _, _, us in results)
+    coverage = len(covered) / len(results)
+    saved_ms = coverage * statistics.mean(llm_latencies) - local_latency_us / 1000
+
+    print(f"queries:                  {len(rows)} ({'rules + embedding classifier, ' + str(folds) + '-fold' if has_embeddings else 'rules only'})")
+    print(f"confidence threshold:     {threshold}")
+    print(f"answered locally:         {coverage:.1%}")
+    print(f"intent agreement:         {agreement(all_pairs, 'intent'):.1%} overall, {agreement(covered, 'intent'):.1%} when answered locally")
+    print(f"query type agreement:     {agreement(all_pairs, 'query_type'):.1%} overall, {agreement(covered, 'query_type'):.1%} when answered locally")
+    print(f"concept overlap (jaccard): {statistics.mean(concept_overlap(a['key_concepts'], r['llm']['key_concepts']) for r, a in all_pairs):.2f}")
+    print(f"local analyzer latency:   {local_latency_us:.1f} us mean")
+    print(f"LLM analyzer latency:     {statistics.mean(llm_latencies):.1f} ms mean"
+          f"{'' if 'llm_latency_ms' in rows[0] else ' (assumed, not recorded)'}")
+    print(f"latency saved per query:  {saved_ms:.1f} ms mean")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--threshold", type=float, default=config.LOCAL_ANALYZER_MIN_CONFIDENCE)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0,
+                        help="LLM analyzer latency assumed for rows without a recorded latency")
+    parser.add_argument("--record", metavar="QUESTIONS_TXT")
+    parser.add_argument("--output", default="recorded_queries.jsonl")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.output))
+    else:
+        with open(args.queries) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        evaluate(rows, args.threshold, args.folds, args.llm_latency_ms)
@@ -0,0 +1,238 @@
+"""A small in-memory HTTP stand-in for Typesense, used by the benchmarks.
+
+It implements the subset of the Typesense REST API the application uses
+(collections, single and bulk document writes, export, search, multi_search
+and delete-by-filter) with an injectable per-request latency. Setting
+`available` to False makes every request fail with 503, to simulate an outage, and
+`failure_rate` fails that fraction of requests at random. Servers given the same
+`collections` dict share their data, like the nodes of a replicated cluster.
+`request_count` and `path_counts` count the requests received.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Any
+
+import numpy as np
+from aiohttp import web
+
+VECTOR_QUERY_PATTERN = re.compile(r'^(\w+):\(\[([^\]]*)\](?:,\s*k:(\d+))?\)$')
+FILTER_CLAUSE_PATTERN = re.compile(r'^(\w+):(>=|<=|>|<|=)(.*)$')
+COMPARISONS = {
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b
+}
+
+
+class MockTypesenseServer:
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 collections: Dict[str, Dict[str, Dict[str, Any]]] = None, failure_rate: float = 0.0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {} if collections is None else collections
+        self.request_count = 0
+        self.path_counts = Counter()
+        self.matrices: Dict[str, Any] = {}
+        self.available = True
+        self.failure_rate = failure_rate
+        self.loop = None
+        self.thread = None
+        self.runner = None
+        self.started = threading.Event()
+
+    # lifecycle
+
+    def start(self) -> "MockTypesenseServer":
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.started.wait()
+        return self
+
+    def stop(self):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.serve())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def serve(self):
+        app = web.Application(middlewares=[self.latency_middleware], client_max_size=256 * 1024 * 1024)
+        app.router.add_get('/health', self.health)
+        app.router.add_post('/collections', self.create_collection)
+        app.router.add_get('/collections/{name}', self.retrieve_collection)
+        app.router.add_post('/collections/{name}/documents', self.create_document)
+        app.router.add_delete('/collections/{name}/documents', self.delete_documents)
+        app.router.add_post('/collections/{name}/documents/import', self.import_documents)
+        app.router.add_get('/collections/{name}/documents/search', self.search)
+        app.router.add_get('/collections/{name}/documents/export', self.export_documents)
+        app.router.add_post('/multi_search', self.multi_search)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    @web.middleware
+    async def latency_middleware(self, request, handler):
+        self.request_count += 1
+        self.path_counts[request.path] += 1
+        if not self.available or (self.failure_rate and random.random() < self.failure_rate):
+            return web.json_response({'message': 'Service Unavailable'}, status=503)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    # handlers
+
+    async def health(self, request):
+        return web.json_response({'ok': True})
+
+    async def create_collection(self, request):
+        schema = await request.json()
+        if schema['name'] in self.collections:
+            return web.json_response({'message': 'already exists'}, status=409)
+        self.collections[schema['name']] = {}
+        return web.json_response(schema, status=201)
+
+    async def retrieve_collection(self, request):
+        name = request.match_info['name']
+        if name not in self.collections:
+            return web.json_response({'message': 'Not Found'}, status=404)
+        return web.json_response({'name': name, 'num_documents': len(self.collections[name])})
+
+    async def create_document(self, request):
+        document = await request.json()
+        self.store(request.match_info['name'], document)
+        return web.json_response(document, status=201)
+
+    async def import_documents(self, request):
+        body = await request.text()
+        results = []
+        for line in body.splitlines():
+            if line.strip():
+                self.store(request.match_info['name'], json.loads(line))
+                results.append(json.dumps({'success': True}))
+        return web.Response(text="\n".join(results))
+
+    async def export_documents(self, request):
+        documents = [doc for doc in self.collections.get(request.match_info['name'], {}).values()
+                     if self.matches_filter(doc, request.query.get('filter_by'))]
+        include = request.query.get('include_fields')
+        fields = include.split(',') if include else None
+        lines = [json.dumps({k: v for k, v in doc.items() if fields is None or k in fields}) for doc in documents]
+        return web.Response(text="\n".join(lines))
+
+    async def delete_documents(self, request):
+        documents = self.collections.setdefault(request.match_info['name'], {})
+        matched = [doc_id for doc_id, doc in documents.items()
+                   if self.matches_filter(doc, request.query.get('filter_by'))]
+        for doc_id in matched:
+            del documents[doc_id]
+        return web.json_response({'num_deleted': len(matched)})
+
+    async def search(self, request):
+        return web.json_response(self.run_search(request.match_info['name'], dict(request.query)))
+
+    async def multi_search(self, request):
+        body = await request.json()
+        results = []
+        for search in body['searches']:
+            search = dict(search)
+            results.append(self.run_search(search.pop('collection'), search))
+        return web.json_response({'results': results})
+
+    # in-memory engine
+
+    def vector_matrix(self, collection: str, field: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        """The candidates' vectors as a matrix, reused while the same document objects are searched"""
+        cached = self.matrices.get((collection, field))
+        if cached is not None and len(cached[0]) == len(candidates) and all(a is b for a, b in zip(cached[0], candidates)):
+            return cached[1]
+        matrix = np.array([doc[field] for doc in candidates], dtype=np.float32)
+        self.matrices[(collection, field)] = (candidates, matrix)
+        return matrix
+
+    def store(self, collection: str, document: Dict[str, Any]):
+        documents = self.collections.setdefault(collection, {})
+        document.setdefault('id', str(len(documents)))
+        documents[document['id']] = document
+
+    @staticmethod
+    def matches_filter(document: Dict[str, Any], filter_by: str) -> bool:
+        if not filter_by:
+            return True
+        for clause in filter_by.split('&&'):
+            field, operator, value = FILTER_CLAUSE_PATTERN.match(clause.strip()).groups()
+            value = value.strip('`')
+            if operator == '=':
+                if str(document.get(field)) != value:
+                    return False
+            elif not COMPARISONS[operator](float(document.get(field, 0)), float(value)):
+                return False
+        return True
+
+    def run_search(self, collection: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if collection not in self.collections:
+            return {'error': 'Not found.', 'code': 404}
+        per_page = int(params.get('per_page', 10))
+        documents = [doc for doc in self.collections[collection].values()
+                     if self.matches_filter(doc, params.get('filter_by'))]
+
+        query = params.get('q', '*')
+        terms = [] if query == '*' else query.lower().split()
+        scored = []
+        for document in documents:
+            text = str(document.get(params.get('query_by', 'content'), '')).lower()
+            score = sum(text.count(term) for term in terms)
+            scored.append((score, document))
+
+        vector_query = params.get('vector_query')
+        distances = {}
+        if vector_query:
+            match = VECTOR_QUERY_PATTERN.match(vector_query)
+            if not match:
+                return {'error': 'Malformed vector query.', 'code': 400}
+            field, values = match.group(1), match.group(2)
+            query_vector = np.array([float(v) for v in values.split(',')], dtype=np.float32)
+            candidates = [doc for doc in documents if field in doc]
+            if candidates:
+                matrix = self.vector_matrix(collection, field, candidates)
+                norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+                similarities = matrix @ query_vector / np.where(norms == 0, 1.0, norms)
+                for doc, similarity in zip(candidates, similarities):
+                    distances[doc['id']] = float(1.0 - similarity)
+            scored = [(score - distances.get(doc['id'], 2.0), doc) for score, doc in scored]
+        elif terms:
+            scored = [(score, doc) for score, doc in scored if score > 0]
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        include = params.get('include_fields')
+        hits = []
+        for score, document in scored[:per_page]:
+            hit = {'text_match_info': {'score': str(max(score, 0))}}
+            if vector_query:
+                hit['vector_distance'] = distances.get(document['id'], 2.0)
+            if include:
+                fields = include.split(',')
+                document = {k: v for k, v in document.items() if k in fields}
+            hit['document'] = document
+            hits.append(hit)
+        return {'found': len(scored), 'hits': hits}
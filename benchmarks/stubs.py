@@ -0,0 +1,217 @@
+import asyncio
+import random
+import threading
+import time
+from typing import List, Optional
+
+import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+
+from utils.config import config
+from utils.constants import EMBEDDING_DIMENSION
+
+
+def fake_vector(text: str, dim: int = EMBEDDING_DIMENSION) -> List[float]:
+    """Deterministic pseudo-embedding for a piece of text"""
+    rng = random.Random(text)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+class Quota:
+    """A provider quota shared by stubs: a requests-per-second token bucket that answers 429
+    (ResourceExhausted) once empty, and latency that stretches in proportion once more than
+    capacity calls are in flight. Thread-safe, since embeddings run on worker threads.
+    """
+    def __init__(self, requests_per_second: float, burst: Optional[float] = None, capacity: Optional[int] = None,
+                 rejection_latency: float = 0.01):
+        self.rate = requests_per_second
+        self.burst = burst or requests_per_second
+        self.capacity = capacity
+        self.rejection_latency = rejection_latency
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+    
+    def admit(self) -> float:
+        """Takes a token, returning the latency multiplier for the call, or returns None if rate-limited"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                self.rejected += 1
+                return None
+            self.tokens -= 1
+            self.accepted += 1
+            self.in_flight += 1
+            return max(1.0, self.in_flight / self.capacity) if self.capacity else 1.0
+    
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+    
+    def call(self, latency: float):
+        scale = self.admit()
+        if scale is None:
+            time.sleep(self.rejection_latency)
+            raise ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+        try:
+            time.sleep(latency * scale)
+        finally:
+            self.done()
+    
+    async def call_async(self, latency: float):
+        scale = self.admit()
+        if scale is None:
+            await asyncio.sleep(self.rejection_latency)
+            raise ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+        try:
+            await asyncio.sleep(latency * scale)
+        finally:
+            self.done()
+
+
+class StubEmbedder:
+    """Stands in for genai.embed_content with a fixed per-request and per-item latency, optionally under a Quota"""
+    def __init__(self, request_latency: float = 0.05, item_latency: float = 0.0005, quota: Optional[Quota] = None):
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+        self.quota = quota
+        self.calls = 0
+    
+    def embed_content(self, model, content, task_type=None, title=None):
+        self.calls += 1
+        texts = [content] if isinstance(content, str) else content
+        latency = self.request_latency + self.item_latency * len(texts)
+        if self.quota is not None:
+            self.quota.call(latency)
+        else:
+            time.sleep(latency)
+        if isinstance(content, str):
+            return {'embedding': fake_vector(content)}
+        return {'embedding': [fake_vector(text) for text in content]}
+    
+    def install(self):
+        genai.embed_content = self.embed_content
+        return self
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubStream:
+    """Async iterator of response chunks, spreading the model latency across words"""
+    def __init__(self, text: str, latency: float):
+        self.words = text.split(" ")
+        self.delay = latency / max(len(self.words), 1)
+    
+    async def __aiter__(self):
+        for i, word in enumerate(self.words):
+            await asyncio.sleep(self.delay)
+            yield StubResponse(word if i == 0 else f" {word}")
+
+
+class StubGenerativeModel:
+    """Stands in for genai.GenerativeModel, answering analyzer and synthesis prompts, optionally under a Quota"""
+    def __init__(self, latency: float = 0.0, quota: Optional[Quota] = None):
+        self.latency = latency
+        self.quota = quota
+        self.calls = 0
+    
+    def respond(self, prompt: str) -> str:
+        if prompt.startswith("Analyze this user query"):
+            return "Intent: factual\nConcepts: documents, benchmark\nType: simple"
+        return "This is a synthesized answer based on the retrieved documents."
+    
+    def generate_content(self, prompt: str, **kwargs):
+        self.calls += 1
+        if self.quota is not None:
+            self.quota.call(self.latency)
+        else:
+            time.sleep(self.latency)
+        return StubResponse(self.respond(prompt))
+    
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            if self.quota is not None:
+                await self.quota.call_async(0.0)
+            return StubStream(self.respond(prompt), self.latency)
+        if self.quota is not None:
+            await self.quota.call_async(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return StubResponse(self.respond(prompt))
+
+
+def point_config_at(*servers):
+    """Points the Typesense configuration at running MockTypesenseServers; several make a cluster"""
+    config.TYPESENSE_HOST = servers[0].host
+    config.TYPESENSE_PORT = servers[0].port
+    config.TYPESENSE_PROTOCOL = "http"
+    config.TYPESENSE_NODES = [f"http://{server.host}:{server.port}" for server in servers] if len(servers) > 1 else []
+
+
+async def wait_until_ready(client, timeout: float = 60.0):
+    """Polls the app's /ready endpoint until its startup warm-up has finished"""
+    deadline = time.monotonic() + timeout
+    while (await client.get("/ready")).status_code != 200:
+        if time.monotonic() > deadline:
+            raise TimeoutError("app did not become ready")
+        await asyncio.sleep(0.05)
+
+
+class AppServer:
+    """Runs an ASGI app under uvicorn on a background thread, for benchmarks that need real sockets.
+
+    Entering returns once the app reports ready on ready_path (pass None to skip the check).
+    Leaving, including when entering failed, runs the app's shutdown; requests still open
+    after shutdown_timeout seconds are cancelled.
+    """
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0, ready_path: Optional[str] = "/ready",
+                 shutdown_timeout: float = 10.0):
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="on",
+                                                    timeout_graceful_shutdown=shutdown_timeout))
+        self.ready_path = ready_path
+        self.shutdown_timeout = shutdown_timeout
+        self.thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+    
+    def __enter__(self) -> "AppServer":
+        import threading
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        try:
+            while not self.server.started:
+                if not self.thread.is_alive():
+                    raise RuntimeError("app server exited during startup")
+                time.sleep(0.01)
+            if self.ready_path:
+                import httpx
+                deadline = time.monotonic() + 60
+                while httpx.get(self.url + self.ready_path).status_code != 200:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError("app did not become ready")
+                    time.sleep(0.05)
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(self.shutdown_timeout * 2)
+        if self.thread.is_alive():
+            # Graceful shutdown is stuck; skip the remaining waits so the lifespan shutdown still runs
+            self.server.force_exit = True
+            self.thread.join()
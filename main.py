@@ -1,42 +1,206 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 
 from services.document_service import DocumentService
 from services.agent_service import AgentService
 from services.memory_service import MemoryService
+from services.ingestion_queue import IngestionQueue
+from services.typesense_client import typesense_client, close_http_client
+from services.gemini_client import gemini_client
+from services.embedding_cache import embedding_cache
+from services.answer_cache import answer_cache
+from services.metrics import stats_collector, render_metrics
+from services.tokenizer import token_counter
 
-from schema.qa import QuestionRequest, QuestionResponse
-
-app = FastAPI(title="Smart Document Q&A System")
+from schema.qa import QuestionRequest, QuestionResponse, BatchQuestionRequest
+from schema.jobs import JobResponse
+from utils.config import config
+from utils.constants import DISCONNECT_POLL_SECONDS, TYPESENSE_SCHEMA_FIELDS, CONVERSATIONS_SCHEMA_FIELDS
 
 document_service = DocumentService()
 memory_service = MemoryService()
 agent_service = AgentService(memory_service)
+ingestion_queue = IngestionQueue(document_service)
+
+def vector_index_stats() -> dict:
+    """The local index's stats; empty when it is disabled"""
+    local_index = typesense_client.local_index
+    return local_index.stats() if local_index is not None else {}
+
+stats_collector.register("answer_cache", answer_cache.stats)
+stats_collector.register("embedding_cache", embedding_cache.stats)
+stats_collector.register("vector_index", vector_index_stats)
+stats_collector.register("session_cache", memory_service.stats)
+stats_collector.register("gemini_scheduler", gemini_client.scheduler.stats)
+for flights in (agent_service.answer_flights, agent_service.embedding_flights, agent_service.search_flights):
+    stats_collector.register(f"single_flight_{flights.scope}", flights.stats)
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Runs coro, cancelling it (and any model calls it is awaiting) if the client goes away"""
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if not task.done() and await request.is_disconnected():
+            task.cancel()
+    return await task
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def warm_up(app: FastAPI):
+    """Readies everything the first request would otherwise pay for, then backfills the local index.
+    
+    Typesense may still be starting, so collection checks retry until it answers; the Gemini
+    SDK, the tokenizer encoding, the embedding cache, the local index and the agent graph
+    load on a worker thread meanwhile.
+    """
+    checks = app.state.checks
+    
+    async def collections():
+        await typesense_client.ensure_collections({
+            config.COLLECTION_NAME: TYPESENSE_SCHEMA_FIELDS,
+            config.CONVERSATIONS_COLLECTION: CONVERSATIONS_SCHEMA_FIELDS
+        })
+        checks["collections"] = True
+        # Unfinished jobs resume only once their collection exists
+        await ingestion_queue.start()
+        checks["ingestion"] = True
+    
+    def load_models():
+        # One thread: concurrent imports only contend for the GIL and the import locks
+        gemini_client.load()
+        checks["gemini"] = True
+        # tiktoken may download its encoding; the first question should not wait for it on the loop
+        token_counter.encoding
+        embedding_cache.open()
+        typesense_client.local_index
+        agent_service.graph
+        checks["agent_graph"] = True
+    
+    await asyncio.gather(collections(), asyncio.to_thread(load_models))
+    # The local index answers in Typesense's place only once the backfill has finished
+    await document_service.sync_local_index()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.checks = {"collections": False, "ingestion": False, "gemini": False, "agent_graph": False}
+    memory_service.start()
+    typesense_client.start_health_checks()
+    app.state.warm_up = asyncio.create_task(warm_up(app))
+    yield
+    app.state.warm_up.cancel()
+    await asyncio.gather(app.state.warm_up, return_exceptions=True)
+    await ingestion_queue.stop()
+    await memory_service.stop()
+    await typesense_client.stop_health_checks()
+    agent_service.local_analyzer.save()
+    await close_http_client()
+
+app = FastAPI(title="Smart Document Q&A System", lifespan=lifespan)
+
+@app.get("/ready")
+async def readiness():
+    """503 until startup has finished; Typesense health is reported but does not gate readiness"""
+    checks = app.state.checks
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "starting", "checks": checks, "typesense": await typesense_client.health(),
+            "typesense_nodes": typesense_client.nodes.stats()}
+    if app.state.warm_up.done() and not app.state.warm_up.cancelled() and app.state.warm_up.exception():
+        body["status"] = "failed"
+        body["error"] = str(app.state.warm_up.exception())
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
+    if not app.state.checks["ingestion"]:
+        raise HTTPException(status_code=503, detail="Ingestion is starting; retry shortly")
     try:
-        content = await file.read()
-        doc_id = await document_service.process_document(file.filename, content)
-        return {"message": "Document uploaded successfully", "document_id": doc_id}
+        job = await ingestion_queue.submit(file.filename, file.file)
+        if job["deduplicated"]:
+            return {
+                "message": "Document already indexed",
+                "job_id": job["job_id"],
+                "document_id": job["document_id"],
+                "status": job["status"],
+                "deduplicated": True,
+                "chunks_reused": job["chunks_reused"],
+                "chunks_embedded": job["chunks_embedded"]
+            }
+        return {
+            "message": "Document queued for processing",
+            "job_id": job["job_id"],
+            "document_id": job["document_id"],
+            "status": job["status"],
+            "deduplicated": False
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    job = await ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 @app.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, http_request: Request):
     try:
-        result = await agent_service.process_query(
+        result = await cancel_on_disconnect(http_request, agent_service.process_query(
             question=request.question,
-            session_id=request.session_id
-        )
+            session_id=request.session_id,
+            include_timings=request.include_timings
+        ))
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    async def event_stream():
+        try:
+            async for event in agent_service.stream_query(
+                question=request.question,
+                session_id=request.session_id,
+                include_timings=request.include_timings
+            ):
+                yield format_sse(event["event"], event["data"])
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/ask/batch")
+async def ask_questions_batch(request: BatchQuestionRequest):
+    if len(request.questions) > config.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {config.ASK_BATCH_MAX_QUESTIONS} questions per batch")
+    items = [question.model_dump() for question in request.questions]
+    
+    async def event_stream():
+        errors = 0
+        async for result in agent_service.answer_batch(items):
+            errors += "error" in result
+            yield format_sse("result", result)
+        yield format_sse("done", {"questions": len(items), "answered": len(items) - errors, "errors": errors})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/sessions/{session_id}/history")
 async def get_session_history(session_id: str):
     try:
-        history = memory_service.get_conversation_history(session_id)
+        history = await memory_service.get_conversation_history(session_id)
         return {"session_id": session_id, "history": history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -44,11 +208,26 @@ async def get_session_history(session_id: str):
 @app.delete("/sessions/{session_id}")
 async def clear_session(session_id: str):
     try:
-        memory_service.clear_session(session_id)
+        await memory_service.clear_session(session_id)
         return {"message": f"Session {session_id} cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "vector_index": vector_index_stats(),
+        "session_cache": memory_service.stats(),
+        "single_flight": agent_service.flight_stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -10,6 +10,7 @@ class AgentState(TypedDict):
     intent: Optional[str]
     key_concepts: List[str]
     query_type: Optional[str]
+    analysis_source: Optional[str]
     
     # Search Strategy
     search_strategy: Optional[str]
@@ -18,10 +19,18 @@ class AgentState(TypedDict):
     # Document Retrieval
     retrieved_docs: List[Dict]
     search_results: List[Dict]
+    query_embedding: Optional[List[float]]
+    rerank_stats: Optional[Dict[str, int]]
+    
+    # Speculative Retrieval
+    speculative_results: Optional[List[Dict]]
+    speculative_hit: Optional[bool]
     
     # Answer Synthesis
+    context_tokens: Optional[int]
     final_answer: Optional[str]
     sources: List[str]
     
     # Metadata
     processing_steps: List[str]
+    timings: Dict[str, float]
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class JobResponse(BaseModel):
+    job_id: str
+    document_id: str
+    filename: str
+    status: str
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
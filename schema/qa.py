@@ -4,9 +4,16 @@ from typing import List, Optional, Dict, Any
 class QuestionRequest(BaseModel):
     question: str
     session_id: Optional[str] = "default"
+    include_timings: Optional[bool] = False
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[QuestionRequest]
 
 class QuestionResponse(BaseModel):
     answer: str
     session_id: str
+    sources: Optional[List[str]] = []
     processing_steps: Optional[List[str]] = []
     agent_analysis: Optional[Dict[str, Any]] = {}
+    cache_hit: Optional[bool] = False
+    timings: Optional[Dict[str, float]] = None
@@ -1,28 +1,62 @@
-from typing import Dict, Any
-import google.generativeai as genai
-from langgraph.graph import StateGraph, END
+import asyncio
+import time
+from functools import cached_property
+from typing import Dict, Any, AsyncIterator, List
 from schema.agent_state import AgentState
-from services.typesense_client import TypesenseClient
+from services.typesense_client import typesense_client
 from services.memory_service import MemoryService
+from services.embedding_cache import embedding_cache
+from services.gemini_client import gemini_client
+from services.answer_cache import answer_cache
+from services.query_analyzer import LocalQueryAnalyzer, parse_llm_analysis
+from services.context_packer import context_packer
+from services.reranker import reranker
+from services.single_flight import SingleFlight, normalize_question
+from services.metrics import track, AGENT_NODE_SECONDS, AGENT_NODE_IN_FLIGHT, AGENT_NODE_ERRORS, QUERY_SECONDS, QUERIES, PROMPT_TOKENS
 from utils.config import config
-from utils.constants import EMBEDDING_TASK_QUERY, QUERY_ANALYZER_PROMPT, ANSWER_SYNTHESIS_PROMPT
+from utils.constants import (
+    EMBEDDING_TASK_QUERY,
+    EMBEDDING_TASK_DOCUMENT,
+    QUERY_ANALYZER_PROMPT,
+    SPECULATIVE_SEARCH_PARAMS,
+    ASK_BATCH_LOOKAHEAD_WINDOWS
+)
 
 class AgentService:
     def __init__(self, memory_service: MemoryService):
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel(config.GEMINI_MODEL)
-        self.typesense = TypesenseClient()
+        self.gemini = gemini_client
+        self.typesense = typesense_client
         self.memory = memory_service
-        self.graph = self.create_agent_graph()
+        self.local_analyzer = LocalQueryAnalyzer()
+        self.reranker = reranker
+        self.context_packer = context_packer
+        # Concurrent identical questions, query embeddings and searches share one call
+        self.answer_flights = SingleFlight("answer")
+        self.embedding_flights = SingleFlight("embedding")
+        self.search_flights = SingleFlight("search")
+    
+    @cached_property
+    def graph(self):
+        """The compiled agent workflow, built once on first use (the lifespan warms it up)"""
+        return self.create_agent_graph()
     
     def create_agent_graph(self):
+        # LangGraph is slow to import, so it loads with the first graph rather than with the app
+        from langgraph.graph import StateGraph, END
+        
         workflow = StateGraph(AgentState)
         
+        # In speculative mode the analyzer node also prefetches retrieval for the raw query
+        query_analyzer = (
+            self.speculative_query_analyzer_agent if config.SPECULATIVE_RETRIEVAL
+            else self.query_analyzer_agent
+        )
+        
         # Add agent nodes
-        workflow.add_node("query_analyzer", self.query_analyzer_agent)
-        workflow.add_node("search_strategy", self.search_strategy_agent)
-        workflow.add_node("document_retrieval", self.document_retrieval_agent)
-        workflow.add_node("answer_synthesis", self.answer_synthesis_agent)
+        workflow.add_node("query_analyzer", self.timed("query_analyzer", query_analyzer))
+        workflow.add_node("search_strategy", self.timed("search_strategy", self.search_strategy_agent))
+        workflow.add_node("document_retrieval", self.timed("document_retrieval", self.document_retrieval_agent))
+        workflow.add_node("answer_synthesis", self.timed("answer_synthesis", self.answer_synthesis_agent))
         
         # Define the flow
         workflow.set_entry_point("query_analyzer")
@@ -33,24 +67,76 @@ class AgentService:
         
         return workflow.compile()
     
+    def timed(self, name: str, node):
+        """Wraps a graph node so its wall-clock time is recorded in state["timings"] and the qa_agent_node_* metrics"""
+        latency, in_flight, errors = AGENT_NODE_SECONDS.labels(name), AGENT_NODE_IN_FLIGHT.labels(name), AGENT_NODE_ERRORS.labels(name)
+        async def run(state: AgentState) -> AgentState:
+            start = time.perf_counter()
+            with track(latency, in_flight, errors):
+                state = await node(state)
+            state["timings"][name] = (time.perf_counter() - start) * 1000
+            return state
+        return run
+    
+    async def speculative_query_analyzer_agent(self, state: AgentState) -> AgentState:
+        """Runs query analysis while embedding the query and running a default search in parallel"""
+        if state.get("speculative_results") is not None:
+            # Already prefetched, e.g. by answer_batch's multi_search
+            return await self.timed("query_analyzer_llm", self.query_analyzer_agent)(state)
+        async with asyncio.TaskGroup() as group:
+            group.create_task(self.timed("query_analyzer_llm", self.query_analyzer_agent)(state))
+            group.create_task(self.prefetch_retrieval(state))
+        return state
+    
+    async def prefetch_retrieval(self, state: AgentState):
+        """Fetches the query embedding and default-parameter results; failures just disable reuse"""
+        query = state["original_query"]
+        try:
+            start = time.perf_counter()
+            state["query_embedding"] = await self.generate_query_embedding(query)
+            state["timings"]["speculative_embedding"] = (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            state["speculative_results"] = await self.hybrid_search(
+                query, state["query_embedding"], self.candidate_limit(SPECULATIVE_SEARCH_PARAMS["limit"])
+            )
+            state["timings"]["speculative_search"] = (time.perf_counter() - start) * 1000
+        except Exception:
+            state["speculative_results"] = None
+    
+    def can_reuse_speculative_results(self, state: AgentState) -> bool:
+        """Speculative results serve any hybrid strategy asking for no more hits than were prefetched"""
+        return (
+            state.get("speculative_results") is not None
+            and state["search_strategy"] != "semantic_focused"
+            and state["search_params"]["limit"] <= SPECULATIVE_SEARCH_PARAMS["limit"]
+        )
+    
     async def query_analyzer_agent(self, state: AgentState) -> AgentState:
         """Analyzes user query to understand intent and extract key concepts"""
-        prompt = QUERY_ANALYZER_PROMPT.format(
-            query=state["original_query"],
-            context=state["conversation_context"]
-        )
+        query_embedding = state.get("query_embedding") or await asyncio.to_thread(embedding_cache.get, EMBEDDING_TASK_QUERY, state["original_query"])
         
-        response = self.model.generate_content(prompt)
-        analysis = response.text
+        analysis = None
+        if config.LOCAL_ANALYZER_ENABLED:
+            analysis = self.local_analyzer.analyze(state["original_query"], query_embedding)
+            if analysis["confidence"] >= config.LOCAL_ANALYZER_MIN_CONFIDENCE:
+                state["analysis_source"] = "local"
+            else:
+                analysis = None
         
-        lines = analysis.split('\n')
-        intent = lines[0].split(': ')[1] if len(lines) > 0 else "factual"
-        concepts = lines[1].split(': ')[1].split(', ') if len(lines) > 1 else []
-        query_type = lines[2].split(': ')[1] if len(lines) > 2 else "simple"
+        if analysis is None:
+            prompt = QUERY_ANALYZER_PROMPT.format(
+                query=state["original_query"],
+                context=state["conversation_context"]
+            )
+            analysis = parse_llm_analysis(await self.gemini.generate(prompt))
+            state["analysis_source"] = "llm"
+            if query_embedding is not None:
+                self.local_analyzer.learn(query_embedding, analysis)
         
-        state["intent"] = intent
-        state["key_concepts"] = concepts
-        state["query_type"] = query_type
+        state["intent"] = analysis["intent"]
+        state["key_concepts"] = analysis["key_concepts"]
+        state["query_type"] = analysis["query_type"]
         state["processing_steps"].append("query_analyzed")
         
         return state
@@ -75,12 +161,25 @@ class AgentService:
     
     async def document_retrieval_agent(self, state: AgentState) -> AgentState:
         """Executes search and retrieves relevant documents"""
-        query_embedding = self.generate_query_embedding(state["original_query"])
+        limit = state["search_params"]["limit"]
+        
+        if self.can_reuse_speculative_results(state):
+            candidates = state["speculative_results"][:self.candidate_limit(limit)]
+            state["speculative_hit"] = True
+        else:
+            state["speculative_hit"] = False if state.get("speculative_results") is not None else None
+            query_embedding = state.get("query_embedding") or await self.generate_query_embedding(state["original_query"])
+            state["query_embedding"] = query_embedding
+            
+            if state["search_strategy"] == "semantic_focused":
+                candidates = await self.semantic_search(state["original_query"], query_embedding, self.candidate_limit(limit))
+            else:
+                candidates = await self.hybrid_search(state["original_query"], query_embedding, self.candidate_limit(limit))
         
-        if state["search_strategy"] == "semantic_focused":
-            search_results = await self.semantic_search(state["original_query"], query_embedding, state["search_params"]["limit"])
+        if config.RERANK_ENABLED:
+            search_results = await self.rerank(state, candidates, limit)
         else:
-            search_results = await self.hybrid_search(state["original_query"], query_embedding, state["search_params"]["limit"])
+            search_results = candidates[:limit]
         
         state["retrieved_docs"] = search_results
         state["search_results"] = search_results
@@ -88,48 +187,105 @@ class AgentService:
         
         return state
     
+    @staticmethod
+    def candidate_limit(limit: int) -> int:
+        return limit * config.RERANK_OVERFETCH if config.RERANK_ENABLED else limit
+    
+    async def rerank(self, state: AgentState, candidates, limit: int):
+        """MMR-selects limit candidates and drops near-duplicates; falls back to cached embeddings for hits without one"""
+        start = time.perf_counter()
+        missing = [doc for doc in candidates if doc.get("embedding") is None]
+        if missing:
+            cached = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_TASK_DOCUMENT, [doc["content"] for doc in missing])
+            for doc, embedding in zip(missing, cached):
+                doc["embedding"] = embedding
+        
+        selected, stats = self.reranker.rerank(
+            state["query_embedding"], candidates, limit, state["search_params"].get("semantic_weight", 0.5)
+        )
+        state["rerank_stats"] = stats
+        state["timings"]["rerank"] = (time.perf_counter() - start) * 1000
+        # Vectors are only needed for selection; keep them out of the state and prompt path
+        return [{key: value for key, value in doc.items() if key != "embedding"} for doc in selected]
+    
     async def answer_synthesis_agent(self, state: AgentState) -> AgentState:
         """Synthesizes final answer from retrieved documents and context"""
-        doc_context = "\n\n".join([
-            f"Source: {doc['filename']}\nContent: {doc['content']}"
-            for doc in state["retrieved_docs"]
-        ])
-        
-        prompt = ANSWER_SYNTHESIS_PROMPT.format(
+        packed = self.context_packer.pack(
+            state["retrieved_docs"],
             query=state["original_query"],
             intent=state["intent"],
             key_concepts=', '.join(state["key_concepts"]),
-            context=state["conversation_context"],
-            doc_context=doc_context
+            context=state["conversation_context"]
         )
+        prompt = packed["prompt"]
+        state["context_tokens"] = packed["tokens"]
+        PROMPT_TOKENS.observe(packed["tokens"])
+        
+        from langgraph.config import get_stream_writer
         
-        response = self.model.generate_content(prompt)
+        # Tokens are forwarded to stream_query's "custom" stream; outside astream the writer is a no-op
+        writer = get_stream_writer()
+        answer_parts = []
+        async for text in self.gemini.generate_stream(prompt):
+            answer_parts.append(text)
+            writer({"text": text})
         
-        state["final_answer"] = response.text
-        state["sources"] = list(set([doc['filename'] for doc in state["retrieved_docs"]]))
+        state["final_answer"] = "".join(answer_parts)
+        state["sources"] = list(set([doc['filename'] for doc in packed["docs"]]))
         state["processing_steps"].append("answer_synthesized")
         
         return state
     
-    def generate_query_embedding(self, query: str):
-        result = genai.embed_content(
-            model=config.GEMINI_EMBEDDING_MODEL,
-            content=query,
-            task_type=EMBEDDING_TASK_QUERY
-        )
-        return result['embedding']
+    async def generate_query_embedding(self, query: str):
+        cached = await asyncio.to_thread(embedding_cache.get, EMBEDDING_TASK_QUERY, query)
+        if cached is not None:
+            return cached
+        
+        return await self.embedding_flights.run(query, lambda: self.embed_query(query))
+    
+    async def embed_query(self, query: str):
+        embedding = await self.gemini.embed(query, EMBEDDING_TASK_QUERY)
+        await asyncio.to_thread(embedding_cache.put, EMBEDDING_TASK_QUERY, query, embedding)
+        return embedding
+    
+    async def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embeds many queries: cache hits first, then each distinct miss once, EMBEDDING_BATCH_SIZE per call"""
+        embeddings = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_TASK_QUERY, queries)
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if not missing:
+            return embeddings
+        
+        size = config.EMBEDDING_BATCH_SIZE
+        batches = [missing[start:start + size] for start in range(0, len(missing), size)]
+        embedded = await asyncio.gather(*(self.gemini.embed(batch, EMBEDDING_TASK_QUERY) for batch in batches))
+        fresh = [embedding for batch in embedded for embedding in batch]
+        await asyncio.to_thread(embedding_cache.put_many, EMBEDDING_TASK_QUERY, missing, fresh)
+        
+        fresh_by_query = dict(zip(missing, fresh))
+        return [embedding if embedding is not None else fresh_by_query[query] for query, embedding in zip(queries, embeddings)]
     
     async def semantic_search(self, query: str, embedding, limit: int):
-        return await self.typesense.hybrid_search(query, embedding, limit)
+        async def search():
+            # A pure vector query needs no keyword index, so the in-process replica can answer it
+            if config.LOCAL_INDEX_SERVE_SEMANTIC and self.typesense.local_index_ready():
+                return await self.typesense.local_search(embedding, limit, include_embeddings=config.RERANK_ENABLED)
+            return await self.typesense.hybrid_search(query, embedding, limit, include_embeddings=config.RERANK_ENABLED)
+        return self.copy_hits(await self.search_flights.run(("semantic", query, limit), search))
     
     async def hybrid_search(self, query: str, embedding, limit: int):
-        return await self.typesense.hybrid_search(query, embedding, limit)
+        hits = await self.search_flights.run(
+            ("hybrid", query, limit),
+            lambda: self.typesense.hybrid_search(query, embedding, limit, include_embeddings=config.RERANK_ENABLED)
+        )
+        return self.copy_hits(hits)
     
-    async def process_query(self, question: str, session_id: str) -> Dict[str, Any]:
-        """Main entry point for processing queries through agent workflow"""
-        context = self.memory.get_context_for_question(session_id, question)
-        
-        initial_state = {
+    @staticmethod
+    def copy_hits(hits):
+        # Coalesced searches share their hits, and re-ranking fills in missing embeddings
+        return [dict(hit) for hit in hits]
+    
+    def build_initial_state(self, question: str, session_id: str, context: str) -> AgentState:
+        return {
             "original_query": question,
             "session_id": session_id,
             "conversation_context": context,
@@ -142,25 +298,278 @@ class AgentService:
             "search_results": [],
             "final_answer": None,
             "sources": [],
-            "processing_steps": []
+            "processing_steps": [],
+            "analysis_source": None,
+            "query_embedding": None,
+            "speculative_results": None,
+            "speculative_hit": None,
+            "rerank_stats": None,
+            "context_tokens": None,
+            "timings": {}
         }
-        
-        final_state = await self.graph.ainvoke(initial_state)
-        
-        self.memory.add_interaction(
-            session_id, 
-            question, 
-            final_state["final_answer"], 
-            final_state["sources"]
-        )
-        
+    
+    def build_response(self, session_id: str, final_state: AgentState) -> Dict[str, Any]:
         return {
             "answer": final_state["final_answer"],
             "session_id": session_id,
+            "sources": final_state["sources"],
             "processing_steps": final_state["processing_steps"],
             "agent_analysis": {
                 "intent": final_state["intent"],
                 "key_concepts": final_state["key_concepts"],
-                "search_strategy": final_state["search_strategy"]
-            }
+                "search_strategy": final_state["search_strategy"],
+                "analysis_source": final_state["analysis_source"],
+                "duplicates_removed": (final_state.get("rerank_stats") or {}).get("duplicates_removed", 0)
+            },
+            "cache_hit": False,
+            "timings": final_state["timings"]
         }
+    
+    async def lookup_cached_answer(self, question: str, context: str):
+        """Embeds the question and checks the answer cache; returns (embedding, generation, cached response)"""
+        if not config.ANSWER_CACHE_ENABLED:
+            return None, None, None
+        
+        query_embedding = await self.generate_query_embedding(question)
+        generation = answer_cache.generation
+        return query_embedding, generation, answer_cache.lookup(query_embedding, context)
+    
+    def cache_answer(self, query_embedding, context: str, generation, response: Dict[str, Any]):
+        if query_embedding is not None:
+            answer_cache.store(query_embedding, context, generation, response)
+    
+    def cached_response(self, session_id: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "answer": cached["answer"],
+            "session_id": session_id,
+            "sources": cached["sources"],
+            "processing_steps": ["answer_cache_hit"],
+            "agent_analysis": cached["agent_analysis"],
+            "cache_hit": True,
+            "timings": {}
+        }
+    
+    def finish_query(self, mode: str, start: float, response: Dict[str, Any], include_timings: bool) -> Dict[str, Any]:
+        """Records the query in the metrics and returns the response, with per-stage timings (ms) only if asked for"""
+        elapsed = time.perf_counter() - start
+        QUERY_SECONDS.labels(mode).observe(elapsed)
+        QUERIES.labels(mode, "cache_hit" if response["cache_hit"] else "answered").inc()
+        timings = response["timings"]
+        response = {key: value for key, value in response.items() if key != "timings"}
+        if include_timings:
+            response["timings"] = {**timings, "total": elapsed * 1000}
+        return response
+    
+    async def process_query(self, question: str, session_id: str, include_timings: bool = False) -> Dict[str, Any]:
+        """Main entry point for processing queries through agent workflow"""
+        start = time.perf_counter()
+        try:
+            response = await self.answer_query(question, session_id)
+        except Exception:
+            QUERIES.labels("ask", "error").inc()
+            raise
+        return self.finish_query("ask", start, response, include_timings)
+    
+    async def answer_query(self, question: str, session_id: str) -> Dict[str, Any]:
+        context = await self.memory.get_context_for_question(session_id, question)
+        
+        lookup_start = time.perf_counter()
+        query_embedding, generation, cached = await self.lookup_cached_answer(question, context)
+        lookup_ms = (time.perf_counter() - lookup_start) * 1000
+        if cached is not None:
+            return await self.serve_cached(question, session_id, cached, lookup_ms)
+        
+        initial_state = self.build_initial_state(question, session_id, context)
+        initial_state["query_embedding"] = query_embedding
+        initial_state["timings"]["answer_cache_lookup"] = lookup_ms
+        return await self.run_graph(initial_state, query_embedding, generation)
+    
+    async def serve_cached(self, question: str, session_id: str, cached: Dict[str, Any], lookup_ms: float) -> Dict[str, Any]:
+        response = self.cached_response(session_id, cached)
+        response["timings"]["answer_cache_lookup"] = lookup_ms
+        await self.memory.add_interaction(session_id, question, response["answer"], response["sources"])
+        return response
+    
+    async def run_graph(self, initial_state: AgentState, cache_embedding, generation) -> Dict[str, Any]:
+        """Runs the workflow and records the interaction.
+        
+        Concurrent requests for the same question with the same conversation context share one run.
+        """
+        session_id = initial_state["session_id"]
+        key = (normalize_question(initial_state["original_query"]), initial_state["conversation_context"])
+        shared = await self.answer_flights.run(key, lambda: self.run_workflow(initial_state, cache_embedding, generation))
+        response = {**shared, "session_id": session_id, "timings": dict(shared["timings"])}
+        
+        await self.memory.add_interaction(
+            session_id, 
+            initial_state["original_query"], 
+            response["answer"], 
+            response["sources"]
+        )
+        return response
+    
+    async def run_workflow(self, initial_state: AgentState, cache_embedding, generation) -> Dict[str, Any]:
+        """Runs the workflow to completion and caches the answer under cache_embedding"""
+        final_state = await self.graph.ainvoke(initial_state)
+        response = self.build_response(initial_state["session_id"], final_state)
+        self.cache_answer(cache_embedding, initial_state["conversation_context"], generation, response)
+        return response
+    
+    def flight_stats(self) -> Dict[str, Any]:
+        return {flights.scope: flights.stats() for flights in (self.answer_flights, self.embedding_flights, self.search_flights)}
+    
+    async def prepare_batch(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """Embeds a window of questions in batched calls and searches them in a few multi_search requests.
+        
+        Whatever fails is left as None, and the workflow embeds or searches that question on its own.
+        """
+        timings = {}
+        start = time.perf_counter()
+        try:
+            embeddings = await self.generate_query_embeddings(questions)
+        except Exception:
+            return [{"query_embedding": None, "speculative_results": None, "timings": {}} for _ in questions]
+        timings["batch_embedding"] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        try:
+            results = await self.typesense.hybrid_search_many(
+                questions, embeddings, self.candidate_limit(SPECULATIVE_SEARCH_PARAMS["limit"]),
+                include_embeddings=config.RERANK_ENABLED
+            )
+        except Exception:
+            results = [None] * len(questions)
+        timings["batch_search"] = (time.perf_counter() - start) * 1000
+        
+        return [
+            {"query_embedding": embedding, "speculative_results": hits, "timings": timings}
+            for embedding, hits in zip(embeddings, results)
+        ]
+    
+    async def answer_prepared(self, question: str, session_id: str, prepared: Dict[str, Any],
+                              synthesis: asyncio.Semaphore) -> Dict[str, Any]:
+        context = await self.memory.get_context_for_question(session_id, question)
+        query_embedding = prepared["query_embedding"]
+        cache_embedding = query_embedding if config.ANSWER_CACHE_ENABLED else None
+        generation = answer_cache.generation
+        
+        lookup_start = time.perf_counter()
+        cached = answer_cache.lookup(cache_embedding, context) if cache_embedding is not None else None
+        lookup_ms = (time.perf_counter() - lookup_start) * 1000
+        if cached is not None:
+            return await self.serve_cached(question, session_id, cached, lookup_ms)
+        
+        initial_state = self.build_initial_state(question, session_id, context)
+        initial_state["query_embedding"] = query_embedding
+        initial_state["speculative_results"] = prepared["speculative_results"]
+        initial_state["timings"].update(prepared["timings"], answer_cache_lookup=lookup_ms)
+        async with synthesis:
+            return await self.run_graph(initial_state, cache_embedding, generation)
+    
+    async def answer_batch(self, items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Answers many questions, yielding {"index", "response"} or {"index", "error"} for each, in input order.
+        
+        Questions are prepared ASK_BATCH_WINDOW at a time (batched embeddings, a few multi_search requests),
+        the next window while this one is answered; ASK_BATCH_MAX_CONCURRENCY workflows run at once.
+        Questions sharing a session run in order, so each sees the previous answers in its context.
+        """
+        loop = asyncio.get_running_loop()
+        results = [loop.create_future() for _ in items]
+        window_slots = asyncio.Semaphore(ASK_BATCH_LOOKAHEAD_WINDOWS + 1)
+        synthesis = asyncio.Semaphore(config.ASK_BATCH_MAX_CONCURRENCY)
+        session_locks: Dict[str, asyncio.Lock] = {}
+        tasks = set()
+        
+        async def answer(index: int, prepared: Dict[str, Any], start: float):
+            item = items[index]
+            if item["session_id"] not in session_locks:
+                session_locks[item["session_id"]] = asyncio.Lock()
+            try:
+                async with session_locks[item["session_id"]]:
+                    response = await self.answer_prepared(item["question"], item["session_id"], prepared, synthesis)
+                result = {"index": index, "response": self.finish_query("batch", start, response, item.get("include_timings", False))}
+            except Exception as e:
+                QUERIES.labels("batch", "error").inc()
+                result = {"index": index, "error": str(e)}
+            results[index].set_result(result)
+        
+        async def produce():
+            size = max(1, config.ASK_BATCH_WINDOW)
+            scheduled = 0
+            try:
+                for first in range(0, len(items), size):
+                    await window_slots.acquire()
+                    window = range(first, min(first + size, len(items)))
+                    start = time.perf_counter()
+                    prepared = await self.prepare_batch([items[index]["question"] for index in window])
+                    window_tasks = [asyncio.create_task(answer(index, p, start)) for index, p in zip(window, prepared)]
+                    tasks.update(window_tasks)
+                    scheduled = window.stop
+                    asyncio.gather(*window_tasks).add_done_callback(lambda _: window_slots.release())
+            except Exception as e:
+                for index in range(scheduled, len(items)):
+                    QUERIES.labels("batch", "error").inc()
+                    results[index].set_result({"index": index, "error": str(e)})
+        
+        producer = asyncio.create_task(produce())
+        try:
+            for result in results:
+                yield await result
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+    
+    async def stream_query(self, question: str, session_id: str, include_timings: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Runs the agent workflow, yielding progress, token and final events as they happen"""
+        start = time.perf_counter()
+        try:
+            async for event in self.stream_events(question, session_id):
+                if event["event"] == "final":
+                    event = {"event": "final", "data": self.finish_query("stream", start, event["data"], include_timings)}
+                yield event
+        except Exception:
+            QUERIES.labels("stream", "error").inc()
+            raise
+    
+    async def stream_events(self, question: str, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+        yield {"event": "start", "data": {"session_id": session_id}}
+        
+        context = await self.memory.get_context_for_question(session_id, question)
+        
+        lookup_start = time.perf_counter()
+        query_embedding, generation, cached = await self.lookup_cached_answer(question, context)
+        lookup_ms = (time.perf_counter() - lookup_start) * 1000
+        if cached is not None:
+            response = self.cached_response(session_id, cached)
+            response["timings"]["answer_cache_lookup"] = lookup_ms
+            await self.memory.add_interaction(session_id, question, response["answer"], response["sources"])
+            yield {"event": "final", "data": response}
+            return
+        
+        final_state = self.build_initial_state(question, session_id, context)
+        final_state["query_embedding"] = query_embedding
+        final_state["timings"]["answer_cache_lookup"] = lookup_ms
+        
+        async for mode, chunk in self.graph.astream(final_state, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                yield {"event": "token", "data": chunk}
+                continue
+            for node, update in chunk.items():
+                final_state = {**final_state, **update}
+                yield {"event": "progress", "data": {
+                    "node": node,
+                    "processing_steps": final_state["processing_steps"],
+                    "elapsed_ms": final_state["timings"].get(node)
+                }}
+        
+        await self.memory.add_interaction(
+            session_id,
+            question,
+            final_state["final_answer"],
+            final_state["sources"]
+        )
+        
+        response = self.build_response(session_id, final_state)
+        self.cache_answer(query_embedding, context, generation, response)
+        yield {"event": "final", "data": response}
@@ -0,0 +1,106 @@
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import xxhash
+
+from utils.config import config
+from utils.constants import EMBEDDING_DIMENSION
+
+
+class AnswerCache:
+    """Semantic cache of final answers, looked up by cosine similarity of query embeddings.
+
+    Embeddings live in a preallocated float32 matrix so a lookup is one matrix-vector
+    product. Entries are scoped by the corpus generation (bumped whenever a document is
+    indexed) and by the conversation context the answer was produced under, expire
+    after a TTL, and are evicted least-recently-used once the matrix is full.
+    """
+    def __init__(self, threshold: Optional[float] = None, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, dimension: int = EMBEDDING_DIMENSION):
+        self.threshold = threshold or config.ANSWER_CACHE_THRESHOLD
+        self.ttl_seconds = ttl_seconds or config.ANSWER_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or config.ANSWER_CACHE_MAX_ENTRIES
+
+        self.embeddings = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        self.valid = np.zeros(self.max_entries, dtype=bool)
+        self.generations = np.zeros(self.max_entries, dtype=np.int64)
+        self.scopes = np.zeros(self.max_entries, dtype=np.uint64)
+        self.expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self.last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self.responses: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+
+        self.generation = 0
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def bump_generation(self):
+        """Marks every cached answer stale after the corpus changed"""
+        self.generation += 1
+        self.valid[:] = False
+
+    @staticmethod
+    def scope(context: str) -> int:
+        return xxhash.xxh64_intdigest(context or "")
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: List[float], context: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        live = (
+            self.valid
+            & (self.generations == self.generation)
+            & (self.scopes == np.uint64(self.scope(context)))
+            & (self.expires_at > now)
+        )
+        if not live.any():
+            self.counters['misses'] += 1
+            return None
+
+        similarities = self.embeddings @ self.normalize(embedding)
+        similarities[~live] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.counters['misses'] += 1
+            return None
+
+        self.counters['hits'] += 1
+        self.last_used[best] = now
+        return {**self.responses[best], 'similarity': float(similarities[best])}
+
+    def store(self, embedding: List[float], context: str, generation: int, response: Dict[str, Any]):
+        """Caches a response produced under the given corpus generation; stale generations are dropped"""
+        if generation != self.generation:
+            return
+
+        now = time.monotonic()
+        free = np.flatnonzero(~self.valid | (self.expires_at <= now))
+        if len(free):
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.counters['evictions'] += 1
+
+        self.embeddings[slot] = self.normalize(embedding)
+        self.valid[slot] = True
+        self.generations[slot] = generation
+        self.scopes[slot] = np.uint64(self.scope(context))
+        self.expires_at[slot] = now + self.ttl_seconds
+        self.last_used[slot] = now
+        self.responses[slot] = response
+        self.counters['stores'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'entries': int(self.valid.sum()),
+            'generation': self.generation,
+            'hit_rate': self.counters['hits'] / lookups if lookups else 0.0
+        }
+
+
+answer_cache = AnswerCache()
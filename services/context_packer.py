@@ -0,0 +1,62 @@
+from typing import Dict, Any, List, Optional
+
+from services.tokenizer import TokenCounter, token_counter
+from utils.config import config
+from utils.constants import ANSWER_SYNTHESIS_PROMPT, MIN_TRUNCATED_CHUNK_TOKENS
+
+DOC_SEPARATOR = "\n\n"
+
+
+class ContextPacker:
+    """Fills ANSWER_SYNTHESIS_PROMPT with retrieved chunks up to a whole-prompt token budget.
+
+    Chunks are taken in rank order. The first chunk that does not fit is truncated to the
+    remaining budget (or dropped if too little is left) and every lower-ranked chunk is
+    dropped, so the lowest-ranked content is always cut first.
+    """
+    def __init__(self, counter: Optional[TokenCounter] = None, budget: Optional[int] = None):
+        self.counter = counter or token_counter
+        self.budget = budget or config.CONTEXT_TOKEN_BUDGET
+
+    @staticmethod
+    def format_doc(doc: Dict[str, Any]) -> str:
+        return f"Source: {doc['filename']}\nContent: {doc['content']}"
+
+    def pack(self, docs: List[Dict[str, Any]], budget: Optional[int] = None, **prompt_fields) -> Dict[str, Any]:
+        """Returns the prompt plus the docs it includes, its token count and how many docs were truncated or dropped"""
+        budget = budget or self.budget
+        base = ANSWER_SYNTHESIS_PROMPT.format(doc_context="", **prompt_fields)
+        entries = [self.format_doc(doc) for doc in docs]
+        base_tokens, separator_tokens = self.counter.count_batch([base, DOC_SEPARATOR])
+        # Chunks recur across queries, so their counts are memoized
+        entry_tokens = self.counter.count_batch(entries, cached=True)
+
+        remaining = budget - base_tokens
+        packed, included, truncated = [], [], 0
+        for doc, entry, tokens in zip(docs, entries, entry_tokens):
+            cost = tokens + (separator_tokens if packed else 0)
+            if cost <= remaining:
+                packed.append(entry)
+                included.append(doc)
+                remaining -= cost
+                continue
+
+            room = remaining - (separator_tokens if packed else 0)
+            if room >= MIN_TRUNCATED_CHUNK_TOKENS:
+                packed.append(self.counter.truncate(entry, room))
+                included.append(doc)
+                remaining -= room + (separator_tokens if len(packed) > 1 else 0)
+                truncated = 1
+            break
+
+        doc_context = DOC_SEPARATOR.join(packed)
+        return {
+            "prompt": ANSWER_SYNTHESIS_PROMPT.format(doc_context=doc_context, **prompt_fields),
+            "docs": included,
+            "tokens": budget - remaining,
+            "truncated": truncated,
+            "dropped": len(docs) - len(included)
+        }
+
+
+context_packer = ContextPacker()
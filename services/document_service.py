@@ -1,89 +1,336 @@
+import asyncio
+import hashlib
 import uuid
-from typing import List
-import PyPDF2
-from docx import Document
-import google.generativeai as genai
-from services.typesense_client import TypesenseClient
+from io import BytesIO
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
+
+import numpy as np
+
+from services.typesense_client import typesense_client
+from services.embedding_cache import embedding_cache
+from services.gemini_client import gemini_client
+from services.gemini_scheduler import PRIORITY_BULK
+from services.answer_cache import answer_cache
+from services import parsing
+from services.metrics import track, INGESTION_STAGE_SECONDS, INGESTION_STAGE_ERRORS, INGESTION_CHUNKS, INGESTION_BATCHES_IN_FLIGHT
 from utils.config import config
-from utils.constants import DEFAULT_CHUNK_SIZE, EMBEDDING_TASK_DOCUMENT
+from utils.constants import (
+    EMBEDDING_TASK_DOCUMENT,
+    LOCAL_INDEX_SYNC_BATCH_SIZE,
+    LOCAL_INDEX_COMPACT_DEAD_RATIO
+)
+
+class ChunkIndexingError(Exception):
+    """Raised when one or more chunk batches fail to embed or index"""
+    def __init__(self, doc_id: str, failures: List[Dict[str, Any]]):
+        self.doc_id = doc_id
+        self.failures = failures
+        failed_indices = sorted(i for failure in failures for i in failure['chunk_indices'])
+        super().__init__(
+            f"Failed to index {len(failed_indices)} chunk(s) of document {doc_id}: "
+            f"chunk indices {failed_indices}"
+        )
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class IndexedVersion:
+    """A document's chunks as currently indexed: content hash per chunk index, and embeddings by content hash"""
+    def __init__(self):
+        self.hashes: Dict[int, str] = {}
+        self.embeddings: Dict[str, np.ndarray] = {}
+    
+    def add(self, chunk_index: int, content: str, embedding: Optional[List[float]]):
+        digest = content_hash(content)
+        self.hashes[chunk_index] = digest
+        if embedding:
+            # float32 keeps a large document's previous version at a few KB per chunk
+            self.embeddings[digest] = np.asarray(embedding, dtype=np.float32)
+    
+    def embedding(self, digest: str) -> Optional[List[float]]:
+        embedding = self.embeddings.get(digest)
+        return None if embedding is None else embedding.tolist()
+    
+    def stale_from(self, chunk_count: int) -> int:
+        """How many indexed chunks lie beyond a new version's last chunk"""
+        return sum(1 for i in self.hashes if i >= chunk_count)
 
 class DocumentService:
     def __init__(self):
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        self.typesense = TypesenseClient()
+        self.typesense = typesense_client
+        self.stages = {
+            stage: (INGESTION_STAGE_SECONDS.labels(stage), None, INGESTION_STAGE_ERRORS.labels(stage))
+            for stage in ('embed', 'import', 'local_index')
+        }
+        self.chunk_counters = {
+            stage: INGESTION_CHUNKS.labels(stage) for stage in ('embedded', 'indexed', 'failed', 'reused', 'deleted')
+        }
         
-    async def process_document(self, filename: str, content: bytes) -> str:
-        doc_id = str(uuid.uuid4())
+    async def process_document(self, filename: str, content: bytes, doc_id: Optional[str] = None) -> str:
+        """Indexes a document, as a new version of doc_id if given"""
+        doc_id = doc_id or str(uuid.uuid4())
         
-        text = self.extract_text(filename, content)
-        chunks = self.split_text(text)
-        await self.index_chunks(doc_id, filename, chunks)
+        chunks = list(self.iter_chunks(self.iter_pages(BytesIO(content), filename)))
+        await self.ingest_chunks(doc_id, filename, chunks)
         
         return doc_id
     
-    def extract_text(self, filename: str, content: bytes) -> str:
-        if filename.endswith('.pdf'):
-            return self.extract_pdf_text(content)
-        elif filename.endswith('.docx'):
-            return self.extract_docx_text(content)
-        else:
-            return content.decode('utf-8')
+    async def ingest_chunks(self, doc_id: str, filename: str, chunks: List[str],
+                            on_progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+        """Indexes a document's chunks and invalidates answers cached against the previous corpus.
+        
+        If doc_id is already indexed, only chunks that changed are embedded and upserted and
+        chunks past the new end are deleted. Returns counts of reused, embedded, indexed and
+        deleted chunks.
+        """
+        async def batches():
+            for start in range(0, len(chunks), config.EMBEDDING_BATCH_SIZE):
+                yield chunks[start:start + config.EMBEDDING_BATCH_SIZE]
+        
+        return await self.ingest_chunk_batches(doc_id, filename, batches(), on_progress=on_progress)
     
-    def extract_pdf_text(self, content: bytes) -> str:
-        from io import BytesIO
-        pdf_reader = PyPDF2.PdfReader(BytesIO(content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
+    async def ingest_chunk_batches(self, doc_id: str, filename: str, batches: AsyncIterator[List[str]],
+                                   on_progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+        """Streaming counterpart of ingest_chunks for batches produced while the file is still being parsed"""
+        previous = await self.indexed_version(doc_id)
+        try:
+            counts = await self.index_chunk_batches(doc_id, filename, batches, on_progress=on_progress, previous=previous)
+        except BaseException:
+            # Batches imported (or partly imported) before the failure changed the index too
+            answer_cache.bump_generation()
+            raise
+        if counts['indexed'] or counts['deleted']:
+            answer_cache.bump_generation()
+        return counts
     
-    def extract_docx_text(self, content: bytes) -> str:
-        from io import BytesIO
-        doc = Document(BytesIO(content))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+    async def indexed_version(self, doc_id: str) -> IndexedVersion:
+        """Reads back a document's indexed chunks; empty for a new document"""
+        version = IndexedVersion()
+        async for document in self.typesense.export_documents(filter_by=f"doc_id:={doc_id}",
+                                                              include_fields='chunk_index,content,embedding'):
+            version.add(int(document['chunk_index']), document['content'], document.get('embedding'))
+        return version
     
-    def split_text(self, text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for word in words:
-            if current_size + len(word) > chunk_size and current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_size = len(word)
-            else:
-                current_chunk.append(word)
-                current_size += len(word) + 1
+    # Parsing lives in services.parsing so the ingestion process pool can import it alone
+    extract_text = staticmethod(parsing.extract_text)
+    extract_pages = staticmethod(parsing.extract_pages)
+    iter_pages = staticmethod(parsing.iter_pages)
+    iter_pdf_pages = staticmethod(parsing.iter_pdf_pages)
+    iter_docx_paragraphs = staticmethod(parsing.iter_docx_paragraphs)
+    iter_text_blocks = staticmethod(parsing.iter_text_blocks)
+    extract_pdf_text = staticmethod(parsing.extract_pdf_text)
+    extract_docx_text = staticmethod(parsing.extract_docx_text)
+    iter_chunks = staticmethod(parsing.iter_chunks)
+    split_text = staticmethod(parsing.split_text)
+    
+    async def index_chunks(self, doc_id: str, filename: str, chunks: List[str],
+                           batch_size: Optional[int] = None, max_concurrent_batches: Optional[int] = None,
+                           on_progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+        """Embeds and bulk imports chunks in batches, with a bounded number of batches in flight.
+        
+        on_progress, if given, is called with ("embedded", n) and ("indexed", n) as batches complete,
+        and with ("reused", n) and ("deleted", n) when re-indexing a previous version.
+        """
+        batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
         
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
+        async def batches():
+            for start in range(0, len(chunks), batch_size):
+                yield chunks[start:start + batch_size]
         
-        return chunks
+        return await self.index_chunk_batches(doc_id, filename, batches(), max_concurrent_batches, on_progress)
     
-    async def index_chunks(self, doc_id: str, filename: str, chunks: List[str]):
-        for i, chunk in enumerate(chunks):
-            embedding = self.generate_embedding(chunk)
-            
-            document = {
-                'id': f"{doc_id}_{i}",
-                'doc_id': doc_id,
-                'filename': filename,
-                'chunk_index': i,
-                'content': chunk,
-                'embedding': embedding
-            }
-            
-            await self.typesense.index_document(document)
+    async def index_chunk_batches(self, doc_id: str, filename: str, batches: AsyncIterator[List[str]],
+                                  max_concurrent_batches: Optional[int] = None,
+                                  on_progress: Optional[Callable[[str, int], None]] = None,
+                                  previous: Optional[IndexedVersion] = None) -> Dict[str, int]:
+        """Indexes batches as they arrive; the next batch is only pulled once a slot is free.
+        
+        Holding at most max_concurrent_batches batches keeps memory bounded however long the
+        document is, and stops pulling from a streaming parser while indexing falls behind.
+        With the previous version, unchanged chunks are skipped, embeddings of moved chunks
+        are reused, and chunks past the new end are deleted once every batch succeeded.
+        """
+        counts = {'reused': 0, 'embedded': 0, 'indexed': 0, 'deleted': 0}
+        
+        def progress(stage: str, count: int):
+            counts[stage] += count
+            if on_progress:
+                on_progress(stage, count)
+        
+        semaphore = asyncio.Semaphore(max_concurrent_batches or config.MAX_CONCURRENT_BATCHES)
+        tasks = []
+        start = 0
+        
+        try:
+            while True:
+                await semaphore.acquire()
+                try:
+                    batch = await anext(batches)
+                except StopAsyncIteration:
+                    semaphore.release()
+                    break
+                task = asyncio.create_task(self.index_batch(doc_id, filename, batch, start, progress, previous))
+                task.add_done_callback(lambda _: semaphore.release())
+                tasks.append(task)
+                start += len(batch)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        batch_results = await asyncio.gather(*tasks)
+        
+        failures = [failure for batch_failures in batch_results for failure in batch_failures]
+        if failures:
+            raise ChunkIndexingError(doc_id, failures)
+        
+        stale = previous.stale_from(start) if previous is not None else 0
+        if stale:
+            await self.delete_chunks_from(doc_id, start)
+            self.chunk_counters['deleted'].inc(stale)
+            progress('deleted', stale)
+        return counts
     
-    def generate_embedding(self, text: str) -> List[float]:
-        result = genai.embed_content(
-            model=config.GEMINI_EMBEDDING_MODEL,
-            content=text,
-            task_type=EMBEDDING_TASK_DOCUMENT
-        )
-        return result['embedding']
+    async def delete_chunks_from(self, doc_id: str, chunk_index: int):
+        """Deletes a document's chunks from chunk_index on, in Typesense and the local index"""
+        await self.typesense.delete_documents(f"doc_id:={doc_id} && chunk_index:>={chunk_index}")
+        if self.typesense.local_index is not None:
+            await asyncio.to_thread(self.typesense.local_index.remove, doc_id, chunk_index)
+    
+    async def index_batch(self, doc_id: str, filename: str, batch: List[str], start: int,
+                          on_progress: Optional[Callable[[str, int], None]] = None,
+                          previous: Optional[IndexedVersion] = None) -> List[Dict[str, Any]]:
+        """Indexes one batch of chunks and returns its failures, if any.
+        
+        Chunks identical to the previous version's chunk at the same index are skipped; changed
+        chunks whose content was indexed elsewhere in the document keep that embedding.
+        """
+        indices = list(range(start, start + len(batch)))
+        embeddings: List[Optional[List[float]]] = [None] * len(batch)
+        if previous is not None:
+            hashes = [content_hash(chunk) for chunk in batch]
+            changed = [n for n, i in enumerate(indices) if previous.hashes.get(i) != hashes[n]]
+            indices = [indices[n] for n in changed]
+            batch = [batch[n] for n in changed]
+            embeddings = [previous.embedding(hashes[n]) for n in changed]
+            reused = len(hashes) - embeddings.count(None)
+            self.chunk_counters['reused'].inc(reused)
+            if on_progress and reused:
+                on_progress('reused', reused)
+        if not batch:
+            return []
+        
+        INGESTION_BATCHES_IN_FLIGHT.inc()
+        try:
+            to_embed = [n for n, embedding in enumerate(embeddings) if embedding is None]
+            if to_embed:
+                with track(*self.stages['embed']):
+                    generated = await self.generate_embeddings([batch[n] for n in to_embed])
+                for n, embedding in zip(to_embed, generated):
+                    embeddings[n] = embedding
+                self.chunk_counters['embedded'].inc(len(to_embed))
+                if on_progress:
+                    on_progress('embedded', len(to_embed))
+            documents = [
+                {
+                    'id': f"{doc_id}_{i}",
+                    'doc_id': doc_id,
+                    'filename': filename,
+                    'chunk_index': i,
+                    'content': chunk,
+                    'embedding': embedding
+                }
+                for i, chunk, embedding in zip(indices, batch, embeddings)
+            ]
+            with track(*self.stages['import']):
+                results = await self.typesense.import_documents(documents)
+        except Exception as e:
+            self.chunk_counters['failed'].inc(len(batch))
+            return [{'chunk_indices': indices, 'error': str(e)}]
+        finally:
+            INGESTION_BATCHES_IN_FLIGHT.dec()
+        
+        failed = [(i, result) for i, result in zip(indices, results) if not result.get('success')]
+        if self.typesense.local_index is not None:
+            indexed = [document for document, result in zip(documents, results) if result.get('success')]
+            with track(*self.stages['local_index']):
+                await asyncio.to_thread(self.typesense.local_index.add, indexed)
+        self.chunk_counters['indexed'].inc(len(batch) - len(failed))
+        self.chunk_counters['failed'].inc(len(failed))
+        if on_progress:
+            on_progress('indexed', len(batch) - len(failed))
+        if not failed:
+            return []
+        return [{
+            'chunk_indices': [i for i, _ in failed],
+            'error': failed[0][1].get('error', 'import failed')
+        }]
+    
+    async def sync_local_index(self):
+        """Reconciles the local vector index with the documents collection, then marks it in sync.
+        
+        An empty index is filled with one export. Otherwise chunk contents are compared first,
+        without embeddings: chunks the collection no longer has are dropped, and documents with
+        missing or different chunks are re-exported. Dead rows are compacted away before the
+        index starts serving reads.
+        """
+        local_index = self.typesense.local_index
+        if local_index is None or local_index.ready:
+            return
+        
+        try:
+            # Snapshot first: chunks indexed while the export runs are never mistaken for leftovers
+            local = await asyncio.to_thread(local_index.chunk_digests)
+            if not local:
+                await self.export_to_local_index()
+            else:
+                stale_documents = set()
+                async for document in self.typesense.export_documents(include_fields='doc_id,chunk_index,content'):
+                    key = (document['doc_id'], int(document['chunk_index']))
+                    if local.pop(key, None) != local_index.digest(document['content']):
+                        stale_documents.add(document['doc_id'])
+                await asyncio.to_thread(local_index.remove_chunks, list(local))
+                for doc_id in stale_documents:
+                    await self.export_to_local_index(filter_by=f"doc_id:={doc_id}")
+        except Exception:
+            # Typesense is unreachable; the index stays out of sync and the next start retries
+            return
+        await asyncio.to_thread(local_index.compact, LOCAL_INDEX_COMPACT_DEAD_RATIO)
+        local_index.mark_synced()
+    
+    async def export_to_local_index(self, filter_by: Optional[str] = None):
+        local_index = self.typesense.local_index
+        batch = []
+        async for document in self.typesense.export_documents(
+            include_fields='id,doc_id,filename,chunk_index,content,embedding', filter_by=filter_by
+        ):
+            if document.get('embedding'):
+                batch.append(document)
+            if len(batch) == LOCAL_INDEX_SYNC_BATCH_SIZE:
+                await asyncio.to_thread(local_index.add, batch)
+                batch = []
+        await asyncio.to_thread(local_index.add, batch)
+    
+    async def generate_embedding(self, text: str) -> List[float]:
+        cached = await asyncio.to_thread(embedding_cache.get, EMBEDDING_TASK_DOCUMENT, text)
+        if cached is not None:
+            return cached
+        
+        embedding = await gemini_client.embed(text, EMBEDDING_TASK_DOCUMENT, priority=PRIORITY_BULK)
+        await asyncio.to_thread(embedding_cache.put, EMBEDDING_TASK_DOCUMENT, text, embedding)
+        return embedding
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embeds a batch of texts, only sending cache misses to the API"""
+        embeddings = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_TASK_DOCUMENT, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            missing_embeddings = await gemini_client.embed(missing_texts, EMBEDDING_TASK_DOCUMENT, priority=PRIORITY_BULK)
+            await asyncio.to_thread(embedding_cache.put_many, EMBEDDING_TASK_DOCUMENT, missing_texts, missing_embeddings)
+            for i, embedding in zip(missing, missing_embeddings):
+                embeddings[i] = embedding
+        
+        return embeddings
@@ -0,0 +1,217 @@
+import os
+import shutil
+import threading
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+import xxhash
+import zstandard
+from cachetools import LRUCache
+
+from utils.config import config
+
+DISK_LOW_WATER_RATIO = 0.9
+# Marks a directory as a model namespace of this cache; only marked directories are ever invalidated
+NAMESPACE_MARKER = ".embedding-cache"
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an in-process LRU tier and a zstd-compressed disk tier.
+
+    Entries are keyed by a hash of (model, task_type, text). The disk tier lives in a
+    directory named after the embedding model, so switching GEMINI_EMBEDDING_MODEL
+    discards vectors produced by the previous model. Construction does no disk work; open()
+    invalidates other models and measures the disk tier, and runs at startup. Methods touch
+    the disk; async callers run them with asyncio.to_thread.
+    """
+    def __init__(self, model: Optional[str] = None, cache_dir: Optional[str] = None,
+                 max_memory_entries: Optional[int] = None, max_disk_bytes: Optional[int] = None):
+        self.model = model or config.GEMINI_EMBEDDING_MODEL
+        self.cache_dir = cache_dir or config.EMBEDDING_CACHE_DIR
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else config.EMBEDDING_CACHE_MAX_BYTES
+        self.memory = LRUCache(maxsize=max_memory_entries or config.EMBEDDING_CACHE_MEMORY_ENTRIES)
+        self.lock = threading.Lock()
+        self.evict_lock = threading.Lock()
+        self.compressor = zstandard.ZstdCompressor(level=1)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+        self.namespace = xxhash.xxh64_hexdigest(self.model)
+        self.model_dir = os.path.join(self.cache_dir, self.namespace)
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self.disk_bytes = 0
+        self.model_dir_ready = False
+
+    def open(self):
+        """Drops other models' entries and measures the disk tier; blocking, so run it in a thread"""
+        self.invalidate_other_models()
+        self.ensure_model_dir()
+        disk_bytes = self.scan_disk_bytes()
+        with self.lock:
+            self.disk_bytes = disk_bytes
+
+    def invalidate_other_models(self):
+        """Removes disk entries written for any embedding model other than the current one.
+
+        Only directories carrying NAMESPACE_MARKER are removed, so pointing EMBEDDING_CACHE_DIR
+        at a shared directory never deletes anything this cache did not create.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if (entry.is_dir(follow_symlinks=False) and entry.name != self.namespace
+                    and os.path.isfile(os.path.join(entry.path, NAMESPACE_MARKER))):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def ensure_model_dir(self):
+        if self.model_dir_ready:
+            return
+        os.makedirs(self.model_dir, exist_ok=True)
+        with open(os.path.join(self.model_dir, NAMESPACE_MARKER), 'a'):
+            pass
+        self.model_dir_ready = True
+
+    def scan_disk_bytes(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.model_dir):
+            for name in files:
+                if name == NAMESPACE_MARKER:
+                    continue
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def key(self, task_type: str, text: str) -> str:
+        return xxhash.xxh3_128_hexdigest(f"{self.model}\0{task_type}\0{text}")
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.model_dir, key[:2], f"{key}.zst")
+
+    def get(self, task_type: str, text: str) -> Optional[List[float]]:
+        key = self.key(task_type, text)
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.counters['memory_hits'] += 1
+                return vector.tolist()
+
+        vector = self.read_disk(key)
+        with self.lock:
+            if vector is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self.memory[key] = vector
+        return vector.tolist()
+
+    def get_many(self, task_type: str, texts: List[str]) -> List[Optional[List[float]]]:
+        return [self.get(task_type, text) for text in texts]
+
+    def put(self, task_type: str, text: str, embedding: List[float]):
+        key = self.key(task_type, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            self.memory[key] = vector
+            self.counters['writes'] += 1
+        self.write_disk(key, vector)
+
+    def put_many(self, task_type: str, texts: List[str], embeddings: List[List[float]]):
+        for text, embedding in zip(texts, embeddings):
+            self.put(task_type, text, embedding)
+
+    def read_disk(self, key: str) -> Optional[np.ndarray]:
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = self.decompressor.decompress(f.read())
+            os.utime(path)
+        except (OSError, zstandard.ZstdError):
+            return None
+        return np.frombuffer(data, dtype=np.float32)
+
+    def write_disk(self, key: str, vector: np.ndarray):
+        if self.max_disk_bytes <= 0:
+            return
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return
+        data = self.compressor.compress(vector.tobytes())
+        try:
+            self.ensure_model_dir()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.disk_bytes += len(data)
+            over_budget = self.disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self.evict_disk()
+
+    def evict_disk(self):
+        """Deletes least recently used disk entries until usage drops below the low-water mark"""
+        # One scan at a time; writers arriving meanwhile leave it to the one running
+        if not self.evict_lock.acquire(blocking=False):
+            return
+        try:
+            self.scan_and_evict()
+        finally:
+            self.evict_lock.release()
+
+    def scan_and_evict(self):
+        entries = []
+        for root, _, files in os.walk(self.model_dir):
+            for name in files:
+                if name == NAMESPACE_MARKER:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        target = self.max_disk_bytes * DISK_LOW_WATER_RATIO
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self.lock:
+            self.disk_bytes = total
+            self.counters['evictions'] += evicted
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.disk_bytes = 0
+            self.model_dir_ready = False
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+        self.ensure_model_dir()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = lookups - self.counters['misses']
+            return {
+                **self.counters,
+                'memory_entries': len(self.memory),
+                'disk_bytes': self.disk_bytes,
+                'hit_rate': hits / lookups if lookups else 0.0
+            }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional, Union
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from services.gemini_scheduler import GeminiScheduler, PRIORITY_INTERACTIVE, is_retryable
+from services.metrics import track, GEMINI_SECONDS, GEMINI_IN_FLIGHT, GEMINI_ERRORS, GEMINI_CHARACTERS, GEMINI_EMBEDDED_TEXTS, GEMINI_RETRIES
+from utils.config import config
+from utils.constants import GEMINI_RETRY_BACKOFF_SECONDS, GEMINI_RETRY_MAX_BACKOFF_SECONDS
+
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    """Imports and configures the Gemini SDK once, on first use; the import alone takes about a second"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=config.GOOGLE_API_KEY)
+            _genai = genai
+    return _genai
+
+
+class GeminiClient:
+    """Non-blocking access to Gemini generation and embeddings.
+
+    Generation uses the SDK's async API. The SDK has no async embedding call, so
+    embeddings run on a dedicated thread pool. Every call goes through the shared
+    GeminiScheduler, holding a slot for as long as the provider is working on it, at
+    the caller's priority (interactive by default, bulk for ingestion), and is bounded
+    by a per-call timeout; cancelling the awaiting task cancels the call. Rate limits and
+    overloads are retried with jittered exponential backoff, each attempt queueing for a
+    new slot. Each attempt is timed into the qa_gemini_* metrics, from the moment it holds a slot.
+    """
+    def __init__(self, max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 scheduler: Optional[GeminiScheduler] = None):
+        self._model = None
+        self.max_concurrency = max_concurrency or config.GEMINI_MAX_CONCURRENCY
+        self.timeout = timeout or config.GEMINI_TIMEOUT_SECONDS
+        self.retries = config.GEMINI_RETRIES
+        self.scheduler = scheduler or GeminiScheduler(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gemini-embed")
+        self.metrics = {
+            operation: (GEMINI_SECONDS.labels(operation), GEMINI_IN_FLIGHT.labels(operation), GEMINI_ERRORS.labels(operation))
+            for operation in ('generate', 'generate_stream', 'embed')
+        }
+        self.retry_counts = {operation: GEMINI_RETRIES.labels(operation) for operation in self.metrics}
+        self.characters = {
+            (operation, direction): GEMINI_CHARACTERS.labels(operation, direction)
+            for operation, direction in (('generate', 'input'), ('generate', 'output'), ('generate_stream', 'input'),
+                                         ('generate_stream', 'output'), ('embed', 'input'))
+        }
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_genai().GenerativeModel(config.GEMINI_MODEL)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def load(self):
+        """Loads the SDK and builds the model ahead of the first call; blocking, so run it in a thread"""
+        return self.model
+
+    def retrying(self, operation: str, retry=is_retryable) -> AsyncRetrying:
+        retry_count = self.retry_counts[operation]
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.retries + 1),
+            wait=wait_exponential_jitter(initial=GEMINI_RETRY_BACKOFF_SECONDS, max=GEMINI_RETRY_MAX_BACKOFF_SECONDS,
+                                         jitter=GEMINI_RETRY_BACKOFF_SECONDS),
+            retry=retry_if_exception(retry),
+            before_sleep=lambda state: retry_count.inc(),
+            reraise=True
+        )
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None, priority: str = PRIORITY_INTERACTIVE) -> str:
+        async for attempt in self.retrying('generate'):
+            with attempt:
+                async with self.scheduler.slot(priority, 'generate'):
+                    with track(*self.metrics['generate']):
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(prompt),
+                            timeout or self.timeout
+                        )
+                        text = response.text
+        self.characters['generate', 'input'].inc(len(prompt))
+        self.characters['generate', 'output'].inc(len(text))
+        return text
+
+    async def generate_stream(self, prompt: str, timeout: Optional[float] = None,
+                              priority: str = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+        """Yields answer text as the model produces it; the timeout applies to each chunk.
+
+        Only opening the stream is retried; once text has been yielded, errors propagate.
+        """
+        timeout = timeout or self.timeout
+        self.characters['generate_stream', 'input'].inc(len(prompt))
+        output = self.characters['generate_stream', 'output']
+        yielded = False
+        async for attempt in self.retrying('generate_stream', lambda e: not yielded and is_retryable(e)):
+            with attempt:
+                async with self.scheduler.slot(priority, 'generate_stream') as slot:
+                    with track(*self.metrics['generate_stream']):
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(prompt, stream=True),
+                            timeout
+                        )
+                        chunks = response.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                            except StopAsyncIteration:
+                                break
+                            slot.responded()
+                            if chunk.text:
+                                output.inc(len(chunk.text))
+                                yielded = True
+                                yield chunk.text
+
+    async def embed(self, content: Union[str, List[str]], task_type: str, timeout: Optional[float] = None,
+                    priority: str = PRIORITY_INTERACTIVE) -> Union[List[float], List[List[float]]]:
+        """Embeds one text or a batch of texts; a batch returns one vector per text"""
+        genai = load_genai()
+        texts = [content] if isinstance(content, str) else content
+        async for attempt in self.retrying('embed'):
+            with attempt:
+                slot = await self.scheduler.acquire(priority, 'embed')
+                try:
+                    future = self.executor.submit(functools.partial(
+                        genai.embed_content,
+                        model=config.GEMINI_EMBEDDING_MODEL,
+                        content=content,
+                        task_type=task_type
+                    ))
+                except BaseException as e:
+                    slot.release(e)
+                    raise
+                # The slot is only returned once the worker thread is done with the request,
+                # so a timed-out call still counts against the limit until the provider answers.
+                # A call cancelled before a worker picked it up never reached the provider, so it
+                # is released as cancelled, which the scheduler does not count as a sample.
+                future.add_done_callback(
+                    lambda done, slot=slot: slot.release_threadsafe(
+                        asyncio.CancelledError() if done.cancelled() else done.exception()
+                    )
+                )
+
+                GEMINI_EMBEDDED_TEXTS.inc(len(texts))
+                self.characters['embed', 'input'].inc(sum(map(len, texts)))
+                with track(*self.metrics['embed']):
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        return result['embedding']
+
+
+gemini_client = GeminiClient()
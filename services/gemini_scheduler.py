@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from services.metrics import GEMINI_QUEUE_DEPTH, GEMINI_QUEUE_WAIT, GEMINI_CONCURRENCY_LIMIT, GEMINI_RATE_LIMITED
+from utils.config import config
+from utils.constants import (
+    GEMINI_RETRYABLE_STATUS_CODES,
+    GEMINI_RATE_LIMIT_DECREASE,
+    GEMINI_LATENCY_DECREASE,
+    GEMINI_INITIAL_CONCURRENCY,
+    GEMINI_BASELINE_DRIFT
+)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """The HTTP status of a Google API error (they carry it as .code), if any"""
+    try:
+        return int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return status_code(error) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    return status_code(error) in GEMINI_RETRYABLE_STATUS_CODES
+
+
+class Slot:
+    """Permission to run one Gemini call; released exactly once, with the outcome fed back to the scheduler"""
+    def __init__(self, scheduler: "GeminiScheduler", priority: str, operation: str):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.operation = operation
+        self.loop = scheduler.loop
+        self.start = time.perf_counter()
+        self.latency: Optional[float] = None
+        self.released = False
+
+    def responded(self):
+        """Marks the provider's first response; for streams this, not the whole stream, is the latency"""
+        if self.latency is None:
+            self.latency = time.perf_counter() - self.start
+
+    def release(self, error: Optional[BaseException] = None):
+        if self.released:
+            return
+        self.released = True
+        latency = self.latency if self.latency is not None else time.perf_counter() - self.start
+        self.scheduler.release(self, latency, error)
+
+    def release_threadsafe(self, error: Optional[BaseException] = None):
+        """Releases from a worker thread (embedding calls), on the loop the slot was taken on"""
+        latency = time.perf_counter() - self.start
+        if self.latency is None:
+            self.latency = latency
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.release, error)
+
+
+class GeminiScheduler:
+    """Admits Gemini calls by priority under an adaptive (AIMD) concurrency limit.
+
+    Waiting interactive calls (questions) always start before bulk ones (ingestion), and bulk
+    calls hold at most GEMINI_BULK_SHARE of the limit. The limit grows by about one per
+    limit's worth of calls answered within GEMINI_LATENCY_TOLERANCE times their operation's
+    baseline latency, shrinks by GEMINI_LATENCY_DECREASE on slower calls or timeouts and
+    halves on a 429, at most once per round trip, between GEMINI_MIN_CONCURRENCY and
+    GEMINI_MAX_CONCURRENCY. Slots are bound to the running event loop.
+    """
+    def __init__(self, max_concurrency: Optional[int] = None, min_concurrency: Optional[int] = None,
+                 bulk_share: Optional[float] = None, latency_tolerance: Optional[float] = None):
+        self.max_concurrency = max_concurrency or config.GEMINI_MAX_CONCURRENCY
+        self.min_concurrency = min(min_concurrency or config.GEMINI_MIN_CONCURRENCY, self.max_concurrency)
+        self.bulk_share = config.GEMINI_BULK_SHARE if bulk_share is None else bulk_share
+        self.latency_tolerance = latency_tolerance or config.GEMINI_LATENCY_TOLERANCE
+        self.limit = float(min(max(GEMINI_INITIAL_CONCURRENCY, self.min_concurrency), self.max_concurrency))
+        self.baselines: Dict[str, float] = {}
+        self.last_decrease = 0.0
+        self.rate_limited = 0
+        self.decreases = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queues: Dict[str, Deque[asyncio.Future]] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.queue_depth = {priority: GEMINI_QUEUE_DEPTH.labels(priority) for priority in PRIORITIES}
+        self.queue_wait = {priority: GEMINI_QUEUE_WAIT.labels(priority) for priority in PRIORITIES}
+        GEMINI_CONCURRENCY_LIMIT.set(self.limit)
+
+    def bind(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # Waiters and slots of a previous loop (e.g. an earlier asyncio.run) are gone with it
+            self.loop = loop
+            self.queues = {priority: deque() for priority in PRIORITIES}
+            self.in_flight = {priority: 0 for priority in PRIORITIES}
+            for gauge in self.queue_depth.values():
+                gauge.set(0)
+
+    @property
+    def capacity(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    def can_start(self, priority: str) -> bool:
+        if sum(self.in_flight.values()) >= self.capacity:
+            return False
+        return priority == PRIORITY_INTERACTIVE or self.in_flight[PRIORITY_BULK] < max(1, int(self.capacity * self.bulk_share))
+
+    async def acquire(self, priority: str, operation: str) -> Slot:
+        """Waits for a slot; interactive waiters go first, then bulk ones in arrival order"""
+        self.bind()
+        queue = self.queues[priority]
+        waiting_ahead = self.queues[PRIORITY_INTERACTIVE] or queue
+        if not waiting_ahead and self.can_start(priority):
+            self.in_flight[priority] += 1
+            self.queue_wait[priority].observe(0.0)
+            return Slot(self, priority, operation)
+
+        waiter = self.loop.create_future()
+        queue.append(waiter)
+        self.queue_depth[priority].inc()
+        start = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller was cancelled: hand the slot on
+                self.in_flight[priority] -= 1
+                self.dispatch()
+            else:
+                queue.remove(waiter)
+                self.queue_depth[priority].dec()
+            raise
+        self.queue_wait[priority].observe(time.perf_counter() - start)
+        return Slot(self, priority, operation)
+
+    @asynccontextmanager
+    async def slot(self, priority: str, operation: str):
+        slot = await self.acquire(priority, operation)
+        try:
+            yield slot
+        except BaseException as e:
+            slot.release(e)
+            raise
+        slot.release()
+
+    def dispatch(self):
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and self.can_start(priority):
+                waiter = queue.popleft()
+                self.queue_depth[priority].dec()
+                self.in_flight[priority] += 1
+                waiter.set_result(None)
+
+    def release(self, slot: Slot, latency: float, error: Optional[BaseException]):
+        if slot.loop is not self.loop:
+            return
+        self.in_flight[slot.priority] -= 1
+        self.observe(slot.operation, latency, error)
+        self.dispatch()
+
+    def observe(self, operation: str, latency: float, error: Optional[BaseException]):
+        """Moves the limit: additive increase on fast answers, multiplicative decrease on congestion"""
+        if error is not None and is_rate_limited(error):
+            self.rate_limited += 1
+            GEMINI_RATE_LIMITED.labels(operation).inc()
+            self.decrease(GEMINI_RATE_LIMIT_DECREASE, latency)
+            return
+        if error is not None and not isinstance(error, TimeoutError):
+            # Failures and cancellations say nothing about load
+            return
+
+        baseline = min(latency, self.baselines.get(operation, latency) * (1 + GEMINI_BASELINE_DRIFT))
+        self.baselines[operation] = baseline
+        if error is not None or latency > self.latency_tolerance * baseline:
+            self.decrease(GEMINI_LATENCY_DECREASE, latency)
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            GEMINI_CONCURRENCY_LIMIT.set(self.limit)
+
+    def decrease(self, factor: float, latency: float):
+        # Calls in flight when the limit dropped report the same congestion; count it once per round trip
+        now = time.monotonic()
+        if now - self.last_decrease < max(latency, *self.baselines.values(), 0.0):
+            return
+        self.last_decrease = now
+        self.decreases += 1
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        GEMINI_CONCURRENCY_LIMIT.set(self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": sum(self.in_flight.values()),
+            "queued_interactive": len(self.queues.get(PRIORITY_INTERACTIVE, ())),
+            "queued_bulk": len(self.queues.get(PRIORITY_BULK, ())),
+            "rate_limited": self.rate_limited,
+            "decreases": self.decreases
+        }
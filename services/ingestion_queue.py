@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, BinaryIO, Optional, AsyncIterator, List, Tuple
+
+from services.document_service import DocumentService
+from services.parsing import parse_document_file
+from services.metrics import track, INGESTION_STAGE_SECONDS, INGESTION_STAGE_ERRORS
+from services.job_store import (
+    JobStore,
+    JOB_PARSING,
+    JOB_INDEXING,
+    JOB_COMPLETED,
+    JOB_FAILED
+)
+from utils.config import config
+from utils.constants import JOB_PROGRESS_FLUSH_SECONDS, PARSE_POLL_SECONDS, UPLOAD_SPOOL_BLOCK_SIZE
+
+
+class IngestionQueue:
+    """Background document ingestion.
+
+    Uploads are spooled to UPLOAD_DIR and recorded in the job store. Each job worker parses
+    its file in a process pool, which streams chunk batches back through a bounded queue
+    while the worker embeds and indexes them, so parsing pauses when indexing falls behind
+    and memory stays flat however large the document is. Unfinished jobs are picked up
+    again on start(). Parser processes are spawned rather than forked, so they never
+    inherit a lock another server thread held at fork time, and they run
+    services.parsing, which imports none of the service singletons.
+
+    Uploads are fingerprinted by content hash: a file identical to a document's current
+    version returns that document's job without queueing anything, and a file named like
+    an earlier upload becomes a new version of that document, re-indexing only the chunks
+    that changed. Jobs for the same document run one at a time.
+    """
+    def __init__(self, document_service: DocumentService, job_store: Optional[JobStore] = None):
+        self.documents = document_service
+        self.store = job_store or JobStore()
+        self.pending: Optional[asyncio.Queue] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.manager = None
+        self.workers = []
+        self.live_progress: Dict[str, Dict[str, int]] = {}
+        self.document_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    async def start(self):
+        self.pending = asyncio.Queue()
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(max_workers=config.INGEST_PARSE_WORKERS, mp_context=context)
+        self.manager = context.Manager()
+        self.workers = [
+            asyncio.create_task(self.job_worker()) for _ in range(config.INGEST_PARSE_WORKERS)
+        ]
+
+        for job in await asyncio.to_thread(self.store.unfinished):
+            self.pending.put_nowait(job)
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+    async def submit(self, filename: str, upload: BinaryIO) -> Dict[str, Any]:
+        """Spools the upload to disk, records a job and queues it; returns the job without waiting.
+
+        The returned job has "deduplicated" set when the file matched a document's current version.
+        """
+        os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(config.UPLOAD_DIR, f"{uuid.uuid4()}_{os.path.basename(filename)}")
+        file_hash = await asyncio.to_thread(self.spool, upload, path)
+
+        current = await asyncio.to_thread(self.store.find_current, file_hash)
+        if current is not None:
+            await asyncio.to_thread(self.remove_upload, path)
+            # Reports this upload: every chunk of the current version is reused as is
+            return current | {"deduplicated": True, "chunks_reused": current["chunks_total"], "chunks_embedded": 0,
+                              "chunks_indexed": 0, "chunks_deleted": 0}
+
+        previous = await asyncio.to_thread(self.store.latest, True, filename=filename)
+        job = await asyncio.to_thread(self.store.create, filename, path, previous and previous["document_id"], file_hash)
+        self.pending.put_nowait(job)
+        return {key: value for key, value in job.items() if key != "path"} | {"deduplicated": False}
+
+    @staticmethod
+    def spool(upload: BinaryIO, path: str) -> str:
+        """Copies the upload to path, returning its SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, "wb") as f:
+            while block := upload.read(UPLOAD_SPOOL_BLOCK_SIZE):
+                digest.update(block)
+                f.write(block)
+        return digest.hexdigest()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job_id in self.live_progress:
+            job.update(self.live_progress[job_id])
+        return job
+
+    async def update(self, job: Dict[str, Any], **fields):
+        await asyncio.to_thread(self.store.update, job["job_id"], **fields)
+
+    async def fail(self, job: Dict[str, Any], error: Exception, **fields):
+        await self.update(job, status=JOB_FAILED, error=str(error), **fields)
+
+    async def job_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.pending.get()
+            progress = {"pages_parsed": 0, "chunks_total": 0, "chunks_embedded": 0, "chunks_indexed": 0,
+                        "chunks_reused": 0, "chunks_deleted": 0}
+            self.live_progress[job["job_id"]] = progress
+
+            def on_progress(stage: str, count: int):
+                progress[f"chunks_{stage}"] += count
+
+            output = self.manager.Queue(maxsize=config.INGEST_QUEUE_SIZE)
+            flusher = asyncio.create_task(self.flush_progress(job, progress))
+            parser = None
+            finished = False
+            try:
+                async with self.document_lock(job["document_id"]):
+                    await self.update(job, status=JOB_PARSING, **progress)
+                    with track(INGESTION_STAGE_SECONDS.labels("job"), errors=INGESTION_STAGE_ERRORS.labels("job")):
+                        parser = loop.run_in_executor(
+                            self.executor, parse_document_file, job["path"], job["filename"], output, config.EMBEDDING_BATCH_SIZE
+                        )
+                        batches = self.parsed_batches(job, output, parser, progress)
+                        await self.documents.ingest_chunk_batches(job["document_id"], job["filename"], batches, on_progress=on_progress)
+                    await self.update(job, status=JOB_COMPLETED, **progress)
+                finished = True
+            except Exception as e:
+                await self.fail(job, e, **progress)
+                finished = True
+            finally:
+                flusher.cancel()
+                if parser is not None:
+                    # Unblock a parser still waiting on the full queue so its pool slot frees up
+                    await self.drain(output, parser)
+                if finished:
+                    # A job cancelled by stop() is resumed on the next start and still needs its upload
+                    await asyncio.to_thread(self.remove_upload, job["path"])
+                self.live_progress.pop(job["job_id"], None)
+                self.pending.task_done()
+
+    @asynccontextmanager
+    async def document_lock(self, doc_id: str):
+        """Runs jobs for one document one at a time; the lock is dropped once no job holds or awaits it"""
+        lock, users = self.document_locks.get(doc_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self.document_locks[doc_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self.document_locks[doc_id]
+            if users == 1:
+                del self.document_locks[doc_id]
+            else:
+                self.document_locks[doc_id] = (lock, users - 1)
+
+    async def parsed_batches(self, job: Dict[str, Any], output, parser: asyncio.Future,
+                             progress: Dict[str, int]) -> AsyncIterator[List[str]]:
+        """Yields chunk batches from the parser process, raising if parsing fails.
+
+        The parse stage metric is the parser's wall time, including time paused while indexing catches up.
+        """
+        indexing = False
+        start = time.perf_counter()
+        while True:
+            try:
+                kind, pages, payload = await asyncio.to_thread(output.get, True, PARSE_POLL_SECONDS)
+            except queue.Empty:
+                if parser.done():
+                    parser.result()
+                    raise RuntimeError("Parser exited before finishing the document")
+                continue
+
+            progress["pages_parsed"] = pages
+            if kind != "batch":
+                INGESTION_STAGE_SECONDS.labels("parse").observe(time.perf_counter() - start)
+            if kind == "error":
+                INGESTION_STAGE_ERRORS.labels("parse").inc()
+                raise RuntimeError(payload)
+            if kind == "done":
+                return
+
+            progress["chunks_total"] += len(payload)
+            if not indexing:
+                indexing = True
+                await self.update(job, status=JOB_INDEXING)
+            yield payload
+
+    @staticmethod
+    async def drain(output, parser: asyncio.Future):
+        while not parser.done():
+            try:
+                await asyncio.to_thread(output.get, True, PARSE_POLL_SECONDS)
+            except queue.Empty:
+                pass
+            except Exception:
+                break
+
+    async def flush_progress(self, job: Dict[str, Any], progress: Dict[str, int]):
+        """Periodically persists in-flight counters so a restart reports recent progress"""
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_FLUSH_SECONDS)
+            await self.update(job, **progress)
+
+    @staticmethod
+    def remove_upload(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,146 @@
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import create_engine, inspect, select, text, String, Integer, Text, DateTime
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from utils.config import config
+
+JOB_QUEUED = "queued"
+JOB_PARSING = "parsing"
+JOB_INDEXING = "indexing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+UNFINISHED_JOB_STATUSES = (JOB_QUEUED, JOB_PARSING, JOB_INDEXING)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    doc_id: Mapped[str] = mapped_column(String(36), index=True)
+    filename: Mapped[str] = mapped_column(String(512), index=True)
+    path: Mapped[str] = mapped_column(String(1024))
+    file_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    status: Mapped[str] = mapped_column(String(16), default=JOB_QUEUED, index=True)
+    pages_parsed: Mapped[int] = mapped_column(Integer, default=0)
+    chunks_total: Mapped[int] = mapped_column(Integer, default=0)
+    chunks_embedded: Mapped[int] = mapped_column(Integer, default=0)
+    chunks_indexed: Mapped[int] = mapped_column(Integer, default=0)
+    chunks_reused: Mapped[int] = mapped_column(Integer, default=0)
+    chunks_deleted: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "document_id": self.doc_id,
+            "filename": self.filename,
+            "status": self.status,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_indexed": self.chunks_indexed,
+            "chunks_reused": self.chunks_reused or 0,
+            "chunks_deleted": self.chunks_deleted or 0,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+
+
+class JobStore:
+    """SQLite-backed ingestion job state, so progress and unfinished jobs survive restarts.
+
+    Methods are synchronous; async callers run them with asyncio.to_thread.
+    """
+    def __init__(self, url: Optional[str] = None):
+        url = url or config.JOB_STORE_URL
+        if url.startswith("sqlite:///"):
+            os.makedirs(os.path.dirname(url[len("sqlite:///"):]) or ".", exist_ok=True)
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        Base.metadata.create_all(self.engine)
+        self.add_missing_columns()
+
+    def add_missing_columns(self):
+        """Adds columns introduced since the job table was created; create_all only creates missing tables"""
+        existing = {column["name"] for column in inspect(self.engine).get_columns(IngestionJob.__tablename__)}
+        with self.engine.begin() as connection:
+            for column in IngestionJob.__table__.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(self.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {IngestionJob.__tablename__} ADD COLUMN {column.name} {column_type}"))
+            for index in IngestionJob.__table__.indexes:
+                index.create(connection, checkfirst=True)
+
+    def create(self, filename: str, path: str, doc_id: Optional[str] = None, file_hash: Optional[str] = None) -> Dict[str, Any]:
+        job = IngestionJob(
+            id=str(uuid.uuid4()),
+            doc_id=doc_id or str(uuid.uuid4()),
+            filename=filename,
+            path=path,
+            file_hash=file_hash,
+            status=JOB_QUEUED,
+            pages_parsed=0,
+            chunks_total=0,
+            chunks_embedded=0,
+            chunks_indexed=0,
+            chunks_reused=0,
+            chunks_deleted=0
+        )
+        with Session(self.engine) as session:
+            session.add(job)
+            session.commit()
+            return job.to_dict() | {"path": job.path}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with Session(self.engine) as session:
+            job = session.get(IngestionJob, job_id)
+            return job.to_dict() if job else None
+
+    def update(self, job_id: str, **fields):
+        with Session(self.engine) as session:
+            job = session.get(IngestionJob, job_id)
+            if job is None:
+                return
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = datetime.utcnow()
+            session.commit()
+
+    def latest(self, include_failed: bool = False, **filters) -> Optional[Dict[str, Any]]:
+        """The newest job matching the column filters"""
+        query = select(IngestionJob).filter_by(**filters)
+        if not include_failed:
+            query = query.where(IngestionJob.status != JOB_FAILED)
+        with Session(self.engine) as session:
+            job = session.scalars(query.order_by(IngestionJob.created_at.desc()).limit(1)).first()
+            return job.to_dict() if job else None
+
+    def find_current(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """The job that produced (or is producing) a document's current version from a file with this hash.
+
+        No match if the document has been re-indexed since, even by a job that failed part way.
+        """
+        job = self.latest(file_hash=file_hash)
+        if job is None:
+            return None
+        current = self.latest(include_failed=True, doc_id=job["document_id"])
+        return job if current["job_id"] == job["job_id"] else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with Session(self.engine) as session:
+            jobs = session.scalars(
+                select(IngestionJob)
+                .where(IngestionJob.status.in_(UNFINISHED_JOB_STATUSES))
+                .order_by(IngestionJob.created_at)
+            )
+            return [job.to_dict() | {"path": job.path} for job in jobs]
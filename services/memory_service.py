@@ -1,30 +1,57 @@
-from typing import Dict, List, Any
+import asyncio
+from collections import deque
+from typing import Dict, List, Any, Optional
 from datetime import datetime
-from services.typesense_client import TypesenseClient
+
+from cachetools import TTLCache
+
+from services.typesense_client import typesense_client
 from utils.config import config
 from utils.constants import (
-    DEFAULT_CONVERSATION_LIMIT, 
+    DEFAULT_CONVERSATION_LIMIT,
     DEFAULT_CONTEXT_LIMIT,
-    CONVERSATIONS_SCHEMA_FIELDS
+    MEMORY_FETCH_LIMIT,
+    MEMORY_RETRY_BACKOFF_SECONDS
 )
 
 class MemoryService:
+    """Conversation memory with an in-process session cache and write-behind persistence.
+    
+    Each cached session holds its most recent interactions in timestamp order, so building
+    context needs no network call. New interactions go into the cache immediately and onto a
+    queue that a background task flushes to the conversations collection in bulk imports,
+    retrying failed documents; stop() drains the queue. Until an interaction is flushed it is
+    also kept in `unflushed`, so a session reloaded from Typesense still sees it.
+    """
     def __init__(self):
-        self.typesense = TypesenseClient()
-        self.ensure_memory_collections()
+        self.typesense = typesense_client
+        self.sessions = TTLCache(maxsize=config.SESSION_CACHE_MAX_SESSIONS, ttl=config.SESSION_CACHE_TTL_SECONDS)
+        self.unflushed: Dict[str, Dict[str, Any]] = {}
+        self.counters = {'hits': 0, 'misses': 0, 'flushed': 0, 'flushes': 0, 'retries': 0, 'dropped': 0}
+        self.queue: Optional[asyncio.Queue] = None
+        self.flusher: Optional[asyncio.Task] = None
+        self.write_lock: Optional[asyncio.Lock] = None
     
-    def ensure_memory_collections(self):
-        """Create Typesense collections for memory storage"""
-        try:
-            self.typesense.client.collections[config.CONVERSATIONS_COLLECTION].retrieve()
-        except Exception as e:
-            conversation_schema = {
-                'name': config.CONVERSATIONS_COLLECTION,
-                'fields': CONVERSATIONS_SCHEMA_FIELDS
-            }
-            self.typesense.client.collections.create(conversation_schema)
+    def start(self):
+        """Starts the write-behind flusher on the running loop"""
+        if self.flusher is None or self.flusher.done() or self.flusher.get_loop() is not asyncio.get_running_loop():
+            self.queue = asyncio.Queue()
+            self.write_lock = asyncio.Lock()
+            self.flusher = asyncio.create_task(self.flush_loop())
+            # Interactions queued on a previous loop were never flushed
+            for interaction in self.unflushed.values():
+                self.queue.put_nowait(interaction)
     
-    def add_interaction(self, session_id: str, question: str, answer: str, sources: List[str]):
+    async def stop(self):
+        """Flushes every queued interaction, then stops the flusher"""
+        if self.flusher is None:
+            return
+        await self.queue.join()
+        self.flusher.cancel()
+        await asyncio.gather(self.flusher, return_exceptions=True)
+        self.flusher = None
+    
+    async def add_interaction(self, session_id: str, question: str, answer: str, sources: List[str]):
         timestamp = datetime.utcnow().isoformat()
         interaction = {
             'session_id': session_id,
@@ -34,28 +61,90 @@ class MemoryService:
             'sources': sources,
             'interaction_id': f"{session_id}_{datetime.utcnow().timestamp()}"
         }
+        interaction['id'] = interaction['interaction_id']
         
-        try:
-            self.typesense.client.collections[config.CONVERSATIONS_COLLECTION].documents.create(interaction)
-        except Exception as e:
-            pass
+        if session_id in self.sessions:
+            self.sessions[session_id].append(interaction)
+        self.start()
+        self.unflushed[interaction['id']] = interaction
+        self.queue.put_nowait(interaction)
+    
+    async def flush_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Let a burst of writes accumulate into one bulk import
+            await asyncio.sleep(config.MEMORY_FLUSH_INTERVAL_SECONDS)
+            while len(batch) < config.MEMORY_FLUSH_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def flush(self, batch: List[Dict[str, Any]]):
+        """Bulk imports a batch, retrying failed documents with exponential backoff"""
+        async with self.write_lock:
+            pending = [interaction for interaction in batch if interaction['id'] in self.unflushed]
+            for attempt in range(config.MEMORY_FLUSH_RETRIES + 1):
+                if not pending:
+                    break
+                if attempt:
+                    self.counters['retries'] += 1
+                    await asyncio.sleep(MEMORY_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                try:
+                    results = await self.typesense.import_documents(pending, collection=config.CONVERSATIONS_COLLECTION)
+                except Exception:
+                    continue
+                self.counters['flushes'] += 1
+                failed = []
+                for interaction, result in zip(pending, results):
+                    if result.get('success'):
+                        self.unflushed.pop(interaction['id'], None)
+                        self.counters['flushed'] += 1
+                    else:
+                        failed.append(interaction)
+                pending = failed
+            
+            for interaction in pending:
+                self.unflushed.pop(interaction['id'], None)
+                self.counters['dropped'] += 1
     
-    def get_conversation_history(self, session_id: str, limit: int = DEFAULT_CONVERSATION_LIMIT) -> List[Dict]:
+    async def load_session(self, session_id: str) -> deque:
+        """Returns the session's recent interactions, oldest first, loading them from Typesense on a cache miss"""
+        if session_id in self.sessions:
+            self.counters['hits'] += 1
+            return self.sessions[session_id]
+        
+        self.counters['misses'] += 1
         search_params = {
             'q': '*',
             'filter_by': f'session_id:={session_id}',
-            'per_page': limit
+            'per_page': MEMORY_FETCH_LIMIT
         }
-        
         try:
-            results = self.typesense.client.collections[config.CONVERSATIONS_COLLECTION].documents.search(search_params)
-            history = [hit['document'] for hit in results['hits']]
-            return history
+            results = await self.typesense.search(search_params, collection=config.CONVERSATIONS_COLLECTION)
         except Exception as e:
-            return []
+            # Serve what is still unflushed, but do not cache a history that may be incomplete
+            results = None
+        
+        interactions = {hit['document']['interaction_id']: hit['document'] for hit in (results or {}).get('hits', [])}
+        for interaction in self.unflushed.values():
+            if interaction['session_id'] == session_id:
+                interactions[interaction['interaction_id']] = interaction
+        
+        history = deque(sorted(interactions.values(), key=lambda interaction: interaction['timestamp']),
+                        maxlen=DEFAULT_CONVERSATION_LIMIT)
+        if results is not None:
+            self.sessions[session_id] = history
+        return history
+    
+    async def get_conversation_history(self, session_id: str, limit: int = DEFAULT_CONVERSATION_LIMIT) -> List[Dict]:
+        history = await self.load_session(session_id)
+        return list(history)[-limit:]
     
-    def get_context_for_question(self, session_id: str, current_question: str) -> str:
-        history = self.get_conversation_history(session_id, limit=DEFAULT_CONTEXT_LIMIT)
+    async def get_context_for_question(self, session_id: str, current_question: str) -> str:
+        history = await self.get_conversation_history(session_id, limit=DEFAULT_CONTEXT_LIMIT)
         
         if not history:
             return ""
@@ -67,10 +156,27 @@ class MemoryService:
         
         return "\n".join(context_parts)
     
-    def clear_session(self, session_id: str):
-        try:
-            self.typesense.client.collections[config.CONVERSATIONS_COLLECTION].documents.delete({
-                'filter_by': f'session_id:={session_id}'
-            })
-        except:
-            pass
+    async def clear_session(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        for interaction_id in [i for i, interaction in self.unflushed.items() if interaction['session_id'] == session_id]:
+            del self.unflushed[interaction_id]
+        
+        self.start()
+        # Waits out an in-flight flush so it cannot re-create documents after the delete
+        async with self.write_lock:
+            try:
+                await self.typesense.delete_documents(
+                    f'session_id:={session_id}',
+                    collection=config.CONVERSATIONS_COLLECTION
+                )
+            except:
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'sessions': len(self.sessions),
+            'unflushed': len(self.unflushed),
+            'hit_rate': self.counters['hits'] / lookups if lookups else 0.0
+        }
@@ -0,0 +1,95 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# Agents
+AGENT_NODE_SECONDS = Histogram('qa_agent_node_seconds', 'Wall-clock time of each agent graph node', ['node'], buckets=LATENCY_BUCKETS)
+AGENT_NODE_IN_FLIGHT = Gauge('qa_agent_node_in_flight', 'Agent graph nodes currently running', ['node'])
+AGENT_NODE_ERRORS = Counter('qa_agent_node_errors', 'Agent graph nodes that raised', ['node'])
+QUERY_SECONDS = Histogram('qa_query_seconds', 'End-to-end time of answered questions', ['mode'], buckets=LATENCY_BUCKETS)
+QUERIES = Counter('qa_queries', 'Questions by outcome (answered, cache_hit, error)', ['mode', 'outcome'])
+SINGLE_FLIGHT_CALLS = Counter('qa_single_flight_calls', 'Coalesced calls by role (leader ran it, shared joined one in flight)', ['scope', 'role'])
+PROMPT_TOKENS = Histogram('qa_prompt_tokens', 'Tokens in packed answer-synthesis prompts', buckets=TOKEN_BUCKETS)
+
+# Gemini
+GEMINI_SECONDS = Histogram('qa_gemini_call_seconds', 'Latency of Gemini calls', ['operation'], buckets=LATENCY_BUCKETS)
+GEMINI_IN_FLIGHT = Gauge('qa_gemini_calls_in_flight', 'Gemini calls currently awaiting the provider', ['operation'])
+GEMINI_ERRORS = Counter('qa_gemini_call_errors', 'Gemini calls that failed or timed out', ['operation'])
+GEMINI_CHARACTERS = Counter('qa_gemini_characters', 'Characters sent to and received from Gemini', ['operation', 'direction'])
+GEMINI_EMBEDDED_TEXTS = Counter('qa_gemini_embedded_texts', 'Texts sent to the embedding API')
+GEMINI_QUEUE_DEPTH = Gauge('qa_gemini_queue_depth', 'Gemini calls waiting for a slot', ['priority'])
+GEMINI_QUEUE_WAIT = Histogram('qa_gemini_queue_wait_seconds', 'Time Gemini calls waited for a slot', ['priority'], buckets=LATENCY_BUCKETS)
+GEMINI_CONCURRENCY_LIMIT = Gauge('qa_gemini_concurrency_limit', 'Adaptive limit on concurrent Gemini calls')
+GEMINI_RATE_LIMITED = Counter('qa_gemini_rate_limited', 'Gemini calls rejected with 429', ['operation'])
+GEMINI_RETRIES = Counter('qa_gemini_retries', 'Gemini calls retried after a rate limit or overload', ['operation'])
+
+# Typesense
+TYPESENSE_SECONDS = Histogram('qa_typesense_request_seconds', 'Latency of Typesense requests', ['method', 'endpoint'], buckets=LATENCY_BUCKETS)
+TYPESENSE_IN_FLIGHT = Gauge('qa_typesense_requests_in_flight', 'Typesense requests currently open')
+TYPESENSE_ERRORS = Counter('qa_typesense_request_errors', 'Typesense requests that failed, by status code or exception', ['endpoint', 'error'])
+TYPESENSE_BYTES = Counter('qa_typesense_bytes', 'Request and response body bytes exchanged with Typesense', ['direction'])
+TYPESENSE_NODE_UP = Gauge('qa_typesense_node_up', 'Whether the node passed its last health check', ['node'])
+TYPESENSE_NODE_LATENCY = Gauge('qa_typesense_node_latency_seconds', 'Smoothed request latency used for load balancing', ['node'])
+TYPESENSE_CIRCUIT_STATE = Gauge('qa_typesense_circuit_state', 'Circuit breaker state per node (0 closed, 1 half-open, 2 open)', ['node'])
+TYPESENSE_FAILOVERS = Counter('qa_typesense_failovers', 'Typesense requests retried on another node', ['kind'])
+
+# Ingestion
+INGESTION_STAGE_SECONDS = Histogram('qa_ingestion_stage_seconds', 'Time spent in each ingestion stage (per job for parse, per batch otherwise)',
+                                    ['stage'], buckets=LATENCY_BUCKETS)
+INGESTION_STAGE_ERRORS = Counter('qa_ingestion_stage_errors', 'Ingestion stages that raised', ['stage'])
+INGESTION_CHUNKS = Counter('qa_ingestion_chunks', 'Chunks through each ingestion stage (embedded, indexed, failed, reused, deleted)', ['stage'])
+INGESTION_BATCHES_IN_FLIGHT = Gauge('qa_ingestion_batches_in_flight', 'Chunk batches currently being embedded or imported')
+
+
+@contextmanager
+def track(latency, in_flight=None, errors=None):
+    """Observes the block's duration in seconds; counts it in flight while it runs and in errors if it raises.
+
+    Pass label-bound children (metric.labels(...)) so the hot path does no label lookups.
+    Cancellation is not counted as an error.
+    """
+    if in_flight is not None:
+        in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errors is not None:
+            errors.inc()
+        raise
+    finally:
+        latency.observe(time.perf_counter() - start)
+        if in_flight is not None:
+            in_flight.dec()
+
+
+class StatsCollector:
+    """Exposes the numeric fields of components' stats() dicts as gauges, read at scrape time"""
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, component: str, stats: Callable[[], Dict[str, Any]]):
+        self.sources[component] = stats
+
+    def collect(self):
+        gauge = GaugeMetricFamily('qa_component_stat', 'Numeric fields of cache and index stats()', labels=['component', 'stat'])
+        for component, stats in self.sources.items():
+            for stat, value in stats().items():
+                if isinstance(value, (int, float)):
+                    gauge.add_metric([component, stat], float(value))
+        yield gauge
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_metrics(registry: Optional[Any] = None):
+    """Returns (body, content type) for the Prometheus text exposition format"""
+    return generate_latest(registry or REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,184 @@
+# Parsing only: the ingestion process pool imports this module, so it must not pull in
+# the service singletons that open the local index, the embedding cache or the clients.
+import codecs
+import re
+import zipfile
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import chain
+from typing import List, Optional, Iterable, Iterator, BinaryIO, Tuple, Union
+
+from services.tokenizer import TokenCounter, token_counter
+from utils.config import config
+from utils.constants import TEXT_BLOCK_SIZE, MAX_SENTENCE_CHARS
+
+DOCX_BODY_PART = 'word/document.xml'
+DOCX_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_PARAGRAPH = f'{DOCX_NAMESPACE}p'
+DOCX_TEXT = f'{DOCX_NAMESPACE}t'
+DOCX_TAB = f'{DOCX_NAMESPACE}tab'
+DOCX_BREAK = f'{DOCX_NAMESPACE}br'
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+@contextmanager
+def open_binary(source: Union[str, BinaryIO]):
+    """Opens a path for binary reading, or passes an already open file object through"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield f
+    else:
+        yield source
+
+def extract_text(filename: str, content: bytes) -> str:
+    return "".join(iter_pages(BytesIO(content), filename))
+
+def extract_pages(filename: str, content: bytes) -> List[str]:
+    return list(iter_pages(BytesIO(content), filename))
+
+def iter_pages(source: Union[str, BinaryIO], filename: str) -> Iterator[str]:
+    """Yields a document's natural units one at a time: PDF pages, DOCX paragraphs or text blocks.
+
+    source is a path or a binary file object; the document is never loaded whole.
+    """
+    if filename.endswith('.pdf'):
+        return iter_pdf_pages(source)
+    elif filename.endswith('.docx'):
+        return iter_docx_paragraphs(source)
+    else:
+        return iter_text_blocks(source)
+
+def iter_pdf_pages(source: Union[str, BinaryIO]) -> Iterator[str]:
+    # Parsers are imported on first use to keep them out of the app's startup path
+    import PyPDF2
+
+    with open_binary(source) as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for page in pdf_reader.pages:
+            yield page.extract_text()
+            # Drop parsed page objects so memory does not grow with the page count
+            pdf_reader.resolved_objects.clear()
+
+def iter_docx_paragraphs(source: Union[str, BinaryIO]) -> Iterator[str]:
+    from lxml import etree
+
+    with open_binary(source) as f, zipfile.ZipFile(f) as archive, archive.open(DOCX_BODY_PART) as body:
+        for _, element in etree.iterparse(body, events=('end',), tag=DOCX_PARAGRAPH):
+            parts = []
+            for node in element.iter(DOCX_TEXT, DOCX_TAB, DOCX_BREAK):
+                if node.tag == DOCX_TEXT:
+                    parts.append(node.text or "")
+                else:
+                    parts.append("\t" if node.tag == DOCX_TAB else "\n")
+            yield "".join(parts) + "\n"
+
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+def iter_text_blocks(source: Union[str, BinaryIO], block_size: int = TEXT_BLOCK_SIZE) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open_binary(source) as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield decoder.decode(block)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def extract_pdf_text(content: bytes) -> str:
+    return "".join(iter_pdf_pages(BytesIO(content)))
+
+def extract_docx_text(content: bytes) -> str:
+    return "".join(iter_docx_paragraphs(BytesIO(content)))
+
+def iter_chunks(segments: Iterable[str], chunk_tokens: Optional[int] = None,
+                overlap_tokens: Optional[int] = None, counter: Optional[TokenCounter] = None) -> Iterator[str]:
+    """Packs a stream of text segments into chunks of at most chunk_tokens tokens, yielding chunks as they fill.
+
+    Chunks break at sentence and paragraph boundaries; only a sentence longer than a whole
+    chunk is cut mid-sentence. Each chunk starts with the trailing sentences of the previous
+    one, up to overlap_tokens. Sentences are token-counted in one batch per segment.
+    """
+    chunk_tokens = chunk_tokens or config.CHUNK_TOKENS
+    overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    counter = counter or token_counter
+
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+    pending = ""
+
+    for segment in chain(segments, [None]):
+        if segment is None:
+            parts, pending = [pending], ""
+        else:
+            parts = SENTENCE_BOUNDARY.split(pending + segment)
+            pending = parts.pop()
+            if len(pending) > MAX_SENTENCE_CHARS:
+                # No boundary in sight; cut at the last whitespace to keep the carry-over bounded
+                cut = max(pending.rfind(" "), pending.rfind("\n"), 0) or len(pending)
+                parts.append(pending[:cut])
+                pending = pending[cut:]
+
+        sentences = [" ".join(part.split()) for part in parts]
+        sentences = [sentence for sentence in sentences if sentence]
+        counted = []
+        # Each sentence is charged one extra token for the space that joins it to the previous one
+        for sentence, tokens in zip(sentences, counter.count_batch(sentences)):
+            if tokens + 1 > chunk_tokens:
+                pieces = counter.split(sentence, chunk_tokens - 1)
+                counted.extend((piece, size + 1) for piece, size in zip(pieces, counter.count_batch(pieces)))
+            else:
+                counted.append((sentence, tokens + 1))
+
+        for sentence, tokens in counted:
+            if current_tokens + tokens > chunk_tokens and current:
+                yield " ".join(text for text, _ in current)
+                overlap = []
+                overlap_size = 0
+                for text, size in reversed(current):
+                    if overlap_size + size > overlap_tokens:
+                        break
+                    overlap.insert(0, (text, size))
+                    overlap_size += size
+                current, current_tokens = overlap, overlap_size
+                while current and current_tokens + tokens > chunk_tokens:
+                    current_tokens -= current.pop(0)[1]
+            current.append((sentence, tokens))
+            current_tokens += tokens
+
+    if current:
+        yield " ".join(text for text, _ in current)
+
+def split_text(text: str, chunk_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> List[str]:
+    return list(iter_chunks([text], chunk_tokens, overlap_tokens))
+
+def parse_document_file(path: str, filename: str, output, batch_size: int):
+    """Streams an uploaded file's chunks into output in batches; runs in the ingestion process pool.
+
+    Puts ("batch", pages_parsed, chunks) messages, then ("done", pages_parsed, []) or
+    ("error", pages_parsed, message). output is a bounded queue, so a slow consumer
+    pauses parsing.
+    """
+    pages = 0
+
+    def counted_pages():
+        nonlocal pages
+        for page in iter_pages(path, filename):
+            pages += 1
+            yield page
+
+    try:
+        batch = []
+        for chunk in iter_chunks(counted_pages()):
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                output.put(("batch", pages, batch))
+                batch = []
+        if batch:
+            output.put(("batch", pages, batch))
+        output.put(("done", pages, []))
+    except Exception as e:
+        output.put(("error", pages, str(e)))
@@ -0,0 +1,211 @@
+import os
+import re
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.config import config
+from utils.constants import LOCAL_ANALYZER_MIN_EXAMPLES, LOCAL_ANALYZER_MARGIN_SCALE
+
+INTENTS = ["factual", "comparison", "explanation", "definition"]
+QUERY_TYPES = ["simple", "complex", "multi-part"]
+
+# (pattern, intent, confidence); the first matching pattern wins
+INTENT_RULES = [
+    (re.compile(r"\b(compare|comparison|versus|vs\.?|difference(s)? between|differ(s)? from|better than|similarities)\b"), "comparison", 0.95),
+    (re.compile(r"^\s*(define|definition of)\b|\bwhat('s| is| are| does)\b.{0,40}\b(mean|stand for)\b|\bmeaning of\b"), "definition", 0.95),
+    (re.compile(r"^\s*what (is|are) (a |an |the )?[\w\- ]{1,40}\??\s*$"), "definition", 0.8),
+    (re.compile(r"^\s*(why|explain|describe)\b|\bhow (does|do|did|can|could|would|is|are)\b"), "explanation", 0.9),
+    (re.compile(r"^\s*(who|when|where|which|how (many|much|long|often|old)|list|name|is|are|does|do|did|can)\b"), "factual", 0.9),
+    (re.compile(r"^\s*what\b"), "factual", 0.7),
+]
+
+MULTI_PART_PATTERN = re.compile(r"\?.+\?|\b(and also|as well as|additionally|also,)\b|;\s*\w|\b\d\)\s")
+COMPLEX_PATTERN = re.compile(r"\b(impact|implications?|relationship|trade-?offs?|pros and cons|analy[sz]e|evaluate|in detail|step by step)\b")
+COMPLEX_WORD_COUNT = 18
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours yourself yourselves
+compare comparison versus vs difference differences between define definition meaning mean means explain
+describe tell list name give show please document documents does doc say says said also many much
+""".split())
+WORD_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-\.']*[A-Za-z0-9]|[A-Za-z0-9]")
+QUOTED_PATTERN = re.compile(r"\"([^\"]+)\"|'([^']{3,})'")
+
+ANALYSIS_LINE_PATTERNS = {
+    "intent": re.compile(r"^\W*intent\W*:\s*(.+)$", re.IGNORECASE | re.MULTILINE),
+    "key_concepts": re.compile(r"^\W*(?:key\s+)?concepts\W*:\s*(.+)$", re.IGNORECASE | re.MULTILINE),
+    "query_type": re.compile(r"^\W*(?:query\s+)?type\W*:\s*(.+)$", re.IGNORECASE | re.MULTILINE),
+}
+
+
+def parse_llm_analysis(text: str) -> Dict[str, Any]:
+    """Parses the analyzer prompt's Intent/Concepts/Type lines, falling back to defaults on malformed output"""
+    fields = {}
+    for field, pattern in ANALYSIS_LINE_PATTERNS.items():
+        match = pattern.search(text or "")
+        fields[field] = match.group(1).strip().strip("[]").strip() if match else ""
+
+    intent = fields["intent"].lower()
+    query_type = fields["query_type"].lower()
+    return {
+        "intent": intent if intent in INTENTS else "factual",
+        "key_concepts": [c.strip() for c in fields["key_concepts"].split(",") if c.strip()],
+        "query_type": query_type if query_type in QUERY_TYPES else "simple",
+    }
+
+
+def extract_key_concepts(query: str) -> List[str]:
+    """Quoted phrases, then runs of consecutive content words (up to three words each)"""
+    concepts = [a or b for a, b in QUOTED_PATTERN.findall(query)]
+    remainder = QUOTED_PATTERN.sub(" ", query)
+
+    phrase: List[str] = []
+    for token in WORD_PATTERN.findall(remainder) + [""]:
+        if token and token.lower() not in STOPWORDS and len(phrase) < 3:
+            phrase.append(token)
+            continue
+        if phrase:
+            concepts.append(" ".join(phrase))
+        phrase = [token] if token and token.lower() not in STOPWORDS else []
+
+    seen = set()
+    return [c for c in concepts if not (c.lower() in seen or seen.add(c.lower()))]
+
+
+class QueryClassifier:
+    """Nearest-centroid classifier over normalized query embeddings.
+
+    Centroids are running sums, so the classifier can be trained offline with fit()
+    and keep learning online from LLM analyses with learn().
+    """
+    def __init__(self, labels: List[str]):
+        self.labels = labels
+        self.sums: Optional[np.ndarray] = None
+        self.counts = np.zeros(len(labels), dtype=np.int64)
+
+    @staticmethod
+    def normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def learn(self, embedding, label: str):
+        if label not in self.labels:
+            return
+        vector = self.normalize(embedding)
+        if self.sums is None:
+            self.sums = np.zeros((len(self.labels), vector.shape[0]), dtype=np.float32)
+        index = self.labels.index(label)
+        self.sums[index] += vector
+        self.counts[index] += 1
+
+    def fit(self, embeddings, labels: List[str]):
+        for embedding, label in zip(embeddings, labels):
+            self.learn(embedding, label)
+        return self
+
+    def predict(self, embedding):
+        """Returns (label, confidence) where confidence is the cosine margin over the runner-up"""
+        trained = self.counts >= LOCAL_ANALYZER_MIN_EXAMPLES
+        if self.sums is None or trained.sum() < 2:
+            return None, 0.0
+
+        centroids = self.sums / np.maximum(self.counts, 1)[:, None]
+        norms = np.linalg.norm(centroids, axis=1)
+        similarities = centroids @ self.normalize(embedding) / np.where(norms == 0, 1.0, norms)
+        similarities[~trained] = -np.inf
+
+        best, runner_up = np.argsort(similarities)[::-1][:2]
+        margin = float(similarities[best] - similarities[runner_up])
+        return self.labels[best], min(1.0, 0.5 + margin * LOCAL_ANALYZER_MARGIN_SCALE)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"sums": self.sums if self.sums is not None else np.zeros((0, 0)), "counts": self.counts}
+
+    def load_state(self, sums: np.ndarray, counts: np.ndarray):
+        self.sums = sums.astype(np.float32) if sums.size else None
+        self.counts = counts.astype(np.int64)
+
+
+class LocalQueryAnalyzer:
+    """Keyword/regex rules plus embedding classifiers that stand in for the LLM query analyzer.
+
+    analyze() returns intent, key concepts, query type and a confidence; callers fall back
+    to the LLM when the confidence is below LOCAL_ANALYZER_MIN_CONFIDENCE.
+    """
+    def __init__(self, model_path: Optional[str] = None):
+        self.model_path = model_path or config.LOCAL_ANALYZER_MODEL_PATH
+        self.intent_classifier = QueryClassifier(INTENTS)
+        self.type_classifier = QueryClassifier(QUERY_TYPES)
+        self.load()
+
+    def rule_intent(self, query: str):
+        text = query.lower()
+        for pattern, intent, confidence in INTENT_RULES:
+            if pattern.search(text):
+                return intent, confidence
+        return "factual", 0.5
+
+    def rule_query_type(self, query: str, intent: str):
+        text = query.lower()
+        if MULTI_PART_PATTERN.search(text):
+            return "multi-part", 0.85
+        if COMPLEX_PATTERN.search(text) or len(text.split()) > COMPLEX_WORD_COUNT:
+            return "complex", 0.8
+        if intent == "comparison":
+            return "complex", 0.7
+        return "simple", 0.85
+
+    @staticmethod
+    def combine(rule_label: str, rule_confidence: float, model_label: Optional[str], model_confidence: float):
+        if model_label is None:
+            return rule_label, rule_confidence
+        if model_label == rule_label:
+            return rule_label, max(rule_confidence, model_confidence, min(1.0, (rule_confidence + model_confidence) / 2 + 0.1))
+        if model_confidence > rule_confidence:
+            return model_label, model_confidence - rule_confidence / 2
+        return rule_label, rule_confidence - model_confidence / 2
+
+    def analyze(self, query: str, embedding=None) -> Dict[str, Any]:
+        intent, intent_confidence = self.rule_intent(query)
+        query_type, type_confidence = self.rule_query_type(query, intent)
+
+        if embedding is not None:
+            intent, intent_confidence = self.combine(intent, intent_confidence, *self.intent_classifier.predict(embedding))
+            query_type, type_confidence = self.combine(query_type, type_confidence, *self.type_classifier.predict(embedding))
+
+        return {
+            "intent": intent,
+            "key_concepts": extract_key_concepts(query),
+            "query_type": query_type,
+            "confidence": min(intent_confidence, type_confidence),
+        }
+
+    def learn(self, embedding, analysis: Dict[str, Any]):
+        """Feeds an LLM analysis back into the embedding classifiers"""
+        self.intent_classifier.learn(embedding, analysis["intent"])
+        self.type_classifier.learn(embedding, analysis["query_type"])
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.model_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        intent_state, type_state = self.intent_classifier.state(), self.type_classifier.state()
+        np.savez(
+            path,
+            intent_sums=intent_state["sums"], intent_counts=intent_state["counts"],
+            type_sums=type_state["sums"], type_counts=type_state["counts"]
+        )
+
+    def load(self, path: Optional[str] = None):
+        path = path or self.model_path
+        if not path or not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            self.intent_classifier.load_state(data["intent_sums"], data["intent_counts"])
+            self.type_classifier.load_state(data["type_sums"], data["type_counts"])
@@ -0,0 +1,76 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from utils.config import config
+
+
+class Reranker:
+    """Maximal marginal relevance selection with near-duplicate suppression.
+
+    Candidates come over-fetched in search rank order with their chunk embeddings.
+    Relevance blends cosine similarity to the query with the search rank, weighted by
+    the strategy's semantic_weight. Each pick is the candidate with the best trade-off
+    between relevance and similarity to what is already selected, and any remaining
+    candidate at least duplicate_threshold similar to a pick is discarded outright.
+    """
+    def __init__(self, mmr_lambda: Optional[float] = None, duplicate_threshold: Optional[float] = None):
+        self.mmr_lambda = config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        self.duplicate_threshold = duplicate_threshold or config.DUPLICATE_THRESHOLD
+
+    @staticmethod
+    def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def embedding_matrix(self, docs: List[Dict[str, Any]], dimension: int) -> np.ndarray:
+        """Stacks candidate embeddings; candidates without one get a zero row and are never treated as duplicates"""
+        matrix = np.zeros((len(docs), dimension), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            if doc.get("embedding") is not None:
+                matrix[i] = doc["embedding"]
+        return self.normalize_rows(matrix)
+
+    def select(self, query_embedding: List[float], docs: List[Dict[str, Any]], limit: int,
+               semantic_weight: float = 0.5) -> Tuple[List[int], int]:
+        """Returns the indices of the selected candidates in selection order, and how many were dropped as duplicates"""
+        count = len(docs)
+        if count == 0:
+            return [], 0
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        matrix = self.embedding_matrix(docs, query.shape[0])
+
+        rank_score = 1.0 - np.arange(count, dtype=np.float32) / count
+        relevance = semantic_weight * (matrix @ query) + (1.0 - semantic_weight) * rank_score
+        similarity = matrix @ matrix.T
+
+        selected = []
+        duplicates = 0
+        available = np.ones(count, dtype=bool)
+        max_similarity = np.zeros(count, dtype=np.float32)
+        while len(selected) < limit and available.any():
+            scores = self.mmr_lambda * relevance - (1.0 - self.mmr_lambda) * max_similarity
+            best = int(np.argmax(np.where(available, scores, -np.inf)))
+            selected.append(best)
+            available[best] = False
+
+            max_similarity = np.maximum(max_similarity, similarity[best])
+            duplicate = available & (similarity[best] >= self.duplicate_threshold)
+            duplicates += int(duplicate.sum())
+            available &= ~duplicate
+
+        return selected, duplicates
+
+    def rerank(self, query_embedding: List[float], docs: List[Dict[str, Any]], limit: int,
+               semantic_weight: float = 0.5) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        selected, duplicates = self.select(query_embedding, docs, limit, semantic_weight)
+        return [docs[i] for i in selected], {
+            "candidates": len(docs),
+            "duplicates_removed": duplicates,
+            "selected": len(selected)
+        }
+
+
+reranker = Reranker()
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from services.metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, for coalescing identical ones"""
+    return " ".join(question.casefold().split())
+
+
+class Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers asking for the same key.
+
+    The call runs as its own task, so a caller that is cancelled (e.g. its client went away)
+    stops waiting without cancelling the call for the others; the call is only cancelled
+    once every caller has gone. Results are shared, not copied, so callers must not mutate them.
+    """
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.flights: Dict[Hashable, Flight] = {}
+        self.calls = 0
+        self.shared = 0
+        self.leader_calls = SINGLE_FLIGHT_CALLS.labels(scope, "leader")
+        self.shared_calls = SINGLE_FLIGHT_CALLS.labels(scope, "shared")
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Awaits call(), or the call already in flight for key"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda task: self.finished(key, flight))
+            self.flights[key] = flight
+            self.calls += 1
+            self.leader_calls.inc()
+        else:
+            self.shared += 1
+            self.shared_calls.inc()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self.forget(key, flight)
+                flight.task.cancel()
+
+    def finished(self, key: Hashable, flight: Flight):
+        self.forget(key, flight)
+        if not flight.task.cancelled():
+            # Marks the exception retrieved when every waiter was cancelled before it was raised
+            flight.task.exception()
+
+    def forget(self, key: Hashable, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.calls + self.shared
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "in_flight": len(self.flights),
+            "shared_rate": self.shared / requests if requests else 0.0
+        }
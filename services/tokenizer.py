@@ -0,0 +1,104 @@
+import re
+import threading
+import warnings
+from typing import List, Optional
+
+from cachetools import LRUCache
+
+from utils.config import config
+from utils.constants import TOKEN_COUNT_CACHE_ENTRIES
+
+# Approximates BPE tokens when the tiktoken encoding is unavailable: words split
+# into four-character pieces plus one token per punctuation mark. It overcounts
+# slightly, which keeps token budgets on the safe side.
+APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class TokenCounter:
+    """Batched token counting, truncation and splitting with a tiktoken encoding.
+
+    The encoding is loaded on first use (the server loads it during warm-up). If it cannot
+    be loaded (tiktoken downloads encodings on first use, which fails on air-gapped hosts)
+    counts fall back to APPROXIMATE_TOKEN_PATTERN and `exact` is False.
+    """
+    def __init__(self, encoding_name: Optional[str] = None):
+        self.encoding_name = encoding_name or config.TOKENIZER_ENCODING
+        self._encoding = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self.cache = LRUCache(maxsize=TOKEN_COUNT_CACHE_ENTRIES)
+
+    @property
+    def encoding(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.load()
+        return self._encoding
+
+    def load(self):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            warnings.warn(f"tiktoken encoding {self.encoding_name!r} unavailable, approximating token counts: {e}", RuntimeWarning)
+        self._loaded = True
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: List[str], cached: bool = False) -> List[int]:
+        """Counts tokens for many texts in one call; cached=True memoizes counts for texts seen repeatedly"""
+        if cached:
+            # Reads come from this call's own counts: storing the misses may evict earlier hits
+            counts = {text: self.cache[text] for text in texts if text in self.cache}
+            missing = [text for text in dict.fromkeys(texts) if text not in counts]
+            for text, count in zip(missing, self.count_batch(missing)):
+                counts[text] = count
+                self.cache[text] = count
+            return [counts[text] for text in texts]
+
+        if not texts:
+            return []
+        if self.encoding is not None:
+            return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+        return [len(APPROXIMATE_TOKEN_PATTERN.findall(text)) for text in texts]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Cuts text into consecutive pieces of at most max_tokens tokens (at least one each)"""
+        max_tokens = max(1, max_tokens)
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+        ends = [match.end() for match in APPROXIMATE_TOKEN_PATTERN.finditer(text)]
+        pieces, start = [], 0
+        for i in range(max_tokens - 1, len(ends), max_tokens):
+            pieces.append(text[start:ends[i]])
+            start = ends[i]
+        if start < len(text) and text[start:].strip():
+            pieces.append(text[start:])
+        return pieces
+
+    def truncate(self, text: str, max_tokens: int, keep_end: bool = False) -> str:
+        """Keeps the first (or, with keep_end, the last) max_tokens tokens of text"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            kept = tokens[-max_tokens:] if keep_end else tokens[:max_tokens]
+            return self.encoding.decode(kept)
+
+        matches = list(APPROXIMATE_TOKEN_PATTERN.finditer(text))
+        if len(matches) <= max_tokens:
+            return text
+        if keep_end:
+            return text[matches[-max_tokens].start():]
+        return text[:matches[max_tokens - 1].end()]
+
+
+token_counter = TokenCounter()
@@ -1,69 +1,429 @@
-import typesense
-from typing import List, Dict, Any
+import asyncio
+import json
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter, wait_none
+
+from services.metrics import TYPESENSE_SECONDS, TYPESENSE_IN_FLIGHT, TYPESENSE_ERRORS, TYPESENSE_BYTES, TYPESENSE_FAILOVERS
+from services.typesense_nodes import NodePool, TypesenseNode
+from services.vector_index import LocalVectorIndex, get_vector_index
 from utils.config import config
-from utils.constants import CONNECTION_TIMEOUT_SECONDS, TYPESENSE_SCHEMA_FIELDS, DEFAULT_SEARCH_LIMIT
+from utils.constants import (
+    TYPESENSE_SCHEMA_FIELDS,
+    DEFAULT_SEARCH_LIMIT,
+    STARTUP_RETRY_BACKOFF_SECONDS,
+    STARTUP_RETRY_MAX_BACKOFF_SECONDS,
+    TYPESENSE_WRITE_BACKOFF_SECONDS,
+    TYPESENSE_WRITE_MAX_BACKOFF_SECONDS,
+    TYPESENSE_MULTI_SEARCH_GROUP_SIZE
+)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_bytes_sent = TYPESENSE_BYTES.labels('sent')
+_bytes_received = TYPESENSE_BYTES.labels('received')
+_read_failovers = TYPESENSE_FAILOVERS.labels('read')
+_write_failovers = TYPESENSE_FAILOVERS.labels('write')
+
+
+def request_timeout(seconds: float) -> httpx.Timeout:
+    """The request deadline, connecting within TYPESENSE_CONNECT_TIMEOUT_SECONDS so dead nodes are skipped fast"""
+    return httpx.Timeout(seconds, connect=min(seconds, config.TYPESENSE_CONNECT_TIMEOUT_SECONDS))
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the keep-alive connection pool shared by every TypesenseClient on the running loop"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=request_timeout(config.TYPESENSE_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=config.TYPESENSE_MAX_CONNECTIONS,
+                max_keepalive_connections=config.TYPESENSE_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client, _http_client_loop
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
+
+
+class TypesenseError(Exception):
+    """Raised when Typesense answers with an error status"""
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(f"Typesense error {status_code}: {message}")
+
+
+def is_node_failure(error: BaseException) -> bool:
+    """Connection errors and 5xx answers say the node is in trouble; 4xx answers are the caller's"""
+    return isinstance(error, httpx.TransportError) or (isinstance(error, TypesenseError) and error.status_code >= 500)
+
 
 class TypesenseClient:
+    """Async Typesense REST client; the app shares the module-level typesense_client.
+
+    Constructing a client makes no network calls. Collections are created by
+    ensure_collections() from the app's lifespan, which retries until Typesense is up.
+    Requests are spread over the nodes in TYPESENSE_NODES (see NodePool); reads fail over
+    to another node at once, writes are retried with backoff.
+    """
     def __init__(self):
-        self.client = typesense.Client({
-            'nodes': [{
-                'host': config.TYPESENSE_HOST,
-                'port': str(config.TYPESENSE_PORT),
-                'protocol': config.TYPESENSE_PROTOCOL
-            }],
-            'api_key': config.TYPESENSE_API_KEY,
-            'connection_timeout_seconds': CONNECTION_TIMEOUT_SECONDS
-        })
-        self.ensure_collection()
-    
-    def ensure_collection(self):
+        self._base_url = None
+        self._nodes: Optional[NodePool] = None
+        self.headers = {'X-TYPESENSE-API-KEY': config.TYPESENSE_API_KEY}
+        self._local_index: Optional[LocalVectorIndex] = None
+        self._local_index_opened = False
+        self.health_task: Optional[asyncio.Task] = None
+
+    def node_urls(self) -> List[str]:
+        if self._base_url:
+            return [self._base_url]
+        return config.TYPESENSE_NODES or [f"{config.TYPESENSE_PROTOCOL}://{config.TYPESENSE_HOST}:{config.TYPESENSE_PORT}"]
+
+    @property
+    def nodes(self) -> NodePool:
+        """The node pool, rebuilt if the configured nodes change"""
+        urls = self.node_urls()
+        if self._nodes is None or self._nodes.urls != urls:
+            self._nodes = NodePool(urls)
+        return self._nodes
+
+    @property
+    def local_index(self) -> Optional[LocalVectorIndex]:
+        """The local vector index, loaded on first use; None when it is disabled"""
+        if not self._local_index_opened:
+            self._local_index = get_vector_index()
+            self._local_index_opened = True
+        return self._local_index
+
+    @local_index.setter
+    def local_index(self, index: Optional[LocalVectorIndex]):
+        self._local_index = index
+        self._local_index_opened = True
+
+    @property
+    def base_url(self) -> str:
+        """The first configured node, unless overridden by assignment (which makes it the only node)"""
+        return self.node_urls()[0]
+
+    @base_url.setter
+    def base_url(self, value: str):
+        self._base_url = value
+
+    def ensure_collection(self, name: str = None, fields: List[Dict[str, Any]] = None):
+        """Creates a collection if it is missing, synchronously; for scripts running outside the event loop"""
         schema = {
-            'name': config.COLLECTION_NAME,
-            'fields': TYPESENSE_SCHEMA_FIELDS
+            'name': name or config.COLLECTION_NAME,
+            'fields': fields or TYPESENSE_SCHEMA_FIELDS
         }
-        
+
+        with httpx.Client(base_url=self.base_url, headers=self.headers,
+                          timeout=request_timeout(config.TYPESENSE_TIMEOUT_SECONDS)) as client:
+            response = client.get(f"/collections/{schema['name']}")
+            if response.status_code == 404:
+                response = client.post("/collections", json=schema)
+            if response.status_code >= 400 and response.status_code != 409:
+                raise TypesenseError(response.status_code, response.text)
+
+    async def create_collection(self, name: str, fields: List[Dict[str, Any]]):
+        """Creates a collection if it is missing"""
         try:
-            self.client.collections[config.COLLECTION_NAME].retrieve()
-        except:
-            self.client.collections.create(schema)
-    
-    async def index_document(self, document: Dict[str, Any]):
-        self.client.collections[config.COLLECTION_NAME].documents.create(document)
-    
-    async def hybrid_search(self, query: str, query_embedding: List[float], limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict]:
-        """Hybrid search combining keyword and vector search"""
-        search_requests = {
-            'searches': [
-                {
-                    'collection': config.COLLECTION_NAME,
-                    'q': query,
-                    'query_by': 'content',
-                    'vector_query': f'embedding:([{",".join(map(str, query_embedding))}], k:{limit})',
-                    'per_page': limit,
-                    'include_fields': 'doc_id,filename,content,chunk_index'
-                }
-            ]
-        }
-        
+            await self.request('GET', f"/collections/{name}")
+        except TypesenseError as e:
+            if e.status_code != 404:
+                raise
+            try:
+                await self.request('POST', "/collections", json_body={'name': name, 'fields': fields})
+            except TypesenseError as e:
+                if e.status_code != 409:
+                    raise
+
+    async def ensure_collections(self, collections: Dict[str, List[Dict[str, Any]]]):
+        """Creates missing collections concurrently, retrying with backoff while Typesense is unreachable.
+
+        Connection errors and 5xx answers are retried indefinitely; other errors (a rejected
+        schema or API key) are raised.
+        """
+        backoff = STARTUP_RETRY_BACKOFF_SECONDS
+        while True:
+            try:
+                await asyncio.gather(*(self.create_collection(name, fields) for name, fields in collections.items()))
+                return
+            except (httpx.TransportError, TypesenseError) as e:
+                if not is_node_failure(e):
+                    raise
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, STARTUP_RETRY_MAX_BACKOFF_SECONDS)
+
+    async def check_node(self, node: TypesenseNode):
+        start = time.perf_counter()
+        try:
+            response = await get_http_client().get(f"{node.url}/health", headers=self.headers,
+                                                   timeout=request_timeout(config.TYPESENSE_TIMEOUT_SECONDS))
+            ok = response.status_code == 200 and bool(response.json().get('ok'))
+        except Exception:
+            ok = False
+        node.health_checked(ok, time.perf_counter() - start)
+
+    async def check_health(self):
+        await asyncio.gather(*(self.check_node(node) for node in self.nodes.nodes))
+
+    async def health(self) -> bool:
+        """Checks every node now; True if any of them is healthy"""
+        await self.check_health()
+        return any(node.healthy for node in self.nodes.nodes)
+
+    async def run_health_checks(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(config.TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS)
+
+    def start_health_checks(self):
+        """Starts probing every node's /health in the background, every TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS"""
+        if self.health_task is None or self.health_task.done():
+            self.health_task = asyncio.create_task(self.run_health_checks())
+
+    async def stop_health_checks(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            await asyncio.gather(self.health_task, return_exceptions=True)
+            self.health_task = None
+
+    async def request(self, method: str, path: str, params: Dict[str, Any] = None, json_body: Any = None,
+                      content: str = None, timeout: float = None, stream: bool = False) -> httpx.Response:
+        """Sends one request to a node picked by the pool, failing over to other nodes.
+
+        Reads (GET and multi_search) try each node at most once, without waiting. Writes are retried
+        up to TYPESENSE_WRITE_RETRIES times with jittered exponential backoff, preferring nodes not
+        tried yet. Only connection errors and 5xx answers are retried; other errors are raised at once.
+        With stream, the response is returned once its headers arrive and the caller must aclose() it;
+        failover then only covers failures before the body starts.
+        """
+        read = method == 'GET' or path == "/multi_search"
+        pool = self.nodes
+        failovers = _read_failovers if read else _write_failovers
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(len(pool.nodes) if read else config.TYPESENSE_WRITE_RETRIES + 1),
+            wait=wait_none() if read else wait_exponential_jitter(initial=TYPESENSE_WRITE_BACKOFF_SECONDS,
+                                                                 max=TYPESENSE_WRITE_MAX_BACKOFF_SECONDS,
+                                                                 jitter=TYPESENSE_WRITE_BACKOFF_SECONDS),
+            retry=retry_if_exception(is_node_failure),
+            before_sleep=lambda state: failovers.inc(),
+            reraise=True
+        )
+        tried = set()
+        async for attempt in retrying:
+            with attempt:
+                node = pool.pick(tried) or pool.pick()
+                if node is None:
+                    TYPESENSE_ERRORS.labels(path, 'no_node').inc()
+                    raise TypesenseError(503, "every Typesense node is shed by its circuit breaker")
+                tried.add(node)
+                return await self.send(node, method, path, params, json_body, content, timeout, stream)
+
+    async def send(self, node: TypesenseNode, method: str, path: str, params: Dict[str, Any] = None,
+                   json_body: Any = None, content: str = None, timeout: float = None,
+                   stream: bool = False) -> httpx.Response:
+        """Sends one request to one node, recording its latency, body sizes and failures in the qa_typesense_* metrics"""
+        node.started()
+        TYPESENSE_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            http_client = get_http_client()
+            response = await http_client.send(http_client.build_request(
+                method,
+                f"{node.url}{path}",
+                params=params,
+                json=json_body,
+                content=content,
+                headers=self.headers,
+                timeout=request_timeout(timeout or config.TYPESENSE_TIMEOUT_SECONDS)
+            ), stream=stream)
+            if stream and response.status_code >= 400:
+                # Error bodies are short; read them so the error carries Typesense's message
+                await response.aread()
+        except httpx.TransportError as e:
+            node.failed()
+            TYPESENSE_ERRORS.labels(path, type(e).__name__).inc()
+            raise
+        except BaseException as e:
+            # Cancelled by a caller's deadline, or not the node's fault: the wait still measures the node
+            node.abandoned(time.perf_counter() - start)
+            if isinstance(e, Exception):
+                TYPESENSE_ERRORS.labels(path, type(e).__name__).inc()
+            raise
+        finally:
+            TYPESENSE_SECONDS.labels(method, path).observe(time.perf_counter() - start)
+            TYPESENSE_IN_FLIGHT.dec()
+
+        if response.status_code >= 500:
+            node.failed()
+        else:
+            node.succeeded(time.perf_counter() - start)
+        _bytes_sent.inc(len(response.request.content))
+        if response.is_closed:
+            # A streamed body is counted by its reader
+            _bytes_received.inc(len(response.content))
+        if response.status_code >= 400:
+            TYPESENSE_ERRORS.labels(path, str(response.status_code)).inc()
+            raise TypesenseError(response.status_code, response.text)
+        return response
+
+    async def index_document(self, document: Dict[str, Any], collection: str = None, timeout: float = None):
+        collection = collection or config.COLLECTION_NAME
+        response = await self.request('POST', f"/collections/{collection}/documents", json_body=document, timeout=timeout)
+        return response.json()
+
+    async def import_documents(self, documents: List[Dict[str, Any]], action: str = 'upsert',
+                               collection: str = None, timeout: float = None) -> List[Dict]:
+        """Bulk import documents, returning one result dict per document"""
+        collection = collection or config.COLLECTION_NAME
+        body = "\n".join(json.dumps(document) for document in documents)
+        response = await self.request(
+            'POST',
+            f"/collections/{collection}/documents/import",
+            params={'action': action},
+            content=body,
+            timeout=timeout
+        )
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    async def search(self, search_params: Dict[str, Any], collection: str = None, timeout: float = None) -> Dict:
+        collection = collection or config.COLLECTION_NAME
+        response = await self.request('GET', f"/collections/{collection}/documents/search",
+                                      params=search_params, timeout=timeout)
+        return response.json()
+
+    async def multi_search(self, searches: List[Dict[str, Any]], timeout: float = None) -> List[Dict]:
+        response = await self.request('POST', "/multi_search", json_body={'searches': searches}, timeout=timeout)
+        return response.json()['results']
+
+    async def delete_documents(self, filter_by: str, collection: str = None, timeout: float = None) -> Dict:
+        collection = collection or config.COLLECTION_NAME
+        response = await self.request('DELETE', f"/collections/{collection}/documents",
+                                      params={'filter_by': filter_by}, timeout=timeout)
+        return response.json()
+
+    async def export_documents(self, collection: str = None, include_fields: str = None,
+                               filter_by: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streams every document in a collection, or those matching filter_by, from the JSONL export endpoint.
+
+        The export fails over like any read until the first line arrives; the timeout bounds each read.
+        """
+        collection = collection or config.COLLECTION_NAME
+        params = {key: value for key, value in (('include_fields', include_fields), ('filter_by', filter_by)) if value}
+        response = await self.request('GET', f"/collections/{collection}/documents/export", params=params, stream=True)
         try:
-            results = self.client.multi_search.perform(search_requests, {})
-            hits = results['results'][0]['hits'] if results['results'] else []
-        except:
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            _bytes_received.inc(response.num_bytes_downloaded)
+            await response.aclose()
+
+    def local_index_ready(self) -> bool:
+        return self.local_index is not None and self.local_index.ready
+
+    async def local_search(self, query_embedding: List[float], limit: int = DEFAULT_SEARCH_LIMIT,
+                           include_embeddings: bool = False) -> List[Dict]:
+        """Semantic search against the in-process replica, without a round trip to Typesense"""
+        return await asyncio.to_thread(self.local_index.search, query_embedding, limit, include_embeddings)
+
+    async def hybrid_search(self, query: str, query_embedding: List[float], limit: int = DEFAULT_SEARCH_LIMIT,
+                            include_embeddings: bool = False) -> List[Dict]:
+        """Hybrid search combining keyword and vector search; include_embeddings also returns each hit's vector.
+
+        If Typesense fails or is slower than LOCAL_INDEX_FALLBACK_SECONDS, semantic results come from
+        the local replica when it is in sync, otherwise from a keyword-only search.
+        """
+        include_fields = self.hit_fields(include_embeddings)
+        searches = [self.hybrid_search_params(query, query_embedding, limit, include_embeddings)]
+
+        local_ready = self.local_index_ready()
+        try:
+            search = self.multi_search(searches)
+            if local_ready:
+                results = await asyncio.wait_for(search, config.LOCAL_INDEX_FALLBACK_SECONDS)
+            else:
+                results = await search
+            hits = results[0]['hits'] if results else []
+        except Exception:
+            if local_ready:
+                return await self.local_search(query_embedding, limit, include_embeddings)
             search_params = {
                 'q': query,
                 'query_by': 'content',
                 'per_page': limit,
-                'include_fields': 'doc_id,filename,content,chunk_index'
+                'include_fields': include_fields
             }
-            results = self.client.collections[config.COLLECTION_NAME].documents.search(search_params)
+            results = await self.search(search_params)
             hits = results['hits']
-        
-        return [
-            {
+
+        return self.shape_hits(hits, include_embeddings)
+
+    async def hybrid_search_many(self, queries: List[str], query_embeddings: List[List[float]],
+                                 limit: int = DEFAULT_SEARCH_LIMIT, include_embeddings: bool = False) -> List[Optional[List[Dict]]]:
+        """Runs many hybrid searches as a few concurrent multi_search requests.
+
+        Returns one result list per query, or None where its search failed; callers fall back
+        to hybrid_search for those.
+        """
+        searches = [self.hybrid_search_params(query, embedding, limit, include_embeddings)
+                    for query, embedding in zip(queries, query_embeddings)]
+        groups = [searches[start:start + TYPESENSE_MULTI_SEARCH_GROUP_SIZE]
+                  for start in range(0, len(searches), TYPESENSE_MULTI_SEARCH_GROUP_SIZE)]
+        responses = await asyncio.gather(*(self.multi_search(group) for group in groups), return_exceptions=True)
+
+        results = []
+        for group, response in zip(groups, responses):
+            if isinstance(response, BaseException):
+                results.extend([None] * len(group))
+                continue
+            for result in response:
+                results.append(self.shape_hits(result['hits'], include_embeddings) if 'hits' in result else None)
+        return results
+
+    @staticmethod
+    def hit_fields(include_embeddings: bool) -> str:
+        return 'doc_id,filename,content,chunk_index' + (',embedding' if include_embeddings else '')
+
+    def hybrid_search_params(self, query: str, query_embedding: List[float], limit: int,
+                             include_embeddings: bool = False) -> Dict[str, Any]:
+        """One multi_search entry combining keyword and vector search"""
+        return {
+            'collection': config.COLLECTION_NAME,
+            'q': query,
+            'query_by': 'content',
+            'vector_query': f'embedding:([{",".join(map(str, query_embedding))}], k:{limit})',
+            'per_page': limit,
+            'include_fields': self.hit_fields(include_embeddings)
+        }
+
+    @staticmethod
+    def shape_hits(hits: List[Dict[str, Any]], include_embeddings: bool = False) -> List[Dict]:
+        """Turns search hits into the retrieval result dicts the agents consume"""
+        docs = []
+        for hit in hits:
+            doc = {
                 'content': hit['document']['content'],
                 'filename': hit['document']['filename'],
                 'doc_id': hit['document']['doc_id'],
                 'score': hit.get('text_match_info', {}).get('score', 0)
             }
-            for hit in hits
-        ]
+            if include_embeddings:
+                doc['embedding'] = hit['document'].get('embedding')
+            docs.append(doc)
+        return docs
+
+
+typesense_client = TypesenseClient()
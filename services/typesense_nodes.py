@@ -0,0 +1,136 @@
+import random
+import time
+from typing import Dict, Any, List, Optional, Set
+
+from services.metrics import TYPESENSE_NODE_UP, TYPESENSE_NODE_LATENCY, TYPESENSE_CIRCUIT_STATE
+from utils.config import config
+from utils.constants import TYPESENSE_LATENCY_EWMA_ALPHA
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_HALF_OPEN = "half_open"
+CIRCUIT_OPEN = "open"
+CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+
+class TypesenseNode:
+    """One Typesense node: its smoothed latency, requests in flight, health and circuit breaker.
+
+    The breaker opens after TYPESENSE_CIRCUIT_FAILURES consecutive failures and sheds the node
+    for TYPESENSE_CIRCUIT_COOLDOWN_SECONDS (or until a health check passes). It then lets a
+    single trial request through: success closes it, failure opens it again.
+    """
+    def __init__(self, url: str, failure_threshold: Optional[int] = None, cooldown_seconds: Optional[float] = None):
+        self.url = url.rstrip("/")
+        self.failure_threshold = failure_threshold or config.TYPESENSE_CIRCUIT_FAILURES
+        self.cooldown_seconds = cooldown_seconds or config.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.healthy = True
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.counters = {'requests': 0, 'failures': 0, 'circuit_opened': 0}
+        self.up_gauge = TYPESENSE_NODE_UP.labels(self.url)
+        self.latency_gauge = TYPESENSE_NODE_LATENCY.labels(self.url)
+        self.state_gauge = TYPESENSE_CIRCUIT_STATE.labels(self.url)
+        self.up_gauge.set(1)
+
+    def set_state(self, state: str):
+        self.state = state
+        self.state_gauge.set(CIRCUIT_STATE_VALUES[state])
+
+    def available(self, now: float) -> bool:
+        if self.state == CIRCUIT_OPEN and now - self.opened_at >= self.cooldown_seconds:
+            self.set_state(CIRCUIT_HALF_OPEN)
+        if self.state == CIRCUIT_HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CIRCUIT_CLOSED
+
+    def score(self) -> float:
+        """Expected wait: smoothed latency scaled by queued work; unmeasured nodes go first"""
+        return (self.latency or 0.0) * (1 + self.in_flight)
+
+    def observe_latency(self, seconds: float):
+        alpha = TYPESENSE_LATENCY_EWMA_ALPHA
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+        self.latency_gauge.set(self.latency)
+
+    def started(self):
+        self.in_flight += 1
+        self.counters['requests'] += 1
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.trial_in_flight = True
+
+    def succeeded(self, seconds: float):
+        self.in_flight -= 1
+        self.observe_latency(seconds)
+        self.failures = 0
+        self.trial_in_flight = False
+        if self.state != CIRCUIT_CLOSED:
+            self.set_state(CIRCUIT_CLOSED)
+
+    def failed(self):
+        self.in_flight -= 1
+        self.failures += 1
+        self.counters['failures'] += 1
+        self.trial_in_flight = False
+        if self.state == CIRCUIT_HALF_OPEN or (self.state == CIRCUIT_CLOSED and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.counters['circuit_opened'] += 1
+            self.set_state(CIRCUIT_OPEN)
+
+    def abandoned(self, seconds: float):
+        """The caller gave up (cancelled); the wait still says how slow the node is"""
+        self.in_flight -= 1
+        self.trial_in_flight = False
+        self.observe_latency(seconds)
+
+    def health_checked(self, ok: bool, seconds: float):
+        self.healthy = ok
+        self.up_gauge.set(1 if ok else 0)
+        if ok:
+            self.observe_latency(seconds)
+            # A passing health check ends the cooldown early
+            if self.state == CIRCUIT_OPEN:
+                self.set_state(CIRCUIT_HALF_OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'circuit': self.state,
+            'latency_ms': None if self.latency is None else self.latency * 1000,
+            'in_flight': self.in_flight,
+            **self.counters
+        }
+
+
+class NodePool:
+    """Picks nodes for requests: healthy nodes with a closed (or trial) circuit, lowest expected wait.
+
+    Two random candidates are compared ("power of two choices"), which follows latency while
+    spreading concurrent requests instead of piling them on one node. If no node is healthy,
+    any node whose circuit admits traffic is used, so a failing health endpoint alone does
+    not take the cluster down.
+    """
+    def __init__(self, urls: List[str]):
+        if not urls:
+            raise ValueError("at least one Typesense node is required")
+        self.urls = list(urls)
+        self.nodes = [TypesenseNode(url) for url in urls]
+
+    def pick(self, exclude: Optional[Set[TypesenseNode]] = None) -> Optional[TypesenseNode]:
+        now = time.monotonic()
+        candidates = [node for node in self.nodes if node not in (exclude or ()) and node.available(now)]
+        healthy = [node for node in candidates if node.healthy]
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.score() <= second.score() else second
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [node.stats() for node in self.nodes]
@@ -0,0 +1,342 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import xxhash
+
+from utils.config import config
+from utils.constants import LOCAL_INDEX_INITIAL_CAPACITY, LOCAL_INDEX_SHARD_MIN_ROWS, LOCAL_INDEX_COMPACT_BLOCK_ROWS
+
+ROW_DTYPE = np.dtype([
+    ('document', '<u4'),
+    ('chunk_index', '<u4'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('live', '?')
+])
+
+
+class LocalVectorIndex:
+    """In-process mirror of the documents collection for exact semantic search.
+
+    Normalized embeddings live in a memory-mapped float32 matrix next to a fixed-width row
+    table (document slot, chunk index, content offset/length, live flag); chunk text is
+    appended to a content file and document ids/filenames to a small JSONL table. Top-k is
+    a matmul plus argpartition, split into shards searched on a thread pool once the index
+    is large. meta.json is written last on every update, so a crash loses at most the
+    batch in flight. One process owns the index; it is written as chunks are indexed.
+
+    A loaded index is not trusted until it has been reconciled with the collection (see
+    DocumentService.sync_local_index), since a crash or a reset collection may have left it
+    behind. Replaced and removed chunks stay as dead rows until compact() rewrites the files.
+    """
+    def __init__(self, directory: Optional[str] = None, model: Optional[str] = None, shards: Optional[int] = None):
+        self.directory = directory or config.LOCAL_INDEX_DIR
+        self.model = model or config.GEMINI_EMBEDDING_MODEL
+        self.shards = shards or config.LOCAL_INDEX_SHARDS
+        self.lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.clear_state()
+        self.load()
+
+    def clear_state(self):
+        self.count = 0
+        self.capacity = 0
+        self.dimension: Optional[int] = None
+        self.embeddings: Optional[np.memmap] = None
+        self.rows: Optional[np.memmap] = None
+        self.documents: List[Tuple[str, str]] = []
+        self.document_slots: Dict[str, int] = {}
+        self.positions: Dict[Tuple[int, int], int] = {}
+        self.live_count = 0
+        self.synced = False
+        self.content_fd: Optional[int] = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        try:
+            with open(self.path("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta is None or meta.get("model") != self.model:
+            self.reset()
+            return
+
+        try:
+            self.dimension, self.count = meta["dimension"], meta["count"]
+            if self.dimension is not None:
+                self.open_maps(meta["capacity"])
+            with open(self.path("documents.jsonl")) as f:
+                for line in f:
+                    if len(self.documents) == meta["documents"]:
+                        break
+                    doc_id, filename = json.loads(line)
+                    self.document_slots[doc_id] = len(self.documents)
+                    self.documents.append((doc_id, filename))
+        except (OSError, ValueError, KeyError):
+            self.clear_state()
+            self.reset()
+            return
+
+        if self.count:
+            rows = self.rows[:self.count]
+            for position in np.flatnonzero(rows['live']):
+                self.positions[(int(rows['document'][position]), int(rows['chunk_index'][position]))] = int(position)
+        self.live_count = len(self.positions)
+        self.content_fd = os.open(self.path("content.bin"), os.O_RDONLY | os.O_CREAT)
+
+    def reset(self):
+        """Empties the index on disk, e.g. after the embedding model changed"""
+        with self.lock:
+            if self.content_fd is not None:
+                os.close(self.content_fd)
+            self.clear_state()
+            os.makedirs(self.directory, exist_ok=True)
+            for name in ("embeddings.f32", "rows.bin", "content.bin", "documents.jsonl"):
+                with open(self.path(name), "wb"):
+                    pass
+            self.content_fd = os.open(self.path("content.bin"), os.O_RDONLY)
+            self.write_meta()
+
+    def write_meta(self):
+        meta = {
+            "model": self.model,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+            "count": self.count,
+            "documents": len(self.documents)
+        }
+        temp_path = self.path("meta.json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.path("meta.json"))
+
+    def open_maps(self, capacity: int):
+        for name, row_bytes in (("embeddings.f32", self.dimension * 4), ("rows.bin", ROW_DTYPE.itemsize)):
+            with open(self.path(name), "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        self.embeddings = np.memmap(self.path("embeddings.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self.rows = np.memmap(self.path("rows.bin"), dtype=ROW_DTYPE, mode="r+", shape=(capacity,))
+        self.capacity = capacity
+
+    def document_slot(self, doc_id: str, filename: str, new_documents: List[Tuple[str, str]]) -> int:
+        if doc_id not in self.document_slots:
+            self.document_slots[doc_id] = len(self.documents)
+            self.documents.append((doc_id, filename))
+            new_documents.append((doc_id, filename))
+        return self.document_slots[doc_id]
+
+    def add(self, documents: List[Dict[str, Any]]):
+        """Upserts indexed chunks (the dicts sent to Typesense, with id, doc_id, chunk_index, content and embedding)"""
+        if not documents:
+            return
+        with self.lock:
+            vectors = np.asarray([document['embedding'] for document in documents], dtype=np.float32)
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+
+            if self.count + len(documents) > self.capacity:
+                capacity = max(self.capacity, LOCAL_INDEX_INITIAL_CAPACITY)
+                while capacity < self.count + len(documents):
+                    capacity *= 2
+                self.open_maps(capacity)
+
+            new_documents: List[Tuple[str, str]] = []
+            start = self.count
+            with open(self.path("content.bin"), "ab") as content_file:
+                for i, document in enumerate(documents):
+                    slot = self.document_slot(document['doc_id'], document['filename'], new_documents)
+                    key = (slot, int(document['chunk_index']))
+                    if key in self.positions:
+                        self.rows['live'][self.positions[key]] = False
+                        self.live_count -= 1
+
+                    content = document['content'].encode('utf-8')
+                    self.rows[start + i] = (slot, key[1], content_file.tell(), len(content), True)
+                    content_file.write(content)
+                    self.positions[key] = start + i
+                    self.live_count += 1
+
+            if new_documents:
+                with open(self.path("documents.jsonl"), "a") as f:
+                    f.writelines(json.dumps(document) + "\n" for document in new_documents)
+            self.embeddings[start:start + len(documents)] = vectors
+            self.embeddings.flush()
+            self.rows.flush()
+            self.count += len(documents)
+            self.write_meta()
+
+    def remove(self, doc_id: str, from_chunk_index: int = 0):
+        """Drops a document's chunks from from_chunk_index on, e.g. those past the end of a shorter new version"""
+        with self.lock:
+            slot = self.document_slots.get(doc_id)
+            self.drop([key for key in self.positions if key[0] == slot and key[1] >= from_chunk_index])
+
+    def remove_chunks(self, chunks: List[Tuple[str, int]]):
+        """Drops the given (doc_id, chunk_index) chunks"""
+        with self.lock:
+            keys = ((self.document_slots.get(doc_id), chunk_index) for doc_id, chunk_index in chunks)
+            self.drop([key for key in keys if key in self.positions])
+
+    def drop(self, stale: List[Tuple[int, int]]):
+        if not stale:
+            return
+        for key in stale:
+            self.rows['live'][self.positions.pop(key)] = False
+        self.live_count -= len(stale)
+        self.rows.flush()
+        self.write_meta()
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return xxhash.xxh3_64_hexdigest(content.encode('utf-8'))
+
+    def chunk_digests(self) -> Dict[Tuple[str, int], str]:
+        """Content digest of every live chunk by (doc_id, chunk_index), to compare with the collection"""
+        with self.lock:
+            digests = {}
+            for (slot, chunk_index), position in self.positions.items():
+                row = self.rows[position]
+                content = os.pread(self.content_fd, int(row['length']), int(row['offset']))
+                digests[(self.documents[slot][0], chunk_index)] = xxhash.xxh3_64_hexdigest(content)
+            return digests
+
+    def compact(self, min_dead_ratio: float = 0.0):
+        """Rewrites the files with live rows only, once dead rows exceed min_dead_ratio of all rows.
+
+        Searches read the files without the lock, so this only runs while the index is not ready.
+        meta.json is removed while files are swapped, so a crash leaves an empty index to refill.
+        """
+        with self.lock:
+            dead = self.count - self.live_count
+            if dead == 0 or dead <= min_dead_ratio * self.count:
+                return
+            live = np.flatnonzero(self.rows['live'][:self.count])
+            slots = np.unique(self.rows['document'][live])
+            remap = np.zeros(len(self.documents), dtype=np.uint32)
+            remap[slots] = np.arange(len(slots), dtype=np.uint32)
+
+            temp = {name: self.path(f"{name}.compact") for name in ("embeddings.f32", "rows.bin", "content.bin", "documents.jsonl")}
+            with open(temp["embeddings.f32"], "wb") as embeddings, open(temp["rows.bin"], "wb") as rows, \
+                    open(temp["content.bin"], "wb") as content:
+                for start in range(0, len(live), LOCAL_INDEX_COMPACT_BLOCK_ROWS):
+                    block = live[start:start + LOCAL_INDEX_COMPACT_BLOCK_ROWS]
+                    embeddings.write(np.ascontiguousarray(self.embeddings[block]).tobytes())
+                    block_rows = np.array(self.rows[block])
+                    block_rows['document'] = remap[block_rows['document']]
+                    for row in block_rows:
+                        data = os.pread(self.content_fd, int(row['length']), int(row['offset']))
+                        row['offset'] = content.tell()
+                        content.write(data)
+                    rows.write(block_rows.tobytes())
+            documents = [self.documents[slot] for slot in slots]
+            with open(temp["documents.jsonl"], "w") as f:
+                f.writelines(json.dumps(document) + "\n" for document in documents)
+
+            os.remove(self.path("meta.json"))
+            self.embeddings = self.rows = None
+            os.close(self.content_fd)
+            for name, path in temp.items():
+                os.replace(path, self.path(name))
+
+            self.count = self.live_count = len(live)
+            self.documents = documents
+            self.document_slots = {doc_id: slot for slot, (doc_id, _) in enumerate(documents)}
+            self.open_maps(max(LOCAL_INDEX_INITIAL_CAPACITY, self.count))
+            rows = self.rows[:self.count]
+            self.positions = {(int(document), int(chunk_index)): position
+                              for position, (document, chunk_index) in enumerate(zip(rows['document'], rows['chunk_index']))}
+            self.content_fd = os.open(self.path("content.bin"), os.O_RDONLY)
+            self.write_meta()
+
+    def mark_synced(self):
+        with self.lock:
+            self.synced = True
+
+    @property
+    def ready(self) -> bool:
+        """True once the index mirrors the whole collection, so it can answer in Typesense's place"""
+        return self.synced
+
+    def search(self, query_embedding: List[float], limit: int, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Exact cosine top-k over live chunks, in the same shape as TypesenseClient.hybrid_search results"""
+        with self.lock:
+            count, embeddings, rows = self.count, self.embeddings, self.rows
+        if count == 0 or limit <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        shards = self.shards if count >= LOCAL_INDEX_SHARD_MIN_ROWS else 1
+        bounds = np.linspace(0, count, shards + 1, dtype=np.int64)
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        if shards > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.shards)
+            # matmul releases the GIL, so shards are scored in parallel
+            partials = list(self.executor.map(lambda r: self.top_k(embeddings, rows, query, limit, *r), ranges))
+        else:
+            partials = [self.top_k(embeddings, rows, query, limit, 0, count)]
+
+        positions = np.concatenate([p for p, _ in partials])
+        scores = np.concatenate([s for _, s in partials])
+        order = np.argsort(-scores)[:limit]
+
+        results = []
+        for position, score in zip(positions[order], scores[order]):
+            if not np.isfinite(score):
+                break
+            row = rows[position]
+            doc_id, filename = self.documents[int(row['document'])]
+            result = {
+                'content': os.pread(self.content_fd, int(row['length']), int(row['offset'])).decode('utf-8'),
+                'filename': filename,
+                'doc_id': doc_id,
+                'score': float(score)
+            }
+            if include_embeddings:
+                result['embedding'] = embeddings[position].tolist()
+            results.append(result)
+        return results
+
+    @staticmethod
+    def top_k(embeddings: np.ndarray, rows: np.ndarray, query: np.ndarray, limit: int, start: int, end: int):
+        scores = embeddings[start:end] @ query
+        scores[~rows['live'][start:end]] = -np.inf
+        k = min(limit, end - start)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top + start, scores[top]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'chunks': self.live_count,
+            'rows': self.count,
+            'dead_rows': self.count - self.live_count,
+            'documents': len(self.documents),
+            'synced': self.synced,
+            'embedding_bytes': self.count * (self.dimension or 0) * 4
+        }
+
+
+_vector_index: Optional[LocalVectorIndex] = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[LocalVectorIndex]:
+    """Returns the app's local index, loading it from disk on first use; None if LOCAL_INDEX_ENABLED is off"""
+    global _vector_index
+    if not config.LOCAL_INDEX_ENABLED:
+        return None
+    with _vector_index_lock:
+        if _vector_index is None:
+            _vector_index = LocalVectorIndex()
+    return _vector_index
@@ -1,5 +1,50 @@
 import os
 from dotenv import load_dotenv
+from utils.constants import (
+    DEFAULT_SESSION_CACHE_MAX_SESSIONS,
+    DEFAULT_SESSION_CACHE_TTL_SECONDS,
+    DEFAULT_MEMORY_FLUSH_INTERVAL_SECONDS,
+    DEFAULT_MEMORY_FLUSH_BATCH_SIZE,
+    DEFAULT_MEMORY_FLUSH_RETRIES,
+    DEFAULT_LOCAL_INDEX_DIR,
+    DEFAULT_LOCAL_INDEX_FALLBACK_SECONDS,
+    DEFAULT_RERANK_OVERFETCH,
+    DEFAULT_MMR_LAMBDA,
+    DEFAULT_DUPLICATE_THRESHOLD,
+    DEFAULT_CHUNK_TOKENS,
+    DEFAULT_CHUNK_OVERLAP_TOKENS,
+    DEFAULT_TOKENIZER_ENCODING,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_GEMINI_MAX_CONCURRENCY,
+    DEFAULT_GEMINI_TIMEOUT_SECONDS,
+    DEFAULT_GEMINI_MIN_CONCURRENCY,
+    DEFAULT_GEMINI_BULK_SHARE,
+    DEFAULT_GEMINI_LATENCY_TOLERANCE,
+    DEFAULT_GEMINI_RETRIES,
+    DEFAULT_ASK_BATCH_WINDOW,
+    DEFAULT_ASK_BATCH_MAX_CONCURRENCY,
+    DEFAULT_ASK_BATCH_MAX_QUESTIONS,
+    DEFAULT_LOCAL_ANALYZER_MIN_CONFIDENCE,
+    DEFAULT_LOCAL_ANALYZER_MODEL_PATH,
+    DEFAULT_EMBEDDING_BATCH_SIZE,
+    DEFAULT_MAX_CONCURRENT_BATCHES,
+    DEFAULT_INGEST_PARSE_WORKERS,
+    DEFAULT_INGEST_QUEUE_SIZE,
+    DEFAULT_EMBEDDING_CACHE_DIR,
+    DEFAULT_EMBEDDING_CACHE_MEMORY_ENTRIES,
+    DEFAULT_EMBEDDING_CACHE_MAX_BYTES,
+    DEFAULT_ANSWER_CACHE_THRESHOLD,
+    DEFAULT_ANSWER_CACHE_TTL_SECONDS,
+    DEFAULT_ANSWER_CACHE_MAX_ENTRIES,
+    CONNECTION_TIMEOUT_SECONDS,
+    DEFAULT_TYPESENSE_MAX_CONNECTIONS,
+    DEFAULT_TYPESENSE_MAX_KEEPALIVE_CONNECTIONS,
+    DEFAULT_TYPESENSE_CONNECT_TIMEOUT_SECONDS,
+    DEFAULT_TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS,
+    DEFAULT_TYPESENSE_CIRCUIT_FAILURES,
+    DEFAULT_TYPESENSE_CIRCUIT_COOLDOWN_SECONDS,
+    DEFAULT_TYPESENSE_WRITE_RETRIES
+)
 
 class Config:
     def __init__(self):
@@ -8,13 +53,73 @@ class Config:
         self.GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
         self.GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash")
         self.GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001")
+        self.GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", DEFAULT_GEMINI_MAX_CONCURRENCY))
+        self.GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", DEFAULT_GEMINI_TIMEOUT_SECONDS))
+        self.GEMINI_MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", DEFAULT_GEMINI_MIN_CONCURRENCY))
+        self.GEMINI_BULK_SHARE = float(os.getenv("GEMINI_BULK_SHARE", DEFAULT_GEMINI_BULK_SHARE))
+        self.GEMINI_LATENCY_TOLERANCE = float(os.getenv("GEMINI_LATENCY_TOLERANCE", DEFAULT_GEMINI_LATENCY_TOLERANCE))
+        self.GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", DEFAULT_GEMINI_RETRIES))
+        
+        self.SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+        self.LOCAL_ANALYZER_ENABLED = os.getenv("LOCAL_ANALYZER_ENABLED", "true").lower() == "true"
+        self.LOCAL_ANALYZER_MIN_CONFIDENCE = float(os.getenv("LOCAL_ANALYZER_MIN_CONFIDENCE", DEFAULT_LOCAL_ANALYZER_MIN_CONFIDENCE))
+        self.LOCAL_ANALYZER_MODEL_PATH = os.getenv("LOCAL_ANALYZER_MODEL_PATH", DEFAULT_LOCAL_ANALYZER_MODEL_PATH)
+        self.RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+        self.RERANK_OVERFETCH = int(os.getenv("RERANK_OVERFETCH", DEFAULT_RERANK_OVERFETCH))
+        self.MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", DEFAULT_MMR_LAMBDA))
+        self.DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", DEFAULT_DUPLICATE_THRESHOLD))
+        self.ASK_BATCH_WINDOW = int(os.getenv("ASK_BATCH_WINDOW", DEFAULT_ASK_BATCH_WINDOW))
+        self.ASK_BATCH_MAX_CONCURRENCY = int(os.getenv("ASK_BATCH_MAX_CONCURRENCY", DEFAULT_ASK_BATCH_MAX_CONCURRENCY))
+        self.ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", DEFAULT_ASK_BATCH_MAX_QUESTIONS))
+        
+        self.TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", DEFAULT_TOKENIZER_ENCODING)
+        self.CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS))
+        self.CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", DEFAULT_CHUNK_OVERLAP_TOKENS))
+        self.CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET))
+        
+        self.EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_EMBEDDING_BATCH_SIZE))
+        self.MAX_CONCURRENT_BATCHES = int(os.getenv("MAX_CONCURRENT_BATCHES", DEFAULT_MAX_CONCURRENT_BATCHES))
+        self.INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", DEFAULT_INGEST_PARSE_WORKERS))
+        self.INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", DEFAULT_INGEST_QUEUE_SIZE))
+        
+        self.EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_EMBEDDING_CACHE_DIR)
+        self.EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", DEFAULT_EMBEDDING_CACHE_MEMORY_ENTRIES))
+        self.EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", DEFAULT_EMBEDDING_CACHE_MAX_BYTES))
+        
+        self.ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", DEFAULT_ANSWER_CACHE_THRESHOLD))
+        self.ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", DEFAULT_ANSWER_CACHE_TTL_SECONDS))
+        self.ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", DEFAULT_ANSWER_CACHE_MAX_ENTRIES))
         
         self.TYPESENSE_API_KEY = os.getenv("TYPESENSE_API_KEY", "xyz")
         self.TYPESENSE_HOST = os.getenv("TYPESENSE_HOST", "localhost")
         self.TYPESENSE_PORT = int(os.getenv("TYPESENSE_PORT", "8108"))
         self.TYPESENSE_PROTOCOL = os.getenv("TYPESENSE_PROTOCOL", "http")
+        self.TYPESENSE_TIMEOUT_SECONDS = float(os.getenv("TYPESENSE_TIMEOUT_SECONDS", CONNECTION_TIMEOUT_SECONDS))
+        self.TYPESENSE_MAX_CONNECTIONS = int(os.getenv("TYPESENSE_MAX_CONNECTIONS", DEFAULT_TYPESENSE_MAX_CONNECTIONS))
+        self.TYPESENSE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("TYPESENSE_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_TYPESENSE_MAX_KEEPALIVE_CONNECTIONS))
+        # Comma-separated node URLs; when unset the single node from HOST, PORT and PROTOCOL is used
+        self.TYPESENSE_NODES = [url.strip() for url in os.getenv("TYPESENSE_NODES", "").split(",") if url.strip()]
+        self.TYPESENSE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("TYPESENSE_CONNECT_TIMEOUT_SECONDS", DEFAULT_TYPESENSE_CONNECT_TIMEOUT_SECONDS))
+        self.TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS", DEFAULT_TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS))
+        self.TYPESENSE_CIRCUIT_FAILURES = int(os.getenv("TYPESENSE_CIRCUIT_FAILURES", DEFAULT_TYPESENSE_CIRCUIT_FAILURES))
+        self.TYPESENSE_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("TYPESENSE_CIRCUIT_COOLDOWN_SECONDS", DEFAULT_TYPESENSE_CIRCUIT_COOLDOWN_SECONDS))
+        self.TYPESENSE_WRITE_RETRIES = int(os.getenv("TYPESENSE_WRITE_RETRIES", DEFAULT_TYPESENSE_WRITE_RETRIES))
+        
+        self.SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", DEFAULT_SESSION_CACHE_MAX_SESSIONS))
+        self.SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", DEFAULT_SESSION_CACHE_TTL_SECONDS))
+        self.MEMORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("MEMORY_FLUSH_INTERVAL_SECONDS", DEFAULT_MEMORY_FLUSH_INTERVAL_SECONDS))
+        self.MEMORY_FLUSH_BATCH_SIZE = int(os.getenv("MEMORY_FLUSH_BATCH_SIZE", DEFAULT_MEMORY_FLUSH_BATCH_SIZE))
+        self.MEMORY_FLUSH_RETRIES = int(os.getenv("MEMORY_FLUSH_RETRIES", DEFAULT_MEMORY_FLUSH_RETRIES))
+        
+        self.LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() == "true"
+        self.LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", DEFAULT_LOCAL_INDEX_DIR)
+        self.LOCAL_INDEX_SERVE_SEMANTIC = os.getenv("LOCAL_INDEX_SERVE_SEMANTIC", "true").lower() == "true"
+        self.LOCAL_INDEX_FALLBACK_SECONDS = float(os.getenv("LOCAL_INDEX_FALLBACK_SECONDS", DEFAULT_LOCAL_INDEX_FALLBACK_SECONDS))
+        self.LOCAL_INDEX_SHARDS = int(os.getenv("LOCAL_INDEX_SHARDS", min(4, os.cpu_count() or 1)))
         
         self.UPLOAD_DIR = "uploads"
+        self.JOB_STORE_URL = os.getenv("JOB_STORE_URL", f"sqlite:///{self.UPLOAD_DIR}/jobs.sqlite3")
         self.COLLECTION_NAME = "documents"
         self.CONVERSATIONS_COLLECTION = "conversations"
 
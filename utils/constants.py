@@ -1,14 +1,112 @@
-DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_CHUNK_OVERLAP_TOKENS = 32
+MAX_SENTENCE_CHARS = 16 * 1024
+DEFAULT_TOKENIZER_ENCODING = "cl100k_base"
+TOKEN_COUNT_CACHE_ENTRIES = 10000
+# Whole prompt budget for answer synthesis; lowest-ranked chunks are truncated, then dropped, to fit
+DEFAULT_CONTEXT_TOKEN_BUDGET = 4000
+MIN_TRUNCATED_CHUNK_TOKENS = 48
+TEXT_BLOCK_SIZE = 64 * 1024
+DEFAULT_EMBEDDING_BATCH_SIZE = 50
+DEFAULT_MAX_CONCURRENT_BATCHES = 4
+
+DEFAULT_INGEST_PARSE_WORKERS = 2
+DEFAULT_INGEST_QUEUE_SIZE = 4
+JOB_PROGRESS_FLUSH_SECONDS = 1.0
+PARSE_POLL_SECONDS = 0.5
+UPLOAD_SPOOL_BLOCK_SIZE = 1024 * 1024
+
+DEFAULT_EMBEDDING_CACHE_DIR = ".cache/embeddings"
+DEFAULT_EMBEDDING_CACHE_MEMORY_ENTRIES = 10000
+DEFAULT_EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024
 EMBEDDING_DIMENSION = 768
 
 EMBEDDING_TASK_DOCUMENT = "retrieval_document"
 EMBEDDING_TASK_QUERY = "retrieval_query"
 
+DEFAULT_GEMINI_MAX_CONCURRENCY = 8
+DEFAULT_GEMINI_TIMEOUT_SECONDS = 30
+# Gemini calls are admitted by priority under an AIMD concurrency limit between MIN and MAX_CONCURRENCY
+DEFAULT_GEMINI_MIN_CONCURRENCY = 1
+# Share of the limit bulk (ingestion) calls may hold, so questions always find a free slot soon
+DEFAULT_GEMINI_BULK_SHARE = 0.75
+# A call slower than this multiple of its operation's baseline latency counts as congestion
+DEFAULT_GEMINI_LATENCY_TOLERANCE = 1.5
+DEFAULT_GEMINI_RETRIES = 3
+GEMINI_RETRY_BACKOFF_SECONDS = 0.5
+GEMINI_RETRY_MAX_BACKOFF_SECONDS = 8.0
+# Rate limits (429) and overloads (500/503) are retried and slow the scheduler down
+GEMINI_RETRYABLE_STATUS_CODES = (429, 500, 503)
+GEMINI_RATE_LIMIT_DECREASE = 0.5
+GEMINI_LATENCY_DECREASE = 0.9
+# The limit starts low so each operation's baseline latency is learned before load builds up
+GEMINI_INITIAL_CONCURRENCY = 4
+# The baseline follows the fastest call, drifting up this much per call so it adapts to a slower provider
+GEMINI_BASELINE_DRIFT = 0.001
+DISCONNECT_POLL_SECONDS = 0.5
+# /ask/batch prepares questions in windows (batched embedding calls and a few multi_search requests each)
+DEFAULT_ASK_BATCH_WINDOW = 50
+DEFAULT_ASK_BATCH_MAX_CONCURRENCY = 8
+DEFAULT_ASK_BATCH_MAX_QUESTIONS = 10000
+# Windows prepared ahead of the one being answered
+ASK_BATCH_LOOKAHEAD_WINDOWS = 1
+
+DEFAULT_LOCAL_ANALYZER_MIN_CONFIDENCE = 0.8
+DEFAULT_LOCAL_ANALYZER_MODEL_PATH = ".cache/query_analyzer.npz"
+LOCAL_ANALYZER_MIN_EXAMPLES = 5
+LOCAL_ANALYZER_MARGIN_SCALE = 5.0
+
 DEFAULT_SEARCH_LIMIT = 5
+# Prefetched while the query is analyzed; strategies asking for at most this many hits reuse it
+SPECULATIVE_SEARCH_PARAMS = {"limit": 10}
+# Re-ranking fetches limit * RERANK_OVERFETCH candidates with their embeddings
+DEFAULT_RERANK_OVERFETCH = 3
+DEFAULT_MMR_LAMBDA = 0.7
+DEFAULT_DUPLICATE_THRESHOLD = 0.95
 CONNECTION_TIMEOUT_SECONDS = 2
+DEFAULT_TYPESENSE_MAX_CONNECTIONS = 100
+DEFAULT_TYPESENSE_MAX_KEEPALIVE_CONNECTIONS = 20
+# Searches per multi_search request when batching; Typesense runs a request's searches one by one,
+# so a few smaller requests in parallel finish sooner and each stays within the request timeout
+TYPESENSE_MULTI_SEARCH_GROUP_SIZE = 10
+# Connecting fails fast so a dead node is skipped quickly; the read timeout stays at CONNECTION_TIMEOUT_SECONDS
+DEFAULT_TYPESENSE_CONNECT_TIMEOUT_SECONDS = 0.5
+DEFAULT_TYPESENSE_HEALTH_CHECK_INTERVAL_SECONDS = 5.0
+DEFAULT_TYPESENSE_CIRCUIT_FAILURES = 3
+DEFAULT_TYPESENSE_CIRCUIT_COOLDOWN_SECONDS = 10.0
+DEFAULT_TYPESENSE_WRITE_RETRIES = 3
+TYPESENSE_WRITE_BACKOFF_SECONDS = 0.1
+TYPESENSE_WRITE_MAX_BACKOFF_SECONDS = 2.0
+# Weight of the newest sample in each node's smoothed latency
+TYPESENSE_LATENCY_EWMA_ALPHA = 0.3
+# Startup keeps retrying collection checks until Typesense answers, backing off up to the max
+STARTUP_RETRY_BACKOFF_SECONDS = 0.5
+STARTUP_RETRY_MAX_BACKOFF_SECONDS = 10.0
+
+DEFAULT_LOCAL_INDEX_DIR = ".cache/vector_index"
+DEFAULT_LOCAL_INDEX_FALLBACK_SECONDS = 1.0
+LOCAL_INDEX_INITIAL_CAPACITY = 4096
+# Below this many rows a single matmul beats fanning out to shards
+LOCAL_INDEX_SHARD_MIN_ROWS = 50000
+LOCAL_INDEX_SYNC_BATCH_SIZE = 1000
+# Startup compaction rewrites the index once this share of its rows is replaced or removed chunks
+LOCAL_INDEX_COMPACT_DEAD_RATIO = 0.2
+LOCAL_INDEX_COMPACT_BLOCK_ROWS = 8192
+
+DEFAULT_ANSWER_CACHE_THRESHOLD = 0.95
+DEFAULT_ANSWER_CACHE_TTL_SECONDS = 3600
+DEFAULT_ANSWER_CACHE_MAX_ENTRIES = 2048
 
 DEFAULT_CONVERSATION_LIMIT = 10
 DEFAULT_CONTEXT_LIMIT = 3
+# Typesense's per_page maximum; a cold session loads this many interactions and keeps the newest
+MEMORY_FETCH_LIMIT = 250
+DEFAULT_SESSION_CACHE_MAX_SESSIONS = 10000
+DEFAULT_SESSION_CACHE_TTL_SECONDS = 1800
+DEFAULT_MEMORY_FLUSH_INTERVAL_SECONDS = 0.5
+DEFAULT_MEMORY_FLUSH_BATCH_SIZE = 100
+DEFAULT_MEMORY_FLUSH_RETRIES = 3
+MEMORY_RETRY_BACKOFF_SECONDS = 0.5
 
 TYPESENSE_SCHEMA_FIELDS = [
     {'name': 'doc_id', 'type': 'string'},